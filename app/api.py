@@ -1,40 +1,53 @@
 #api.py
-from fastapi import APIRouter
+import json
+import time
+from typing import Literal, Optional
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from app import config
 from app.schemas import *
-from app.core import rerank_gemini, rerank_openai, validation_gemini, diagnosis_search, service_search
+from app.core import rerank_gemini, rerank_openai, validation_gemini, diagnosis_search, service_search, singleflight
 from app.utils.json_utils import safe_extract_json
-from app.core.pii_analyzer import analyze_text, anonymize_text
+from app.core.pii_pipeline import analyze_and_anonymize, anonymize_soap, get_pii_cache_stats
+from app.core.pii_batch import anonymize_batch
 from fastapi import Query
 
 from app.schemas import ClaimRejectionRequest, ClaimRejectionResponse
 from app.core.claim_learning_engine import learn_from_rejection
-from app.schemas_new.validate_note_requirements import CheckNoteRequest, CheckNoteResponse, PerCodeResult
-from app.core.validate_note_requirements.engine import validate_soap_against_codes
-from app.core.claim_learning_engine import lookup_learned_failure
-
-from app.core.predict_helpers import (
-    get_similar_failures,
-    calculate_rejection_probability,
-    assign_risk_level,
-    aggregate_suggestions
-)
+from app.schemas_new.validate_note_requirements import CheckNoteRequest, CheckNoteResponse, NoteCheckBatchClaim, NoteCheckBatchRequest
+from app.core.validate_note_requirements.engine import validate_soap_against_codes_async, iter_validate_batch
+from app.core.validate_note_requirements.rule_store import get_rule_store
+from app.core.claim_learning_engine import learned_failure_response, lookup_learned_failure
+from app.core.llm_provider import get_provider_stats
+from app.core.tariff import estimate_claims
+from app.core.service_diagnosis_compat import check_service_diagnosis_pairs
+from app.core.executors import get_cpu_executor, run_cpu, stream_cpu
+from app.core.jobs import get_job_runner
+from app.core.claim_analysis import analyze_claim
+from app.core.tiers import estimate_suggest_cost, get_tier, local_decision
+from app.core.telemetry import render_prometheus
+
+from app.core.predict_helpers import predict_outcome
 
 router = APIRouter()
 
 @router.post("/ai/suggest-service-codes/local-model",
 summary="Suggest HELFO service codes from SOAP notes using local embedding model"
 )
-def search_agent(payload: QueryRequest):
-    matches = service_search.search_codes(payload.query, payload.top_k)
-    return {"session_id": payload.session_id, "candidates": matches}
+async def search_agent(payload: QueryRequest):
+    search = await service_search.search_codes_with_rewrite_async(payload.query)
+    return {
+        "session_id": payload.session_id,
+        "candidates": search["candidates"][:payload.top_k],
+        "query_rewrite": search["query_rewrite"]
+    }
 
 @router.post("/agent/rerank/invoke")
-def rerank_agent(payload: RerankRequest):
+async def rerank_agent(payload: RerankRequest):
     if config.USE_GEMINI:
-        decision = rerank_gemini.get_best_code(payload.query, payload.candidates)
+        decision = await rerank_gemini.get_best_code_async(payload.query, payload.candidates)
     else:
-        decision = rerank_openai.rerank_with_openai(payload.query, payload.candidates)
+        decision = await rerank_openai.rerank_with_openai_async(payload.query, payload.candidates)
     return {"session_id": payload.session_id, "decision": decision}
 
 # @router.post("/ai/check-note-requirements")
@@ -44,159 +57,312 @@ def rerank_agent(payload: RerankRequest):
 @router.post("/ai/suggest-service-codes",
 summary="Suggest HELFO service codes from SOAP notes using Gemini LLM"
 )
-def suggest_service_codes(payload: QueryRequest):
-    candidates = service_search.search_codes(payload.query)
+async def suggest_service_codes(
+    payload: QueryRequest,
+    tier: Optional[Literal["fast", "balanced", "accurate"]] = Query(None, description="Latency tier: fast (FAISS only), balanced (FAISS + cross-encoder), accurate (full LLM path); default LATENCY_TIER")
+):
+    profile = get_tier(tier)
+    # session_id is not part of the work, so duplicates from different sessions coalesce too
+    decision, query_rewrite = await singleflight.do(
+        "suggest-service-codes",
+        {"query": payload.query, "top_k": payload.top_k, "tier": profile.name},
+        lambda: _suggest_service_codes(payload.query, payload.top_k, profile),
+    )
+    return {
+        "session_id": payload.session_id,
+        "decision": decision,
+        "query_rewrite": query_rewrite,
+        "tier": profile.name,
+        "estimated_cost": estimate_suggest_cost(profile, payload.query, payload.top_k),
+    }
+
+async def _suggest_service_codes(query: str, top_k: int, profile):
+    if not profile.llm:
+        candidates = await run_cpu(
+            service_search.retrieve_candidates, query, query,
+            initial_k=profile.initial_k, cross_encoder_rerank=profile.cross_encoder
+        )
+        return local_decision(candidates, top_k, profile), {"text": query, "source": "raw", "cache_similarity": None}
+
+    search = await service_search.search_codes_with_rewrite_async(query)
+    candidates = search["candidates"]
     if config.USE_GEMINI:
-        decision = rerank_gemini.get_best_code(payload.query, candidates, payload.top_k)
+        decision = await rerank_gemini.get_best_code_async(query, candidates, top_k)
     else:
-        decision = rerank_openai.rerank_with_openai(payload.query, candidates)
-    return {"session_id": payload.session_id, "decision": decision}
+        decision = await rerank_openai.rerank_with_openai_async(query, candidates)
+    return decision, search["query_rewrite"]
+
+@router.get("/ai/suggest-service-codes/rewrite-cache")
+async def rewrite_cache_stats():
+    """Hit rate, size and threshold of the semantic cache for Gemini query rewrites."""
+    return service_search.get_rewrite_cache_stats()
 
 
 @router.post("/ai/extract-diagnoses")
-def extract_diagnoses(
+async def extract_diagnoses(
     payload: SoapInput,
     top_k: int = Query(5, ge=1, le=10, description="Number of top matches per concept before rerank"),
     min_similarity: float = Query(0.6, ge=0.0, le=1.0, description="Minimum similarity threshold"),
-    final_top_n: int = Query(1, ge=1, le=10, description="Number of top matches to keep per concept after rerank")
+    final_top_n: int = Query(1, ge=1, le=10, description="Number of top matches to keep per concept after rerank"),
+    mode: Literal["llm", "fast"] = Query("llm", description="Concept grouping: 'llm' (Gemini) or 'fast' (local spaCy)"),
+    tier: Optional[Literal["fast", "balanced", "accurate"]] = Query(None, description="Latency tier: fast (FAISS only), balanced (FAISS + cross-encoder), accurate (full LLM path); default LATENCY_TIER")
 ):
     """
     Extract probable diagnoses from SOAP note.
 
     This endpoint:
     - Removes PII from SOAP.
-    - Uses Gemini LLM to group clinical concepts from the SOAP.
+    - Uses Gemini LLM (or the local spaCy extractor with mode=fast) to group clinical concepts from the SOAP.
     - Searches for matching diagnoses for each concept.
     - Uses Gemini LLM to rerank and filter diagnoses.
+
+    tier=fast|balanced skips Gemini (local grouping, no rerank); the response
+    includes the tier used and its estimated cost.
+    """
+    profile = get_tier(tier)
+    result = await singleflight.do(
+        "extract-diagnoses",
+        {"soap": payload.soap, "top_k": top_k, "min_similarity": min_similarity, "final_top_n": final_top_n, "mode": mode,
+         "tier": profile.name},
+        lambda: validation_gemini.extract_diagnoses_from_soap_async(
+            payload.soap,
+            top_k=top_k,
+            min_similarity=min_similarity,
+            final_top_n=final_top_n,
+            mode=mode,
+            tier=profile.name
+        ),
+    )
+    return result
+
+@router.post("/ai/extract-diagnoses/stream")
+async def extract_diagnoses_stream(
+    payload: SoapInput,
+    top_k: int = Query(5, ge=1, le=10, description="Number of top matches per concept before rerank"),
+    min_similarity: float = Query(0.6, ge=0.0, le=1.0, description="Minimum similarity threshold"),
+    final_top_n: int = Query(1, ge=1, le=10, description="Number of top matches to keep per concept after rerank"),
+    mode: Literal["llm", "fast"] = Query("llm", description="Concept grouping: 'llm' (Gemini) or 'fast' (local spaCy)")
+):
     """
-    result = validation_gemini.extract_diagnoses_from_soap(
+    Server-sent-events variant of /ai/extract-diagnoses.
+
+    Emits `grouped` once, then `candidates` (after the cross-encoder) and
+    `reranked` (after Gemini) per concept, and finally `done` with
+    `unique_codes` and `detailed_matches`.
+    """
+    events = await stream_cpu(validation_gemini.iter_extract_diagnoses_events(
         payload.soap,
         top_k=top_k,
         min_similarity=min_similarity,
-        final_top_n=final_top_n
+        final_top_n=final_top_n,
+        mode=mode
+    ))
+
+    async def event_stream():
+        async for event, data in events:
+            yield f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
     )
-    return result
 
 @router.post("/ai/check-service-diagnosis")
-def check_service_diagnosis(payload: ServiceDiagnosisInput):
-    result = validation_gemini.check_service_diagnosis(payload.soap, payload.diagnoses, payload.service_codes)
+async def check_service_diagnosis(payload: ServiceDiagnosisInput):
+    result = await run_cpu(validation_gemini.check_service_diagnosis, payload.soap, payload.diagnoses, payload.service_codes)
     return {"results": result}
 
+@router.post("/ai/check-service-diagnosis/batch")
+async def check_service_diagnosis_batch(payload: ServiceDiagnosisBatchInput):
+    """Verdicts for many (service code, diagnosis) pairs in one call, without an LLM."""
+    pairs = [(p.service_code, p.diagnosis) for p in payload.pairs]
+    return {"results": await run_cpu(check_service_diagnosis_pairs, pairs, use_embeddings=payload.use_embeddings)}
+
 @router.post("/semantic-combo-warning")
-def semantic_combo_warning(payload: ComboInput):
-    warnings = validation_gemini.check_semantic_combo_warning(payload.service_codes, payload.soap)
+async def semantic_combo_warning(payload: ComboInput):
+    warnings = await validation_gemini.check_semantic_combo_warning_async(payload.service_codes, payload.soap, payload.explain)
     return {"warnings": warnings}
 
+@router.get("/llm/providers")
+async def llm_provider_stats():
+    """Circuit state, concurrency limit and call metrics per LLM provider."""
+    return {"providers": get_provider_stats()}
+
+@router.get("/metrics")
+async def metrics():
+    """Prometheus metrics: request and stage latency histograms, cache hits, model batch sizes, LLM tokens."""
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4")
+
+@router.get("/executors")
+async def executor_stats():
+    """Workers, queue limit, in-flight tasks and rejections of the CPU executor."""
+    return {"executors": [get_cpu_executor().stats()]}
+
 @router.post("/diagnosis/search/invoke/local-embedding-model")
-def diagnosis_search_api(payload: DiagnosisSearchRequest):
-    return {"results": diagnosis_search.search_diagnosis(payload.query, payload.top_k)}
+async def diagnosis_search_api(payload: DiagnosisSearchRequest):
+    return {"results": await run_cpu(diagnosis_search.search_diagnosis, payload.query, payload.top_k)}
 
 @router.post("/pii/analyze")
-def analyze_pii(input: PiiTextInput):
-    entities = analyze_text(input.text)
+async def analyze_pii(input: PiiTextInput, tier: Optional[Literal["fast", "standard", "auto"]] = Query(None)):
+    entities = (await run_cpu(analyze_and_anonymize, input.text, tier=tier)).entities
     return {"entities": entities}
 
 @router.post("/pii/anonymize")
-def anonymize_pii(input: PiiTextInput):
-    entities = analyze_text(input.text)
-    redacted = anonymize_text(input.text, entities)
+async def anonymize_pii(input: PiiTextInput, tier: Optional[Literal["fast", "standard", "auto"]] = Query(None)):
+    redacted = (await run_cpu(analyze_and_anonymize, input.text, tier=tier)).anonymized_text
     return {"anonymized_text": redacted}
 
+@router.post("/pii/anonymize/batch")
+async def anonymize_pii_batch(input: PiiBatchInput):
+    """
+    Anonymize many texts in one call (spaCy nlp.pipe across a process pool).
+    Returns anonymized texts in input order plus throughput metrics.
+    """
+    return await run_cpu(
+        anonymize_batch,
+        input.texts,
+        batch_size=input.batch_size,
+        workers=input.workers,
+        return_entities=input.return_entities,
+        tier=input.tier
+    )
+
+@router.get("/pii/cache")
+async def pii_cache_stats():
+    """Hit rate and size of the short-lived PII analysis cache."""
+    return get_pii_cache_stats()
+
+@router.get("/ai/rules/version")
+async def rules_version():
+    """Active takst rule set: content version, load time, rule count and reload status."""
+    return get_rule_store().info()
+
 @router.post("/ai/v2/check-note-requirements", response_model=CheckNoteResponse)
-def check_note(req: CheckNoteRequest):
-    result = validate_soap_against_codes(req.soap, req.service_codes)
+async def check_note(req: CheckNoteRequest):
+    result = await singleflight.do(
+        "check-note-requirements",
+        req.dict(),
+        lambda: validate_soap_against_codes_async(req.soap, req.service_codes),
+    )
     # result already matches {"overall":..., "results":[PerCodeResult,...]}
     # Ensure results serialization (Pydantic will handle PerCodeResult)
     return result
 
+@router.post("/ai/v2/check-note-requirements/batch")
+async def check_note_batch(request: Request, llm_workers: Optional[int] = Query(None, ge=1, le=64)):
+    """
+    Check many claims in one call. Body is either JSON `{"claims": [...], "llm_workers"?}`
+    or an `application/x-ndjson` stream with one `{"claim_id"?, "soap", "service_codes"}` per line.
+
+    Streams NDJSON: one line per claim as soon as it is complete (completion order,
+    with "index" = position in the input), then a final `{"summary": {...}}` line.
+    """
+    body = await request.body()
+    try:
+        if "ndjson" in request.headers.get("content-type", "") or "jsonl" in request.headers.get("content-type", ""):
+            claims = [NoteCheckBatchClaim(**json.loads(line)) for line in body.decode("utf-8").splitlines() if line.strip()]
+        else:
+            payload = NoteCheckBatchRequest(**json.loads(body))
+            claims = payload.claims
+            llm_workers = llm_workers or payload.llm_workers
+    except Exception as e:
+        raise HTTPException(status_code=422, detail=f"Invalid batch body: {e}")
+
+    lines = await stream_cpu(iter_validate_batch((c.dict() for c in claims), llm_workers=llm_workers))
+
+    async def result_stream():
+        async for line in lines:
+            yield json.dumps(line, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(result_stream(), media_type="application/x-ndjson")
+
 @router.post("/ai/claim-rejection/learn", response_model=ClaimRejectionResponse)
-def claim_rejection_learn(req: ClaimRejectionRequest):
-    return learn_from_rejection(req)
+async def claim_rejection_learn(req: ClaimRejectionRequest):
+    return await run_cpu(learn_from_rejection, req)
 
 @router.post("/ai/v3/self-learned-check-note-requirements", response_model=CheckNoteResponse)
-def self_learned_check(req: CheckNoteRequest):
+async def self_learned_check(req: CheckNoteRequest):
     """
     Enhanced version of v2: first checks whether a similar SOAP+codes
     has previously been rejected and learned by the system.
     If yes → fail immediately and return suggestions learned from past.
     Else → run normal engine.
     """
-    learned = lookup_learned_failure(req.soap, req.service_codes)
+    learned = await run_cpu(lookup_learned_failure, req.soap, req.service_codes)
     if learned:
-        # Fetch the original validation results from DB or reconstruct minimal results
-        # Here, we build dummy PerCodeResult objects per service code
-        learned_suggestions = learned.get("suggestions", [])
-        results = [
-            PerCodeResult(
-                service_code=code,
-                compliance="fail",
-                missing_terms=[],
-                suggestions=learned_suggestions,
-                gemini_used=False,
-                gemini_reasoning="Overridden by self-learning model.",
-                rule_version=None
-            )
-            for code in req.service_codes
-        ]
-        return CheckNoteResponse(
-            overall="fail",
-            results=results
-        )
-    analysis_dict = validate_soap_against_codes(req.soap, req.service_codes)
+        return learned_failure_response(learned, req.service_codes)
+    analysis_dict = await validate_soap_against_codes_async(req.soap, req.service_codes)
     response_obj = CheckNoteResponse(**analysis_dict)
     return response_obj
 
-@router.post("/ai/predict-claim-outcome", response_model=ClaimPredictionResponse)
-def predict_claim_outcome(req: CheckNoteRequest):
-    # Step 1: Analyze & anonymize the SOAP note
-    entities = analyze_text(req.soap)
-    anon_soap = anonymize_text(req.soap, entities)
+@router.post("/jobs", response_model=JobSubmitResponse, status_code=202)
+async def submit_job(req: JobSubmitRequest):
+    """
+    Run a long pipeline in the background instead of holding the request open.
 
-    # Step 2: Find similar past failures using anonymized SOAP
-    similar_failures = get_similar_failures(anon_soap, req.service_codes)
+    kind=extract_diagnoses takes the /ai/extract-diagnoses body plus its query
+    parameters (top_k, min_similarity, final_top_n, mode); kind=check_note_v3
+    takes the /ai/v3/self-learned-check-note-requirements body. Poll
+    GET /jobs/{job_id} for partial and final results.
+    """
+    model = ExtractDiagnosesJobInput if req.kind == "extract_diagnoses" else CheckNoteRequest
+    try:
+        payload = model(**req.payload).dict()
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=f"Invalid payload for '{req.kind}': {e}")
+    runner = await run_cpu(get_job_runner)  # first call opens SQLite and starts the workers
+    job_id = await run_cpu(runner.submit, req.kind, payload, req.priority)
+    return JobSubmitResponse(job_id=job_id, kind=req.kind, priority=req.priority, status="queued")
 
-    # Step 3: Calculate rejection probability
-    rejection_prob = calculate_rejection_probability(similar_failures)
+@router.get("/jobs/{job_id}", response_model=JobStatusResponse)
+async def get_job(job_id: str):
+    job = await run_cpu(get_job_runner().store.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    return JobStatusResponse(**job)
 
-    # Step 4: Assign risk level
-    risk_level = assign_risk_level(rejection_prob)
+@router.get("/jobs")
+async def job_stats():
+    return await run_cpu(get_job_runner().stats)
 
-    # Step 5: Aggregate suggestions from similar failures
-    suggestions = aggregate_suggestions(similar_failures)
+@router.post("/ai/claim-analysis", response_model=ClaimAnalysisResponse)
+async def claim_analysis(req: ClaimAnalysisRequest):
+    """
+    Service-code suggestions, diagnosis extraction, note-requirement validation
+    and rejection prediction for one claim. PII analysis and the nb-sbert
+    encoding of the note run once and are shared; the four branches run
+    concurrently. A failed branch is null and listed in `errors`; `timings`
+    has the start offset and duration of every stage.
+    """
+    return await analyze_claim(req.soap, req.service_codes, top_k=req.top_k, mode=req.mode)
 
-    # Step 6: Estimate reimbursement
-    base_reimbursement = 1000.0
-    estimated_reimbursement = base_reimbursement * (1.0 - rejection_prob)
+@router.post("/ai/predict-claim-outcome", response_model=ClaimPredictionResponse)
+async def predict_claim_outcome(req: CheckNoteRequest):
+    # PII, embedding, FAISS and SQLite only: the whole prediction runs on the CPU executor
+    return await run_cpu(_predict_claim_outcome, req)
 
-    # Step 7: Enhanced reasoning message with debugging info
-    num_similar = len(similar_failures)
-    if num_similar == 0:
-        reasoning = "Low risk: No similar past failures found in learning database."
-    else:
-        scores = [f["score"] for f in similar_failures]
-        avg_score = sum(scores) / len(scores)
-        max_score = max(scores)
-
-        reasoning = (
-            f"{risk_level.title()} risk: Found {num_similar} similar failure(s). "
-            f"Similarity scores: avg={avg_score:.3f}, max={max_score:.3f}. "
-            f"Calculated rejection probability: {rejection_prob:.3f}"
-        )
+def _predict_claim_outcome(req: CheckNoteRequest) -> ClaimPredictionResponse:
+    # Step 1: Analyze & anonymize the SOAP note
+    anon_soap = anonymize_soap(req.soap)
+    return predict_outcome(anon_soap, req.service_codes)
 
-    return ClaimPredictionResponse(
-        rejection_probability=rejection_prob,
-        risk_level=risk_level,
-        suggestions=suggestions,
-        reasoning=reasoning,
-        estimated_reimbursement=estimated_reimbursement
-    )
+@router.post("/ai/reimbursement/estimate")
+async def estimate_reimbursement(payload: ReimbursementEstimateRequest):
+    """
+    Batch revenue forecast: tariff amount per claim (date-valid rates, repetition
+    percentages) and the expected amount after each claim's rejection probability.
+    """
+    start = time.perf_counter()
+    result = await run_cpu(estimate_claims, [claim.dict() for claim in payload.claims])
+    result["elapsed_ms"] = (time.perf_counter() - start) * 1000
+    return result
 
 # Add a debugging endpoint
 @router.post("/ai/predict-claim-outcome/debug")
 def predict_claim_outcome_debug(req: CheckNoteRequest):
     """Debug version that shows detailed breakdown"""
-    entities = analyze_text(req.soap)
-    anon_soap = anonymize_text(req.soap, entities)
+    anon_soap = anonymize_soap(req.soap)
 
     # Get detailed breakdown
     breakdown = get_risk_breakdown(anon_soap, req.service_codes)
@@ -6,3 +6,95 @@ load_dotenv()
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 USE_GEMINI = os.getenv("USE_GEMINI", "false").lower() == "true"
+
+# Optional endpoint overrides, e.g. the local stand-in (python -m app.llm_stub.server)
+GEMINI_API_ENDPOINT = os.getenv("GEMINI_API_ENDPOINT")
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL")
+
+# Semantic cache for the Gemini query rewrite in service_search
+REWRITE_CACHE_ENABLED = os.getenv("REWRITE_CACHE_ENABLED", "true").lower() == "true"
+REWRITE_CACHE_THRESHOLD = float(os.getenv("REWRITE_CACHE_THRESHOLD", "0.97"))
+REWRITE_CACHE_MAX_ENTRIES = int(os.getenv("REWRITE_CACHE_MAX_ENTRIES", "1024"))
+
+# PII detection tier: fast (regex only) | standard (regex + spaCy NER) | auto
+PII_TIER = os.getenv("PII_TIER", "standard")
+
+# Request-scoped PII memoization (see app/core/pii_pipeline.py)
+PII_CACHE_TTL_S = float(os.getenv("PII_CACHE_TTL_S", "60"))
+PII_CACHE_MAX_ENTRIES = int(os.getenv("PII_CACHE_MAX_ENTRIES", "256"))
+
+# Batch PII anonymization (see app/core/pii_batch.py)
+PII_BATCH_SIZE = int(os.getenv("PII_BATCH_SIZE", "32"))
+PII_BATCH_WORKERS = int(os.getenv("PII_BATCH_WORKERS", str(max(1, (os.cpu_count() or 2) // 2))))  # size of the shared process pool
+
+# Chunked PII analysis of long documents (see app/core/pii_pipeline.py)
+PII_CHUNK_THRESHOLD_CHARS = int(os.getenv("PII_CHUNK_THRESHOLD_CHARS", "6000"))
+PII_CHUNK_SIZE_CHARS = int(os.getenv("PII_CHUNK_SIZE_CHARS", "3000"))
+PII_CHUNK_OVERLAP_CHARS = int(os.getenv("PII_CHUNK_OVERLAP_CHARS", "300"))
+PII_CHUNK_WORKERS = int(os.getenv("PII_CHUNK_WORKERS", str(PII_BATCH_WORKERS)))  # 1 = in-process; otherwise the shared batch pool
+
+# Note requirement term matching: also match Norwegian inflections of each term
+TERM_MATCH_STEMMING = os.getenv("TERM_MATCH_STEMMING", "false").lower() == "true"
+
+# Rule files are polled for changes this often (seconds); 0 disables hot reload
+RULES_RELOAD_INTERVAL_S = float(os.getenv("RULES_RELOAD_INTERVAL_S", "5"))
+
+# Precompiled reference data (see scripts/build_reference_snapshot.py)
+REFERENCE_SNAPSHOT_PATH = os.getenv("REFERENCE_SNAPSHOT_PATH", "data/reference_snapshot.bin")
+REFERENCE_SNAPSHOT_ENABLED = os.getenv("REFERENCE_SNAPSHOT_ENABLED", "true").lower() == "true"
+
+# Service-diagnosis compatibility: cosine similarity above which an unconstrained pair is "likely_compatible"
+SERVICE_DIAGNOSIS_SIM_THRESHOLD = float(os.getenv("SERVICE_DIAGNOSIS_SIM_THRESHOLD", "0.45"))
+
+# Batch note-requirement checks (see iter_validate_batch in app/core/validate_note_requirements/engine.py)
+NOTE_CHECK_BATCH_WINDOW = int(os.getenv("NOTE_CHECK_BATCH_WINDOW", "256"))
+NOTE_CHECK_LLM_WORKERS = int(os.getenv("NOTE_CHECK_LLM_WORKERS", "8"))
+
+# Dedicated executor for CPU-bound stages (encode, FAISS, cross-encoder, PII); see app/core/executors.py
+# When workers + queue slots are all taken, requests get 503 with Retry-After
+CPU_EXECUTOR_WORKERS = int(os.getenv("CPU_EXECUTOR_WORKERS", str(os.cpu_count() or 2)))
+CPU_EXECUTOR_MAX_QUEUE = int(os.getenv("CPU_EXECUTOR_MAX_QUEUE", "64"))
+
+# Per-stage timings (see app/core/telemetry.py): also return them in an X-Stage-Timings response header
+STAGE_TIMINGS_HEADER = os.getenv("STAGE_TIMINGS_HEADER", "false").lower() == "true"
+
+# Structured logging (see app/core/structured_logging.py)
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "0.01"))  # share of requests whose DEBUG/INFO records are kept
+LOG_REDACT = os.getenv("LOG_REDACT", "true").lower() == "true"
+
+# Async job API (see app/core/jobs.py): SQLite-backed jobs run by a worker pool with an interactive and a bulk lane
+JOBS_DB_PATH = os.getenv("JOBS_DB_PATH", "data/jobs.db")
+JOBS_WORKERS = int(os.getenv("JOBS_WORKERS", "4"))
+JOBS_INTERACTIVE_RESERVED = int(os.getenv("JOBS_INTERACTIVE_RESERVED", "1"))  # workers that never take bulk jobs
+JOBS_MAX_QUEUED = int(os.getenv("JOBS_MAX_QUEUED", "1000"))  # per lane; beyond that POST /jobs returns 503
+JOBS_TTL_S = float(os.getenv("JOBS_TTL_S", "3600"))  # finished jobs are deleted this long after completion
+
+# Single-flight: concurrent identical requests share one pipeline run (see app/core/singleflight.py)
+SINGLEFLIGHT_ENABLED = os.getenv("SINGLEFLIGHT_ENABLED", "true").lower() == "true"
+
+# Latency tiers (see app/core/tiers.py): default pipeline depth when a request has no ?tier=
+LATENCY_TIER = os.getenv("LATENCY_TIER", "accurate")
+# LLM prices for the estimated_cost in tiered responses (USD per 1M tokens; gemini-1.5-flash list price)
+LLM_INPUT_USD_PER_1M = float(os.getenv("LLM_INPUT_USD_PER_1M", "0.075"))
+LLM_OUTPUT_USD_PER_1M = float(os.getenv("LLM_OUTPUT_USD_PER_1M", "0.30"))
+
+# Request recorder (see app/core/request_recorder.py): PII-scrubbed payloads and timings for load-test replay
+REQUEST_RECORDING_ENABLED = os.getenv("REQUEST_RECORDING_ENABLED", "false").lower() == "true"
+REQUEST_RECORDING_PATH = os.getenv("REQUEST_RECORDING_PATH", "data/recordings/requests.jsonl")
+REQUEST_RECORDING_SAMPLE_RATE = float(os.getenv("REQUEST_RECORDING_SAMPLE_RATE", "1.0"))
+REQUEST_RECORDING_BODIES = os.getenv("REQUEST_RECORDING_BODIES", "true").lower() == "true"  # false: payload shapes only
+REQUEST_RECORDING_PII_TIER = os.getenv("REQUEST_RECORDING_PII_TIER", "standard")
+REQUEST_RECORDING_MAX_BODY_BYTES = int(os.getenv("REQUEST_RECORDING_MAX_BODY_BYTES", "262144"))
+REQUEST_RECORDING_MAX_QUEUE = int(os.getenv("REQUEST_RECORDING_MAX_QUEUE", "10000"))  # beyond that, records are dropped
+
+# LLM provider protection (see app/core/llm_provider.py)
+LLM_BREAKER_FAILURE_THRESHOLD = int(os.getenv("LLM_BREAKER_FAILURE_THRESHOLD", "5"))
+LLM_BREAKER_RECOVERY_S = float(os.getenv("LLM_BREAKER_RECOVERY_S", "30"))
+LLM_CONCURRENCY_INITIAL = int(os.getenv("LLM_CONCURRENCY_INITIAL", "8"))
+LLM_CONCURRENCY_MIN = int(os.getenv("LLM_CONCURRENCY_MIN", "1"))
+LLM_CONCURRENCY_MAX = int(os.getenv("LLM_CONCURRENCY_MAX", "32"))
+LLM_SLOW_CALL_S = float(os.getenv("LLM_SLOW_CALL_S", "10"))
+LLM_RATE_PER_S = float(os.getenv("LLM_RATE_PER_S", "10"))  # 0 disables rate limiting
+LLM_RATE_BURST = float(os.getenv("LLM_RATE_BURST", "20"))
+LLM_ACQUIRE_TIMEOUT_S = float(os.getenv("LLM_ACQUIRE_TIMEOUT_S", "2"))
@@ -0,0 +1,112 @@
+# app/core/claim_analysis.py
+"""
+One-call claim analysis: PII, service-code suggestions, diagnosis extraction,
+note-requirement validation and rejection prediction for a single note.
+
+Called separately, those endpoints each anonymize the note, and several
+encode it with nb-sbert. Here the shared stages run once and the branches
+consume their output:
+
+    pii ──► encode ──► service_codes   (rewrite cache key + retrieval vector reused)
+     │         └─────► prediction      (learning-index vector reused)
+     └───────────────► diagnoses       (concept grouping on the anonymized note)
+    rules                              (raw note: term offsets refer to the submitted text)
+
+`encode` is one batched call for the anonymized note and its rewrite-cache
+key; the rewrite of the note is only encoded again when it differs from both.
+Branches are non-critical: a failing branch is reported in `errors` and the
+others still return.
+"""
+import numpy as np
+from typing import Any, Dict, List
+
+from app import config
+from app.core import rerank_gemini, rerank_openai, service_search, validation_gemini
+from app.core.dag import Node, run_dag
+from app.core.executors import run_cpu
+from app.core.pii_pipeline import anonymize_soap
+from app.core.predict_helpers import predict_outcome
+from app.core.telemetry import record_batch, stage
+from app.core.validate_note_requirements.engine import validate_soap_against_codes_async
+
+
+# ----------------------------
+# Shared stages
+# ----------------------------
+async def _pii(args: Dict[str, Any]) -> str:
+    return await run_cpu(anonymize_soap, args["soap"])
+
+
+def _encode_texts(texts: List[str]) -> Dict[str, np.ndarray]:
+    unique = list(dict.fromkeys(texts))
+    record_batch("embed", len(unique))
+    with stage("embed"):
+        vectors = service_search.embed_model.encode(unique, convert_to_numpy=True)
+    return {text: np.asarray(vec, dtype=np.float32) for text, vec in zip(unique, vectors)}
+
+
+async def _encode(args: Dict[str, Any]) -> Dict[str, np.ndarray]:
+    anon = args["pii"]
+    return await run_cpu(_encode_texts, [anon, service_search._cache_key_text(anon)])
+
+
+# ----------------------------
+# Branches
+# ----------------------------
+async def _service_codes(args: Dict[str, Any]) -> Dict[str, Any]:
+    anon, vectors = args["pii"], args["encode"]
+    rewrite = await service_search.rewrite_query_async(
+        anon, key_embedding=vectors.get(service_search._cache_key_text(anon))
+    )
+    candidates = await run_cpu(
+        service_search.retrieve_candidates, anon, rewrite["text"], embedding=vectors.get(rewrite["text"])
+    )
+    if config.USE_GEMINI:
+        decision = await rerank_gemini.get_best_code_async(anon, candidates, args["top_k"])
+    else:
+        decision = await rerank_openai.rerank_with_openai_async(anon, candidates)
+    return {"decision": decision, "query_rewrite": rewrite}
+
+
+async def _diagnoses(args: Dict[str, Any]) -> Dict[str, Any]:
+    return await validation_gemini.extract_diagnoses_from_soap_async(
+        args["pii"], mode=args["mode"], anonymized=True
+    )
+
+
+async def _rules(args: Dict[str, Any]) -> Dict[str, Any]:
+    result = await validate_soap_against_codes_async(args["soap"], args["service_codes"])
+    return {"overall": result["overall"], "results": [r.dict() for r in result["results"]]}
+
+
+async def _prediction(args: Dict[str, Any]) -> Dict[str, Any]:
+    anon = args["pii"]
+    prediction = await run_cpu(predict_outcome, anon, args["service_codes"], embedding=args["encode"][anon])
+    return prediction.dict()
+
+
+CLAIM_ANALYSIS_DAG = (
+    Node("pii", _pii),
+    Node("encode", _encode, deps=("pii",)),
+    Node("service_codes", _service_codes, deps=("pii", "encode"), critical=False),
+    Node("diagnoses", _diagnoses, deps=("pii",), critical=False),
+    Node("rules", _rules, critical=False),
+    Node("prediction", _prediction, deps=("pii", "encode"), critical=False),
+)
+
+BRANCHES = ("service_codes", "diagnoses", "rules", "prediction")
+
+
+async def analyze_claim(soap: str, service_codes: List[str], top_k: int = 5, mode: str = "llm") -> Dict[str, Any]:
+    """Merged branch results plus per-node timings. Raises when PII or encoding fails (e.g. Overloaded)."""
+    run = await run_dag(
+        CLAIM_ANALYSIS_DAG,
+        inputs={"soap": soap, "service_codes": service_codes, "top_k": top_k, "mode": mode},
+    )
+    return {
+        "anonymized_soap": run.results["pii"],
+        **{branch: run.results.get(branch) for branch in BRANCHES},
+        "errors": run.errors,
+        "timings": run.timings,
+        "total_ms": run.total_ms,
+    }
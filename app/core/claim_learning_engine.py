@@ -7,7 +7,7 @@ import numpy as np
 import logging
 from typing import List, Dict, Any
 
-from app.core.pii_analyzer import analyze_text, anonymize_text
+from app.core.pii_pipeline import anonymize_soap
 from app.core.sentence_model_registry import get_sentence_model
 from app.core.validate_note_requirements.engine import validate_soap_against_codes
 from app.schemas import ClaimRejectionRequest, ClaimRejectionResponse
@@ -125,8 +125,7 @@ def _extract_suggestions(analysis: Any) -> List[str]:
 # -------------------------------
 def learn_from_rejection(req: ClaimRejectionRequest) -> ClaimRejectionResponse:
     """Adds a new failed claim to the knowledge base."""
-    entities = analyze_text(req.soap)
-    anon_soap = anonymize_text(req.soap, entities)
+    anon_soap = anonymize_soap(req.soap)
 
     # Generate and normalize embedding
     embedding = embed_model.encode([anon_soap], convert_to_numpy=True).astype(np.float32)
@@ -178,8 +177,7 @@ def lookup_learned_failure(soap: str, service_codes: List[str]) -> Dict[str, Any
         logging.info("FAISS index is empty. No learned failures to look up.")
         return None
 
-    entities = analyze_text(soap)
-    anon_soap = anonymize_text(soap, entities)
+    anon_soap = anonymize_soap(soap)
 
     # Generate and normalize query embedding
     embedding = embed_model.encode([anon_soap], convert_to_numpy=True).astype(np.float32)
@@ -227,6 +225,26 @@ def lookup_learned_failure(soap: str, service_codes: List[str]) -> Dict[str, Any
     logging.info(f"Service codes do not match. Stored: {stored_codes}, Provided: {service_codes}")
     return None
 
+def learned_failure_response(learned: Dict[str, Any], service_codes: List[str]) -> CheckNoteResponse:
+    """
+    Response for a SOAP+codes that matched a learned failure: every code fails
+    with the suggestions learned from the past rejection.
+    """
+    learned_suggestions = learned.get("suggestions", [])
+    results = [
+        PerCodeResult(
+            service_code=code,
+            compliance="fail",
+            missing_terms=[],
+            suggestions=learned_suggestions,
+            gemini_used=False,
+            gemini_reasoning="Overridden by self-learning model.",
+            rule_version=None
+        )
+        for code in service_codes
+    ]
+    return CheckNoteResponse(overall="fail", results=results)
+
 def reset_learning_index_storage():
     """Safely resets the DB and FAISS index files."""
     global FAISS_INDEX, DB_CONN, DB_CURSOR
@@ -0,0 +1,181 @@
+# app/core/combination_rules.py
+"""
+Deterministic service-code combination checks from data/taksttabell.xml.
+
+- ugyldigKombinasjon: codes that may not be billed together with this code.
+  "Alle unntatt|a|b|..." means every code except the listed ones, and a bare
+  "Alle" means every other code. Treated as symmetric (if A excludes B, then
+  B excludes A).
+- kreverTakst: this code requires at least one of the listed codes.
+
+Both are precomputed once into Python int bitsets (one bit per code), so a
+check is a handful of AND operations per selected code.
+"""
+import threading
+import xml.etree.ElementTree as ET
+from typing import Any, Dict, List
+
+import numpy as np
+
+TAKST_XML = "data/taksttabell.xml"
+NS = {"t": "http://helfo.no/skjema/taksttabell"}
+ALL_EXCEPT = "Alle unntatt"
+ALL = "Alle"
+
+
+def _split_codes(value: str) -> List[str]:
+    return [c.strip() for c in (value or "").split("|") if c.strip()]
+
+
+class CombinationRules:
+    @classmethod
+    def from_bit_matrices(cls, codes: List[str], known: List[bool], descriptions: List[str],
+                          conflicts: np.ndarray, requires: np.ndarray) -> "CombinationRules":
+        """Rebuild from `bit_matrix()` rows (as stored in the reference snapshot)."""
+        rules = cls.__new__(cls)
+        rules.codes = list(codes)
+        rules.index = {code: i for i, code in enumerate(rules.codes)}
+        rules.known = {code for code, is_known in zip(rules.codes, known) if is_known}
+        rules.descriptions = {code: desc for code, desc in zip(rules.codes, descriptions) if desc}
+        rules.conflicts = [int.from_bytes(row.tobytes(), "little") for row in conflicts]
+        rules.requires = [int.from_bytes(row.tobytes(), "little") for row in requires]
+        return rules
+
+    def __init__(self, codes: List[str], descriptions: Dict[str, str],
+                 invalid: Dict[str, List[str]], all_except: Dict[str, List[str]],
+                 requires: Dict[str, List[str]]):
+        # Codes only referenced by other codes' rules still get a bit
+        referenced = [c for lst in list(invalid.values()) + list(all_except.values()) + list(requires.values()) for c in lst]
+        self.codes = list(dict.fromkeys(list(codes) + referenced))
+        self.index = {code: i for i, code in enumerate(self.codes)}
+        self.known = set(codes)
+        self.descriptions = descriptions
+        n = len(self.codes)
+        all_bits = (1 << n) - 1
+
+        self.conflicts = [0] * n
+        for code, excluded in invalid.items():
+            self.conflicts[self.index[code]] |= self._mask(excluded)
+        for code, allowed in all_except.items():
+            i = self.index[code]
+            self.conflicts[i] |= all_bits & ~self._mask(allowed) & ~(1 << i)
+        # Symmetric closure
+        for i in range(n):
+            bits = self.conflicts[i]
+            while bits:
+                low = bits & -bits
+                self.conflicts[low.bit_length() - 1] |= 1 << i
+                bits ^= low
+
+        self.requires = [0] * n
+        for code, required in requires.items():
+            self.requires[self.index[code]] = self._mask(required)
+
+    def _mask(self, codes: List[str]) -> int:
+        mask = 0
+        for code in codes:
+            i = self.index.get(code)
+            if i is not None:
+                mask |= 1 << i
+        return mask
+
+    def bit_matrix(self, masks: List[int]) -> np.ndarray:
+        """Bitsets as an (n, ceil(n/8)) uint8 matrix, little-endian per row."""
+        width = (len(self.codes) + 7) // 8
+        return np.frombuffer(b"".join(mask.to_bytes(width, "little") for mask in masks), dtype=np.uint8).reshape(len(masks), width)
+
+    @staticmethod
+    def indices_of(mask: int) -> List[int]:
+        out = []
+        while mask:
+            low = mask & -mask
+            out.append(low.bit_length() - 1)
+            mask ^= low
+        return out
+
+    def _codes_of(self, mask: int) -> List[str]:
+        return [self.codes[i] for i in self.indices_of(mask)]
+
+    def check(self, service_codes: List[str]) -> Dict[str, Any]:
+        """
+        Returns {"valid", "invalid_pairs": [[a, b], ...],
+                 "missing_requirements": [{"code", "requires_any_of"}], "unknown_codes"}.
+        Repeating the same code is not a combination conflict.
+        """
+        selected = list(dict.fromkeys(str(c).strip() for c in service_codes if str(c).strip()))
+        unknown = [c for c in selected if c not in self.known]
+        present = [c for c in selected if c in self.index]
+        selected_mask = self._mask(present)
+
+        invalid_pairs = []
+        missing = []
+        for code in present:
+            i = self.index[code]
+            # Report each pair once, from its lower-indexed member
+            clash = self.conflicts[i] & selected_mask & ~((1 << (i + 1)) - 1)
+            invalid_pairs.extend([code, other] for other in self._codes_of(clash))
+            required = self.requires[i]
+            if required and not required & selected_mask:
+                missing.append({"code": code, "requires_any_of": self._codes_of(required)})
+
+        return {
+            "valid": not invalid_pairs and not missing,
+            "invalid_pairs": invalid_pairs,
+            "missing_requirements": missing,
+            "unknown_codes": unknown,
+        }
+
+
+def load_combination_rules(path: str = TAKST_XML) -> CombinationRules:
+    root = ET.parse(path).getroot()
+    codes, descriptions = [], {}
+    invalid, all_except, requires = {}, {}, {}
+    for takst in root.findall(".//t:Takst", NS):
+        code = (takst.findtext("t:takstkode", default="", namespaces=NS) or "").strip()
+        if not code:
+            continue
+        codes.append(code)
+        descriptions[code] = (takst.findtext("t:Beskrivelse", default="", namespaces=NS) or "").strip()
+
+        excluded = _split_codes(takst.findtext("t:ugyldigKombinasjon", default="", namespaces=NS))
+        if excluded and excluded[0] == ALL_EXCEPT:
+            all_except[code] = excluded[1:]
+        elif excluded == [ALL]:
+            all_except[code] = []
+        elif excluded:
+            invalid[code] = excluded
+
+        required = _split_codes(takst.findtext("t:kreverTakst", default="", namespaces=NS))
+        if required:
+            requires[code] = required
+    return CombinationRules(codes, descriptions, invalid, all_except, requires)
+
+
+_rules = None
+_rules_lock = threading.Lock()
+
+
+def get_combination_rules() -> CombinationRules:
+    """From the reference snapshot when it is current, else parsed from taksttabell.xml."""
+    from app.core.reference_snapshot import get_snapshot
+
+    global _rules
+    if _rules is None:
+        with _rules_lock:
+            if _rules is None:
+                snapshot = get_snapshot()
+                if snapshot is not None:
+                    _rules = CombinationRules.from_bit_matrices(
+                        snapshot.strings("combination.codes"),
+                        snapshot.array("combination.known").tolist(),
+                        snapshot.strings("combination.descriptions"),
+                        snapshot.array("combination.conflicts"),
+                        snapshot.array("combination.requires"),
+                    )
+                else:
+                    _rules = load_combination_rules()
+    return _rules
+
+
+def check_combination(service_codes: List[str]) -> Dict[str, Any]:
+    return get_combination_rules().check(service_codes)
@@ -0,0 +1,115 @@
+# app/core/concept_extractor.py
+"""
+Local fast-path alternative to `group_clinical_concepts_with_gemini`.
+
+Uses the spaCy `nb_core_news_sm` pipeline of the PII analyzer (loaded on first use):
+1. Split the SOAP note into sections (S/O/A/P headings); the Plan section is skipped.
+2. Segment sections into sentences (spaCy) and clauses (coordinators / semicolons).
+3. Drop negated findings (NegEx-style cue + scope up to the next comma/clause end).
+4. Keep clauses that carry clinical content (noun/adjective/number tokens).
+"""
+import re
+from typing import List
+
+from app.core.pii_analyzer import get_nlp_engine, LANG_CODE
+
+MAX_CONCEPTS = 8
+
+# "S:", "Subjektivt:", "Objective -", "Vurdering:" ... at the start of a line
+SECTION_REGEX = re.compile(
+    r"^\s*(S|O|A|P|Subjektivt?|Subjective|Objektivt?|Objective|Vurdering|Assessment|Plan|Tiltak)\s*:\s*",
+    flags=re.IGNORECASE | re.MULTILINE,
+)
+SKIP_SECTIONS = {"p", "plan", "tiltak"}
+
+CLAUSE_SPLIT_REGEX = re.compile(
+    r"\s*;\s*|,?\s+\b(?:samt|men|i tillegg til|i tillegg|but|as well as|in addition to|in addition)\b\s+",
+    flags=re.IGNORECASE,
+)
+
+# Negation cue followed by its scope (until the next comma/semicolon)
+PRE_NEGATION_REGEX = re.compile(
+    r"\b(?:ingen|ikke|uten|negativ for|no|not|without|denies|denied|negative for)\b[^,;]*",
+    flags=re.IGNORECASE,
+)
+# Finding followed by a post-negation cue ("... ble utelukket")
+POST_NEGATION_REGEX = re.compile(
+    r"[^,;]*\b(?:ble utelukket|er utelukket|ble avkreftet|er avkreftet|was ruled out|is ruled out|was excluded)\b",
+    flags=re.IGNORECASE,
+)
+PLACEHOLDER_REGEX = re.compile(r"<[A-Z_]+>")
+
+CONTENT_POS = {"NOUN", "PROPN", "ADJ", "NUM"}
+NON_CLINICAL_WORDS = {
+    "pasient", "pasienten", "patient", "lege", "legen", "legekontoret", "kontoret",
+    "telefon", "e-post", "e-postadressen", "uke", "uker", "dag", "dager", "time", "timer",
+    "hun", "han", "she", "he", "doctor", "phone",
+}
+
+
+def _nlp():
+    return get_nlp_engine().nlp[LANG_CODE]
+
+
+def split_sections(soap: str) -> List[tuple[str, str]]:
+    """Returns [(section_label, text)]. Text before any heading gets label ''."""
+    matches = list(SECTION_REGEX.finditer(soap))
+    if not matches:
+        return [("", soap)]
+    sections = []
+    if matches[0].start() > 0:
+        sections.append(("", soap[:matches[0].start()]))
+    for m, nxt in zip(matches, matches[1:] + [None]):
+        end = nxt.start() if nxt else len(soap)
+        sections.append((m.group(1).lower(), soap[m.end():end]))
+    return sections
+
+
+def remove_negated(clause: str) -> str:
+    clause = POST_NEGATION_REGEX.sub("", clause)
+    clause = PRE_NEGATION_REGEX.sub("", clause)
+    return re.sub(r"\s*,\s*(,\s*)+", ", ", clause).strip(" ,.")
+
+
+def _clinical_words(sent) -> set[str]:
+    """Lower-cased content words (noun/adjective/number) of a spaCy sentence span."""
+    return {
+        tok.text.lower()
+        for tok in sent
+        if tok.pos_ in CONTENT_POS and tok.text.lower() not in NON_CLINICAL_WORDS
+    }
+
+
+def extract_concepts(soap_text: str) -> List[str]:
+    """
+    Extract clinical concept strings from an (anonymized) SOAP note without an LLM call.
+    Returns at most MAX_CONCEPTS de-duplicated concepts in note order.
+    """
+    nlp = _nlp()
+    disable = [name for name in ("ner",) if name in nlp.pipe_names]
+
+    section_texts = [
+        PLACEHOLDER_REGEX.sub("", text)
+        for label, text in split_sections(soap_text)
+        if label not in SKIP_SECTIONS and text.strip()
+    ]
+
+    concepts = []
+    seen = set()
+    for doc in nlp.pipe(section_texts, disable=disable):
+        for sent in doc.sents:
+            clinical_words = _clinical_words(sent)
+            if not clinical_words:
+                continue
+            for clause in CLAUSE_SPLIT_REGEX.split(sent.text):
+                clause = remove_negated(" ".join(clause.split()))
+                key = clause.lower()
+                if len(clause) <= 2 or key in seen:
+                    continue
+                if not clinical_words.intersection(re.findall(r"[\w-]+", key)):
+                    continue
+                seen.add(key)
+                concepts.append(clause)
+                if len(concepts) >= MAX_CONCEPTS:
+                    return concepts
+    return concepts
@@ -0,0 +1,125 @@
+# app/core/dag.py
+"""
+Minimal async DAG executor for composite endpoints.
+
+    nodes = [
+        Node("pii", anonymize),
+        Node("encode", encode, deps=("pii",)),
+        Node("search", search, deps=("pii", "encode"), critical=False),
+    ]
+    run = await run_dag(nodes, inputs={"soap": soap})
+    run.results["search"], run.errors, run.timings
+
+Each node's `fn(results)` is an async callable that gets a dict holding
+`inputs` plus the results of the nodes it depends on. A node starts as soon
+as all of its dependencies are done, so independent branches run
+concurrently on the event loop. They hand CPU work to the executor
+themselves.
+
+- A critical node that fails re-raises its exception from `run_dag` (e.g.
+  executors.Overloaded → 503); shared stages should be critical.
+- A non-critical node that fails is recorded in `errors`, and the nodes
+  that depend on it are marked "skipped".
+- `timings[name]` holds start offset, duration and status, and each node's
+  duration is also recorded as stage `dag:<name>` in the request timings.
+"""
+import time
+import asyncio
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+from app.core.telemetry import record_stage
+
+
+@dataclass(frozen=True)
+class Node:
+    name: str
+    fn: Callable[[Dict[str, Any]], Awaitable[Any]]
+    deps: Tuple[str, ...] = ()
+    critical: bool = True
+
+
+@dataclass
+class DagRun:
+    results: Dict[str, Any] = field(default_factory=dict)
+    errors: Dict[str, str] = field(default_factory=dict)
+    timings: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+    total_ms: float = 0.0
+
+
+class _Skipped(Exception):
+    pass
+
+
+def topological_order(nodes: Iterable[Node]) -> List[Node]:
+    """Nodes ordered so every dependency comes first. Raises ValueError on unknown deps or cycles."""
+    by_name = {}
+    for node in nodes:
+        if node.name in by_name:
+            raise ValueError(f"Duplicate DAG node '{node.name}'")
+        by_name[node.name] = node
+    ordered, state = [], {}  # state: 1 = visiting, 2 = done
+
+    def visit(name: str, path: Tuple[str, ...]):
+        if state.get(name) == 2:
+            return
+        if state.get(name) == 1:
+            raise ValueError(f"DAG cycle: {' -> '.join(path + (name,))}")
+        if name not in by_name:
+            raise ValueError(f"Unknown DAG dependency '{name}' (from '{path[-1]}')")
+        state[name] = 1
+        for dep in by_name[name].deps:
+            visit(dep, path + (name,))
+        state[name] = 2
+        ordered.append(by_name[name])
+
+    for name in by_name:
+        visit(name, ())
+    return ordered
+
+
+async def run_dag(nodes: Iterable[Node], inputs: Optional[Dict[str, Any]] = None) -> DagRun:
+    ordered = topological_order(nodes)
+    run = DagRun()
+    tasks: Dict[str, asyncio.Task] = {}
+    t0 = time.perf_counter()
+
+    async def execute(node: Node):
+        dep_results = await asyncio.gather(*(tasks[d] for d in node.deps), return_exceptions=True)
+        failed = [d for d, r in zip(node.deps, dep_results) if isinstance(r, BaseException)]
+        if failed:
+            run.timings[node.name] = {"start_ms": None, "duration_ms": 0.0, "status": "skipped"}
+            run.errors[node.name] = f"skipped: dependency {', '.join(failed)} failed"
+            raise _Skipped(node.name)
+
+        args = dict(inputs or {})
+        args.update(zip(node.deps, dep_results))
+        start = time.perf_counter()
+        status = "ok"
+        try:
+            result = await node.fn(args)
+            run.results[node.name] = result
+            return result
+        except Exception as e:
+            status = "error"
+            run.errors[node.name] = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            duration = time.perf_counter() - start
+            record_stage(f"dag:{node.name}", duration)
+            run.timings[node.name] = {
+                "start_ms": round((start - t0) * 1000, 1),
+                "duration_ms": round(duration * 1000, 1),
+                "status": status,
+            }
+
+    for node in ordered:  # dependencies' tasks always exist before their dependents'
+        tasks[node.name] = asyncio.ensure_future(execute(node))
+
+    outcomes = await asyncio.gather(*tasks.values(), return_exceptions=True)
+    run.total_ms = round((time.perf_counter() - t0) * 1000, 1)
+    run.timings = {node.name: run.timings[node.name] for node in ordered if node.name in run.timings}
+    for node, outcome in zip(ordered, outcomes):
+        if node.critical and isinstance(outcome, BaseException) and not isinstance(outcome, _Skipped):
+            raise outcome
+    return run
@@ -4,7 +4,11 @@ import sqlite3
 import numpy as np
 from app.core.sentence_model_registry import get_sentence_model, get_cross_encoder_model
 import torch
-import json
+from app.core.reference_snapshot import get_snapshot
+from app.core.telemetry import record_batch, stage
+from app.core.structured_logging import get_logger, lazy
+
+log = get_logger(__name__)
 
 DB_PATH = "data/diagnosis_codes.db"
 INDEX_PATH = "index/diagnosis_index.faiss"
@@ -25,10 +29,15 @@ sentence_model = get_sentence_model(EMBED_MODEL)
 cross_encoder_model = get_cross_encoder_model(CROSS_ENCODER)
 index = faiss.read_index(INDEX_PATH)
 
-conn = sqlite3.connect(DB_PATH, check_same_thread=False)
-cursor = conn.cursor()
-cursor.execute("SELECT * FROM diagnosis_codes ORDER BY id")
-all_codes = cursor.fetchall()
+# Code rows come from the precompiled reference snapshot when it is current
+snapshot = get_snapshot()
+if snapshot is not None:
+    all_codes = snapshot.records("icd10")
+else:
+    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
+    cursor = conn.cursor()
+    cursor.execute("SELECT * FROM diagnosis_codes ORDER BY id")
+    all_codes = cursor.fetchall()
 
 # --- Verification ---
 if index.ntotal != len(all_codes):
@@ -38,100 +47,141 @@ if index.ntotal != len(all_codes):
     )
 # --------------------
 
-def search_diagnosis_with_explanation(
-    grouped_concepts: list[str],
+def search_concept(
+    concept: str,
     top_k: int = 3,
     min_similarity: float = 0.6,
     return_raw: bool = False,
-    initial_k: int = 50  # how many candidates to fetch first from FAISS
-):
-    results = []
-
-    for concept in grouped_concepts:
-        print(f"[DEBUG] Searching concept: '{concept}'")
-
-        # ---- Stage 1: Sentence model + FAISS ----
+    initial_k: int = 50,
+    cross_encoder: bool = True
+) -> dict:
+    """
+    FAISS + cross-encoder search for a single grouped concept.
+    cross_encoder=False keeps the FAISS order and cosine similarity (fast latency tier).
+    Returns {"concept": ..., "matches": [...]}.
+    """
+    # ---- Stage 1: Sentence model + FAISS ----
+    with stage("embed"):
         embedding = np.array(sentence_model.encode([concept], convert_to_numpy=True), dtype=np.float32)
         embedding = normalize_vectors(embedding)
+    with stage("faiss"):
         D, I = index.search(embedding, k=initial_k)
 
-        def to_serializable(obj):
-            if isinstance(obj, (np.float32, np.float64)):
-                return float(obj)
-            if isinstance(obj, (np.int32, np.int64)):
-                return int(obj)
-            return str(obj)
-
-        candidates = []
-        for dist, idx in zip(D[0], I[0]):
-            if idx == -1:
-                continue
-            code, description = all_codes[idx]
-            similarity_score = 1 - (dist ** 2) / 2
-            candidates.append((code, description, similarity_score))
-
-        print("---------------------------------------------------")
-        print(f"Initial FAISS search results for '{concept}':")
-        print(f"Candidates: {json.dumps(candidates, indent=2, ensure_ascii=False, default=to_serializable)}")
-
-        if not candidates:
-            results.append({
-                "concept": concept,
-                "matches": [{
-                    "code": None,
-                    "description": None,
-                    "reason": "No FAISS candidates found",
-                    "similarity": None
-                }]
-            })
+    candidates = []
+    for dist, idx in zip(D[0], I[0]):
+        if idx == -1:
             continue
+        code, description = all_codes[idx]
+        similarity_score = 1 - (dist ** 2) / 2
+        candidates.append((code, description, similarity_score))
+
+    log.debug(
+        "faiss_candidates",
+        concept=concept,
+        count=len(candidates),
+        top=lazy(lambda: [(code, round(float(sim), 3)) for code, _, sim in candidates[:5]]),
+    )
 
-        # ---- Stage 2: Re-rank with cross-encoder ----
-        ce_inputs = [(concept, desc) for _, desc, _ in candidates]
-        ce_scores = cross_encoder_model.predict(ce_inputs)
-        ce_scores = torch.sigmoid(torch.tensor(ce_scores)).numpy()
-
-        # Attach CE scores to candidates
-        reranked = [
-            {
-                "code": code,
-                "description": description,
-                "reason": (
-                    f"Cross-encoder re-ranked match. Original FAISS similarity: {sim:.2f}, "
-                    f"cross-encoder score: {score:.2f}."
-                ),
-                "similarity": float(score)
-            }
-            for (code, description, sim), score in zip(candidates, ce_scores)
-        ]
-
-        # Sort by cross-encoder score
-        reranked = sorted(reranked, key=lambda x: x["similarity"], reverse=True)
-
-        print(f"Renranked: {json.dumps(reranked, indent=2, ensure_ascii=False, default=to_serializable)}")
-
-        # Keep only top_k, and apply min_similarity if return_raw=False
-        final_matches = []
-        for match in reranked[:top_k]:
-            if not return_raw and match["similarity"] < min_similarity:
-                continue
-            final_matches.append(match)
-
-        if not final_matches and not return_raw:
-            final_matches.append({
+    if not candidates:
+        return {
+            "concept": concept,
+            "matches": [{
                 "code": None,
                 "description": None,
-                "reason": f"No ICD-10 matches above similarity threshold {min_similarity}",
+                "reason": "No FAISS candidates found",
                 "similarity": None
-            })
+            }]
+        }
 
-        results.append({
-            "concept": concept,
-            "matches": final_matches
+    # ---- Stage 2: Re-rank with cross-encoder ----
+    if not cross_encoder:
+        return _faiss_only_result(concept, candidates, top_k, min_similarity, return_raw)
+
+    ce_inputs = [(concept, desc) for _, desc, _ in candidates]
+    record_batch("cross_encoder", len(ce_inputs))
+    with stage("cross_encoder"):
+        ce_scores = cross_encoder_model.predict(ce_inputs)
+        ce_scores = torch.sigmoid(torch.tensor(ce_scores)).numpy()
+
+    # Attach CE scores to candidates
+    reranked = [
+        {
+            "code": code,
+            "description": description,
+            "reason": (
+                f"Cross-encoder re-ranked match. Original FAISS similarity: {sim:.2f}, "
+                f"cross-encoder score: {score:.2f}."
+            ),
+            "similarity": float(score)
+        }
+        for (code, description, sim), score in zip(candidates, ce_scores)
+    ]
+
+    # Sort by cross-encoder score
+    reranked = sorted(reranked, key=lambda x: x["similarity"], reverse=True)
+
+    log.debug(
+        "cross_encoder_reranked",
+        concept=concept,
+        top=lazy(lambda: [(m["code"], round(m["similarity"], 3)) for m in reranked[:5]]),
+    )
+
+    # Keep only top_k, and apply min_similarity if return_raw=False
+    final_matches = []
+    for match in reranked[:top_k]:
+        if not return_raw and match["similarity"] < min_similarity:
+            continue
+        final_matches.append(match)
+
+    if not final_matches and not return_raw:
+        final_matches.append({
+            "code": None,
+            "description": None,
+            "reason": f"No ICD-10 matches above similarity threshold {min_similarity}",
+            "similarity": None
+        })
+
+    return {
+        "concept": concept,
+        "matches": final_matches
+    }
+
+
+def _faiss_only_result(concept: str, candidates: list, top_k: int, min_similarity: float, return_raw: bool) -> dict:
+    """search_concept result from FAISS alone (already sorted by distance); similarity is the cosine."""
+    final_matches = [
+        {
+            "code": code,
+            "description": description,
+            "reason": f"FAISS match (cosine similarity {sim:.2f}); no cross-encoder re-ranking.",
+            "similarity": float(sim)
+        }
+        for code, description, sim in candidates[:top_k]
+        if return_raw or sim >= min_similarity
+    ]
+    if not final_matches and not return_raw:
+        final_matches.append({
+            "code": None,
+            "description": None,
+            "reason": f"No ICD-10 matches above similarity threshold {min_similarity}",
+            "similarity": None
         })
+    return {"concept": concept, "matches": final_matches}
+
+
+def search_diagnosis_with_explanation(
+    grouped_concepts: list[str],
+    top_k: int = 3,
+    min_similarity: float = 0.6,
+    return_raw: bool = False,
+    initial_k: int = 50  # how many candidates to fetch first from FAISS
+):
+    results = [
+        search_concept(concept, top_k=top_k, min_similarity=min_similarity, return_raw=return_raw, initial_k=initial_k)
+        for concept in grouped_concepts
+    ]
 
-    print(f"[DEBUG] Finished searching {len(grouped_concepts)} concepts.")
-    print(f"Results from Encoders: {results}")
+    log.debug("concepts_searched", count=len(grouped_concepts))
     return {"diagnoses": results}
 
 
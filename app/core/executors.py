@@ -0,0 +1,157 @@
+# app/core/executors.py
+"""
+Dedicated, bounded executor for CPU-bound stages (sentence encoding, FAISS,
+cross-encoder, spaCy/Presidio PII) called from async handlers.
+
+The event loop only awaits: LLM calls use async clients, CPU work is handed
+to this pool. The pool has a fixed number of workers and a fixed number of
+queue slots; when every slot is taken, `run_cpu` raises `Overloaded`
+immediately instead of queueing. The API returns that as 503 with a
+Retry-After, so under overload latency stays bounded and the excess load is
+shed. Streaming endpoints use `stream_cpu`, which holds one slot for the
+whole stream and runs each step on the pool.
+
+contextvars (request-scoped state such as stage timers) are copied into
+the worker thread for each task.
+"""
+import time
+import asyncio
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, AsyncIterator, Callable, Dict, Iterator
+
+from app import config
+
+_DONE = object()
+
+
+class Overloaded(RuntimeError):
+    """Raised when the CPU executor's queue is full. Mapped to 503 + Retry-After."""
+
+    def __init__(self, name: str, retry_after_s: float):
+        super().__init__(f"Executor '{name}' is at capacity; retry in {retry_after_s:.1f}s")
+        self.name = name
+        self.retry_after_s = retry_after_s
+
+
+class BoundedExecutor:
+    """ThreadPoolExecutor with at most `workers + max_queue` tasks admitted at once."""
+
+    def __init__(self, name: str, workers: int, max_queue: int):
+        self.name = name
+        self.workers = max(1, int(workers))
+        self.max_queue = max(0, int(max_queue))
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix=f"{name}-executor")
+        self._slots = threading.BoundedSemaphore(self.workers + self.max_queue)
+        self._lock = threading.Lock()
+        self.metrics: Dict[str, float] = {
+            "submitted": 0,
+            "completed": 0,
+            "rejected": 0,
+            "in_flight": 0,
+            "queue_wait_total_s": 0.0,
+            "run_total_s": 0.0,
+        }
+
+    def _count(self, key: str, value: float = 1):
+        with self._lock:
+            self.metrics[key] += value
+
+    def retry_after_s(self) -> float:
+        """Rough time until a slot frees up: queued work / workers × average task time."""
+        with self._lock:
+            completed = self.metrics["completed"]
+            avg_run = self.metrics["run_total_s"] / completed if completed else 0.1
+        return max(1.0, (self.max_queue / self.workers + 1) * avg_run)
+
+    async def run(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        if not self._slots.acquire(blocking=False):
+            self._count("rejected")
+            raise Overloaded(self.name, self.retry_after_s())
+        self._count("submitted")
+        self._count("in_flight")
+        ctx = contextvars.copy_context()
+        enqueued = time.monotonic()
+
+        def task():
+            started = time.monotonic()
+            try:
+                return ctx.run(partial(fn, *args, **kwargs))
+            finally:
+                # Released by the worker, so a cancelled request does not free
+                # its slot while the task is still running
+                self._slots.release()
+                finished = time.monotonic()
+                with self._lock:
+                    self.metrics["in_flight"] -= 1
+                    self.metrics["completed"] += 1
+                    self.metrics["queue_wait_total_s"] += started - enqueued
+                    self.metrics["run_total_s"] += finished - started
+
+        return await asyncio.get_running_loop().run_in_executor(self._pool, task)
+
+    async def stream(self, iterator: Iterator[Any]) -> AsyncIterator[Any]:
+        """
+        Admit a streaming task: one slot is taken now (Overloaded if none is
+        free, so the handler can still answer 503) and held until the stream
+        ends; each `next(iterator)` runs on the pool.
+        """
+        steps = self._stream(iterator)
+        await steps.__anext__()
+        return steps
+
+    async def _stream(self, iterator: Iterator[Any]) -> AsyncIterator[Any]:
+        if not self._slots.acquire(blocking=False):
+            self._count("rejected")
+            raise Overloaded(self.name, self.retry_after_s())
+        self._count("submitted")
+        self._count("in_flight")
+        ctx = contextvars.copy_context()
+        loop = asyncio.get_running_loop()
+        started = time.monotonic()
+        try:
+            yield None  # started: the slot is released on exhaustion, close or garbage collection
+            while True:
+                item = await loop.run_in_executor(self._pool, ctx.run, next, iterator, _DONE)
+                if item is _DONE:
+                    return
+                yield item
+        finally:
+            self._slots.release()
+            with self._lock:
+                self.metrics["in_flight"] -= 1
+                self.metrics["completed"] += 1
+                self.metrics["run_total_s"] += time.monotonic() - started
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            metrics = dict(self.metrics)
+        completed = metrics["completed"]
+        metrics["queue_wait_avg_s"] = metrics["queue_wait_total_s"] / completed if completed else 0.0
+        metrics["run_avg_s"] = metrics["run_total_s"] / completed if completed else 0.0
+        return {"name": self.name, "workers": self.workers, "max_queue": self.max_queue, "metrics": metrics}
+
+
+_cpu_executor = None
+_cpu_executor_lock = threading.Lock()
+
+
+def get_cpu_executor() -> BoundedExecutor:
+    global _cpu_executor
+    if _cpu_executor is None:
+        with _cpu_executor_lock:
+            if _cpu_executor is None:
+                _cpu_executor = BoundedExecutor("cpu", config.CPU_EXECUTOR_WORKERS, config.CPU_EXECUTOR_MAX_QUEUE)
+    return _cpu_executor
+
+
+async def run_cpu(fn: Callable[..., Any], *args, **kwargs) -> Any:
+    """Run a CPU-bound `fn(*args, **kwargs)` on the shared bounded executor. Raises Overloaded."""
+    return await get_cpu_executor().run(fn, *args, **kwargs)
+
+
+async def stream_cpu(iterator: Iterator[Any]) -> AsyncIterator[Any]:
+    """Step a blocking iterator on the shared bounded executor for a streaming response. Raises Overloaded."""
+    return await get_cpu_executor().stream(iterator)
@@ -0,0 +1,325 @@
+# app/core/jobs.py
+"""
+Background jobs for pipelines that outlive a gateway timeout (chained LLM calls).
+
+POST /jobs stores the job in SQLite and returns its id. A pool of worker
+threads runs it, and GET /jobs/{id} returns its status, the partial results
+recorded so far, and then the final result or error.
+
+- Two lanes: "interactive" and "bulk". Workers always take interactive jobs
+  first; JOBS_INTERACTIVE_RESERVED workers take interactive jobs only, so a
+  large bulk submission can never occupy every worker.
+- At most JOBS_MAX_QUEUED jobs wait per lane; beyond that submit() raises
+  executors.Overloaded (503 + Retry-After).
+- Finished jobs expire JOBS_TTL_S after completion and are purged by a
+  cleanup thread. Jobs still queued when the process stopped are re-queued
+  on start; jobs that were running are marked failed ("interrupted").
+- The request payload (raw SOAP) is only kept while the job waits or runs:
+  finish() replaces it with {} and strips the data from the partial events,
+  keeping their names and times.
+"""
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional
+
+from app import config
+from app.core.executors import Overloaded
+from app.core.structured_logging import get_logger
+from app.core.telemetry import end_request, start_request
+
+log = get_logger(__name__)
+
+LANES = ("interactive", "bulk")
+QUEUED, RUNNING, SUCCEEDED, FAILED = "queued", "running", "succeeded", "failed"
+CLEARED_PAYLOAD = "{}"  # payload of finished jobs; the column is NOT NULL in existing databases
+
+
+# ----------------------------
+# Job kinds
+# ----------------------------
+def _run_extract_diagnoses(payload: Dict[str, Any], report: Callable[[str, Any], None]) -> Any:
+    from app.core import validation_gemini
+
+    for event, data in validation_gemini.iter_extract_diagnoses_events(
+        payload["soap"],
+        top_k=payload.get("top_k", 5),
+        min_similarity=payload.get("min_similarity", 0.6),
+        final_top_n=payload.get("final_top_n", 1),
+        mode=payload.get("mode", "llm"),
+    ):
+        if event == "done":
+            return data
+        report(event, data)
+
+
+def _run_check_note_v3(payload: Dict[str, Any], report: Callable[[str, Any], None]) -> Any:
+    """Same steps as /ai/v3/self-learned-check-note-requirements."""
+    from app.core.claim_learning_engine import learned_failure_response, lookup_learned_failure
+    from app.core.validate_note_requirements.engine import validate_soap_against_codes
+    from app.schemas_new.validate_note_requirements import CheckNoteResponse
+
+    soap, service_codes = payload["soap"], payload["service_codes"]
+    learned = lookup_learned_failure(soap, service_codes)
+    report("learned_lookup", {"matched": bool(learned)})
+    if learned:
+        return learned_failure_response(learned, service_codes).dict()
+    return CheckNoteResponse(**validate_soap_against_codes(soap, service_codes)).dict()
+
+
+JOB_KINDS: Dict[str, Callable[[Dict[str, Any], Callable[[str, Any], None]], Any]] = {
+    "extract_diagnoses": _run_extract_diagnoses,
+    "check_note_v3": _run_check_note_v3,
+}
+
+
+# ----------------------------
+# SQLite store
+# ----------------------------
+class JobStore:
+    def __init__(self, path: str):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                priority TEXT NOT NULL,
+                status TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                partial TEXT NOT NULL DEFAULT '[]',
+                result TEXT,
+                error TEXT,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL,
+                expires_at REAL
+            )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs(status, created_at)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_expires ON jobs(expires_at)")
+            self._conn.commit()
+
+    def _execute(self, sql: str, params=()) -> sqlite3.Cursor:
+        with self._lock:
+            cursor = self._conn.execute(sql, params)
+            self._conn.commit()
+            return cursor
+
+    def create(self, job_id: str, kind: str, lane: str, payload: Dict[str, Any]):
+        self._execute(
+            "INSERT INTO jobs (id, kind, priority, status, payload, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (job_id, kind, lane, QUEUED, json.dumps(payload, ensure_ascii=False), time.time()),
+        )
+
+    def mark_running(self, job_id: str):
+        self._execute("UPDATE jobs SET status=?, started_at=? WHERE id=?", (RUNNING, time.time(), job_id))
+
+    def append_partial(self, job_id: str, event: str, data: Any):
+        with self._lock:
+            row = self._conn.execute("SELECT partial FROM jobs WHERE id=?", (job_id,)).fetchone()
+            if row is None:
+                return
+            partial = json.loads(row[0])
+            partial.append({"event": event, "data": data, "at": time.time()})
+            self._conn.execute("UPDATE jobs SET partial=? WHERE id=?", (json.dumps(partial, ensure_ascii=False, default=str), job_id))
+            self._conn.commit()
+
+    def finish(self, job_id: str, result: Any = None, error: Optional[str] = None, ttl_s: float = 3600):
+        """Store the outcome and drop the request payload and the partial data (note text); event names and times are kept."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT partial FROM jobs WHERE id=?", (job_id,)).fetchone()
+            events = [{"event": p["event"], "at": p["at"]} for p in json.loads(row[0])] if row else []
+            self._conn.execute(
+                "UPDATE jobs SET status=?, payload=?, partial=?, result=?, error=?, finished_at=?, expires_at=? WHERE id=?",
+                (
+                    FAILED if error else SUCCEEDED,
+                    CLEARED_PAYLOAD,
+                    json.dumps(events),
+                    None if error else json.dumps(result, ensure_ascii=False, default=str),
+                    error,
+                    now,
+                    now + ttl_s,
+                    job_id,
+                ),
+            )
+            self._conn.commit()
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, kind, priority, status, partial, result, error, created_at, started_at, finished_at, expires_at "
+                "FROM jobs WHERE id=?",
+                (job_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        keys = ("job_id", "kind", "priority", "status", "partial", "result", "error", "created_at", "started_at", "finished_at", "expires_at")
+        job = dict(zip(keys, row))
+        job["partial"] = json.loads(job["partial"])
+        job["result"] = json.loads(job["result"]) if job["result"] is not None else None
+        return job
+
+    def payload(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT payload FROM jobs WHERE id=?", (job_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def purge_expired(self, now: Optional[float] = None) -> int:
+        return self._execute("DELETE FROM jobs WHERE expires_at IS NOT NULL AND expires_at < ?", (now or time.time(),)).rowcount
+
+    def recover(self, ttl_s: float) -> List[tuple]:
+        """After a restart: fail interrupted jobs, return (id, priority) of jobs still queued, oldest first."""
+        now = time.time()
+        self._execute(
+            "UPDATE jobs SET status=?, payload=?, partial='[]', error=?, finished_at=?, expires_at=? WHERE status=?",
+            (FAILED, CLEARED_PAYLOAD, "interrupted by restart", now, now + ttl_s, RUNNING),
+        )
+        with self._lock:
+            return self._conn.execute("SELECT id, priority FROM jobs WHERE status=? ORDER BY created_at", (QUEUED,)).fetchall()
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {status: count for status, count in rows}
+
+
+# ----------------------------
+# Worker pool
+# ----------------------------
+class JobRunner:
+    def __init__(self, store: JobStore, workers: int, interactive_reserved: int, max_queued: int, ttl_s: float,
+                 cleanup_interval_s: float = 60.0):
+        self.store = store
+        self.workers = max(1, int(workers))
+        self.interactive_reserved = min(max(0, int(interactive_reserved)), self.workers - 1) if self.workers > 1 else 0
+        self.max_queued = max(1, int(max_queued))
+        self.ttl_s = ttl_s
+        self.cleanup_interval_s = cleanup_interval_s
+        self._queues = {lane: deque() for lane in LANES}
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self.completed = 0
+        self.failed = 0
+
+    def start(self):
+        for job_id, lane in self.store.recover(self.ttl_s):
+            self._queues[lane if lane in LANES else "bulk"].append(job_id)
+        for i in range(self.workers):
+            lanes = ("interactive",) if i < self.interactive_reserved else LANES
+            thread = threading.Thread(target=self._work, args=(lanes,), name=f"job-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        cleaner = threading.Thread(target=self._cleanup, name="job-cleanup", daemon=True)
+        cleaner.start()
+        self._threads.append(cleaner)
+
+    def stop(self):
+        self._stop.set()
+        with self._cond:
+            self._cond.notify_all()
+
+    def submit(self, kind: str, payload: Dict[str, Any], lane: str = "interactive") -> str:
+        if kind not in JOB_KINDS:
+            raise ValueError(f"Unknown job kind '{kind}'")
+        if lane not in LANES:
+            raise ValueError(f"Unknown lane '{lane}'")
+        with self._cond:
+            if len(self._queues[lane]) >= self.max_queued:
+                raise Overloaded(f"jobs:{lane}", self._retry_after_s())
+            job_id = uuid.uuid4().hex
+            self.store.create(job_id, kind, lane, payload)
+            self._queues[lane].append(job_id)
+            self._cond.notify()
+        return job_id
+
+    def _retry_after_s(self) -> float:
+        return max(5.0, self.max_queued / self.workers)
+
+    def _next(self, lanes) -> Optional[str]:
+        with self._cond:
+            while not self._stop.is_set():
+                for lane in lanes:  # interactive first
+                    if self._queues[lane]:
+                        return self._queues[lane].popleft()
+                self._cond.wait(timeout=1.0)
+        return None
+
+    def _work(self, lanes):
+        while True:
+            job_id = self._next(lanes)
+            if job_id is None:
+                return
+            self._run(job_id)
+
+    def _run(self, job_id: str):
+        job = self.store.get(job_id)
+        payload = self.store.payload(job_id)
+        if job is None or payload is None or job["status"] != QUEUED:
+            return
+        self.store.mark_running(job_id)
+        token = start_request(f"job:{job['kind']}")  # stage timings labelled per job kind
+        try:
+            result = JOB_KINDS[job["kind"]](payload, lambda event, data: self.store.append_partial(job_id, event, data))
+            self.store.finish(job_id, result=result, ttl_s=self.ttl_s)
+            self.completed += 1
+        except Exception as e:
+            log.exception("job_failed", job_id=job_id, kind=job["kind"])
+            self.store.finish(job_id, error=f"{type(e).__name__}: {e}", ttl_s=self.ttl_s)
+            self.failed += 1
+        finally:
+            end_request(token)
+
+    def _cleanup(self):
+        while not self._stop.wait(self.cleanup_interval_s):
+            try:
+                purged = self.store.purge_expired()
+                if purged:
+                    log.info("jobs_purged", count=purged)
+            except Exception:
+                log.exception("job_cleanup_failed")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            queued = {lane: len(q) for lane, q in self._queues.items()}
+        return {
+            "workers": self.workers,
+            "interactive_reserved": self.interactive_reserved,
+            "max_queued": self.max_queued,
+            "queued": queued,
+            "completed": self.completed,
+            "failed": self.failed,
+            "stored": self.store.counts(),
+        }
+
+
+_runner = None
+_runner_lock = threading.Lock()
+
+
+def get_job_runner() -> JobRunner:
+    """Process-wide runner; the store is opened and the workers started on first use."""
+    global _runner
+    if _runner is None:
+        with _runner_lock:
+            if _runner is None:
+                runner = JobRunner(
+                    JobStore(config.JOBS_DB_PATH),
+                    workers=config.JOBS_WORKERS,
+                    interactive_reserved=config.JOBS_INTERACTIVE_RESERVED,
+                    max_queued=config.JOBS_MAX_QUEUED,
+                    ttl_s=config.JOBS_TTL_S,
+                )
+                runner.start()
+                _runner = runner
+    return _runner
@@ -0,0 +1,397 @@
+# app/core/llm_provider.py
+"""
+Shared protection layer around the hosted LLM providers (Gemini, OpenAI).
+
+Every outbound LLM call goes through a ProviderClient, which combines:
+- a circuit breaker, so a browned-out provider fails fast instead of making
+  every request wait for its own timeout,
+- an AIMD concurrency limit (additive increase on success, multiplicative
+  decrease on failure/slow calls),
+- a token bucket rate limit per provider,
+- counters/latency metrics exposed via `get_provider_stats()`.
+
+When a call is rejected, ProviderUnavailable is raised. Callers already have
+local fallbacks (cross-encoder order, deterministic term checks) and use them
+immediately in that case.
+
+`call_async` / `gemini_generate_async` apply the same protections to
+coroutines (async SDK clients) and wait without blocking the event loop.
+Under the REST transport (GEMINI_API_ENDPOINT, e.g. the local stand-in) the
+Gemini SDK has no working async client, so the sync call runs in a thread.
+"""
+import asyncio
+import threading
+import time
+import logging
+from typing import Any, Awaitable, Callable, Dict
+
+import google.generativeai as genai
+
+from app import config
+from app.core.telemetry import record_llm_usage
+
+logger = logging.getLogger(__name__)
+
+
+class ProviderUnavailable(RuntimeError):
+    """Raised when a provider call is rejected by the breaker, limiter or rate limit."""
+
+    def __init__(self, provider: str, reason: str, retry_after_s: float = 1.0):
+        super().__init__(f"LLM provider '{provider}' unavailable: {reason}")
+        self.provider = provider
+        self.reason = reason
+        self.retry_after_s = retry_after_s
+
+
+# -------------------------------
+# Token bucket
+# -------------------------------
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second, bursts up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        elapsed = now - self._updated
+        self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+        self._updated = now
+
+    def try_acquire(self) -> float:
+        """Take one token. Returns 0.0 on success, else seconds until a token is available."""
+        if self.rate <= 0:
+            return 0.0  # rate limiting disabled
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= 1.0:
+                self._tokens -= 1.0
+                return 0.0
+            return (1.0 - self._tokens) / self.rate
+
+    def acquire(self, timeout_s: float) -> bool:
+        deadline = time.monotonic() + timeout_s
+        while True:
+            wait = self.try_acquire()
+            if wait == 0.0:
+                return True
+            if time.monotonic() + wait > deadline:
+                return False
+            time.sleep(wait)
+
+    async def acquire_async(self, timeout_s: float) -> bool:
+        deadline = time.monotonic() + timeout_s
+        while True:
+            wait = self.try_acquire()
+            if wait == 0.0:
+                return True
+            if time.monotonic() + wait > deadline:
+                return False
+            await asyncio.sleep(wait)
+
+
+# -------------------------------
+# AIMD concurrency limiter
+# -------------------------------
+class AIMDLimiter:
+    """
+    Adaptive concurrency limit. The limit grows by `increase / limit` per
+    successful call (≈ +1 per window of calls) and is multiplied by `decrease`
+    on failures or calls slower than `latency_threshold_s`.
+    """
+
+    def __init__(self, initial: int, min_limit: int, max_limit: int,
+                 increase: float = 1.0, decrease: float = 0.5, latency_threshold_s: float = 10.0):
+        self.min_limit = max(1, int(min_limit))
+        self.max_limit = max(self.min_limit, int(max_limit))
+        self.limit = float(min(max(initial, self.min_limit), self.max_limit))
+        self.increase = increase
+        self.decrease = decrease
+        self.latency_threshold_s = latency_threshold_s
+        self.in_flight = 0
+        self._cond = threading.Condition()
+
+    def try_acquire(self) -> bool:
+        with self._cond:
+            if self.in_flight < int(self.limit):
+                self.in_flight += 1
+                return True
+            return False
+
+    def acquire(self, timeout_s: float) -> bool:
+        deadline = time.monotonic() + timeout_s
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            self.in_flight += 1
+            return True
+
+    async def acquire_async(self, timeout_s: float, poll_s: float = 0.01) -> bool:
+        """Like acquire(), polling with asyncio.sleep so the event loop is never blocked."""
+        deadline = time.monotonic() + timeout_s
+        while not self.try_acquire():
+            if time.monotonic() >= deadline:
+                return False
+            await asyncio.sleep(poll_s)
+        return True
+
+    def release(self, success: bool, latency_s: float):
+        with self._cond:
+            self.in_flight = max(0, self.in_flight - 1)
+            if success and latency_s <= self.latency_threshold_s:
+                self.limit = min(self.max_limit, self.limit + self.increase / self.limit)
+            else:
+                self.limit = max(self.min_limit, self.limit * self.decrease)
+            self._cond.notify_all()
+
+    def release_slot(self):
+        """Free an in-flight slot without adjusting the limit (cancelled calls say nothing about the provider)."""
+        with self._cond:
+            self.in_flight = max(0, self.in_flight - 1)
+            self._cond.notify_all()
+
+
+# -------------------------------
+# Circuit breaker
+# -------------------------------
+class CircuitBreaker:
+    """
+    closed → open after `failure_threshold` consecutive failures.
+    open → half_open after `recovery_timeout_s`; a single probe call is let through.
+    half_open → closed on probe success, back to open on probe failure.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int, recovery_timeout_s: float):
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.recovery_timeout_s = recovery_timeout_s
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN:
+                if time.monotonic() - self.opened_at < self.recovery_timeout_s:
+                    return False
+                self.state = self.HALF_OPEN
+                self._probe_in_flight = False
+            # half-open: only one probe at a time
+            if self._probe_in_flight:
+                return False
+            self._probe_in_flight = True
+            return True
+
+    def retry_after_s(self) -> float:
+        """Seconds until an open circuit lets a probe through."""
+        if self.state != self.OPEN:
+            return 0.0
+        return max(0.0, self.recovery_timeout_s - (time.monotonic() - self.opened_at))
+
+    def release_probe(self):
+        """Give back a half-open probe slot that was admitted but never called the provider."""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_success(self):
+        with self._lock:
+            self.consecutive_failures = 0
+            self._probe_in_flight = False
+            self.state = self.CLOSED
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            self._probe_in_flight = False
+            if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logger.warning(f"Circuit opened after {self.consecutive_failures} consecutive failure(s).")
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+
+# -------------------------------
+# Provider client
+# -------------------------------
+class ProviderClient:
+    """Wraps calls to one provider with breaker, limiter, rate limit and metrics."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.breaker = CircuitBreaker(config.LLM_BREAKER_FAILURE_THRESHOLD, config.LLM_BREAKER_RECOVERY_S)
+        self.limiter = AIMDLimiter(
+            initial=config.LLM_CONCURRENCY_INITIAL,
+            min_limit=config.LLM_CONCURRENCY_MIN,
+            max_limit=config.LLM_CONCURRENCY_MAX,
+            latency_threshold_s=config.LLM_SLOW_CALL_S,
+        )
+        self.bucket = TokenBucket(config.LLM_RATE_PER_S, config.LLM_RATE_BURST)
+        self.acquire_timeout_s = config.LLM_ACQUIRE_TIMEOUT_S
+        self._lock = threading.Lock()
+        self.metrics: Dict[str, float] = {
+            "calls": 0,
+            "successes": 0,
+            "failures": 0,
+            "rejected_open": 0,
+            "rejected_rate_limited": 0,
+            "rejected_concurrency": 0,
+            "latency_total_s": 0.0,
+            "latency_max_s": 0.0,
+        }
+
+    def _count(self, key: str, value: float = 1):
+        with self._lock:
+            self.metrics[key] += value
+
+    def _check_breaker(self):
+        if not self.breaker.allow():
+            self._count("rejected_open")
+            raise ProviderUnavailable(self.name, "circuit open", max(1.0, self.breaker.retry_after_s()))
+
+    def _reject_rate_limited(self):
+        self._count("rejected_rate_limited")
+        # Rejection is not a provider failure, but a half-open probe must be released
+        self.breaker.release_probe()
+        raise ProviderUnavailable(self.name, "rate limited", max(1.0, 1.0 / self.bucket.rate) if self.bucket.rate > 0 else 1.0)
+
+    def _reject_concurrency(self):
+        self._count("rejected_concurrency")
+        self.breaker.release_probe()
+        raise ProviderUnavailable(self.name, "concurrency limit reached")
+
+    def _admit(self):
+        """Breaker + rate limit checks shared by every call. Raises ProviderUnavailable."""
+        self._check_breaker()
+        if not self.bucket.acquire(self.acquire_timeout_s):
+            self._reject_rate_limited()
+
+    def _record(self, success: bool, latency_s: float):
+        self.limiter.release(success, latency_s)
+        if success:
+            self.breaker.record_success()
+        else:
+            self.breaker.record_failure()
+        with self._lock:
+            self.metrics["successes" if success else "failures"] += 1
+            self.metrics["latency_total_s"] += latency_s
+            self.metrics["latency_max_s"] = max(self.metrics["latency_max_s"], latency_s)
+
+    def call(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run `fn(*args, **kwargs)` under the provider protections."""
+        self._count("calls")
+        self._admit()
+        if not self.limiter.acquire(self.acquire_timeout_s):
+            self._reject_concurrency()
+
+        start = time.monotonic()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception:
+            self._record(False, time.monotonic() - start)
+            raise
+        self._record(True, time.monotonic() - start)
+        record_llm_usage(self.name, result)
+        return result
+
+    async def call_async(self, fn: Callable[..., Awaitable[Any]], *args, **kwargs) -> Any:
+        """Await `fn(*args, **kwargs)` under the same protections as call()."""
+        self._count("calls")
+        self._check_breaker()
+        if not await self.bucket.acquire_async(self.acquire_timeout_s):
+            self._reject_rate_limited()
+        if not await self.limiter.acquire_async(self.acquire_timeout_s):
+            self._reject_concurrency()
+
+        start = time.monotonic()
+        try:
+            result = await fn(*args, **kwargs)
+        except asyncio.CancelledError:
+            # Client went away; not the provider's fault
+            self.limiter.release_slot()
+            self.breaker.release_probe()
+            raise
+        except Exception:
+            self._record(False, time.monotonic() - start)
+            raise
+        self._record(True, time.monotonic() - start)
+        record_llm_usage(self.name, result)
+        return result
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            metrics = dict(self.metrics)
+        completed = metrics["successes"] + metrics["failures"]
+        metrics["latency_avg_s"] = metrics["latency_total_s"] / completed if completed else 0.0
+        return {
+            "provider": self.name,
+            "circuit_state": self.breaker.state,
+            "consecutive_failures": self.breaker.consecutive_failures,
+            "concurrency_limit": int(self.limiter.limit),
+            "in_flight": self.limiter.in_flight,
+            "metrics": metrics,
+        }
+
+
+_providers: Dict[str, ProviderClient] = {}
+_providers_lock = threading.Lock()
+
+
+def get_provider(name: str) -> ProviderClient:
+    """Returns the shared ProviderClient for `name` ('gemini' / 'openai')."""
+    with _providers_lock:
+        if name not in _providers:
+            _providers[name] = ProviderClient(name)
+        return _providers[name]
+
+
+_gemini_rest = False
+
+
+def configure_gemini(api_key: str):
+    """genai.configure(), honouring GEMINI_API_ENDPOINT (REST transport) when set."""
+    global _gemini_rest
+    _gemini_rest = bool(config.GEMINI_API_ENDPOINT)
+    if config.GEMINI_API_ENDPOINT:
+        genai.configure(
+            api_key=api_key,
+            transport="rest",
+            client_options={"api_endpoint": config.GEMINI_API_ENDPOINT},
+        )
+    else:
+        genai.configure(api_key=api_key)
+
+
+def gemini_generate(model, prompt: str):
+    """`model.generate_content(prompt)` through the shared Gemini provider client."""
+    if model is None:
+        raise RuntimeError("Gemini not available/configured.")
+    return get_provider("gemini").call(model.generate_content, prompt)
+
+
+async def gemini_generate_async(model, prompt: str):
+    """`await model.generate_content_async(prompt)` through the shared Gemini provider client."""
+    if model is None:
+        raise RuntimeError("Gemini not available/configured.")
+    if _gemini_rest:
+        # The SDK's async client wraps the sync REST method and then awaits its plain result (TypeError)
+        return await get_provider("gemini").call_async(asyncio.to_thread, model.generate_content, prompt)
+    return await get_provider("gemini").call_async(model.generate_content_async, prompt)
+
+
+def get_provider_stats() -> list[dict]:
+    with _providers_lock:
+        providers = list(_providers.values())
+    return [p.snapshot() for p in providers]
@@ -1,6 +1,7 @@
 import os
 import re
-from presidio_analyzer import AnalyzerEngine
+import threading
+from presidio_analyzer import AnalyzerEngine, RecognizerResult
 from presidio_analyzer.nlp_engine import NlpEngineProvider
 from presidio_analyzer.predefined_recognizers import SpacyRecognizer
 from presidio_anonymizer import AnonymizerEngine
@@ -8,10 +9,12 @@ from presidio_anonymizer import AnonymizerEngine
 from app.utils.pii.norwegian_fnr_recognizer import NorwegianFNRRecognizer
 from app.utils.pii.norwegian_phone_recognizer import NorwegianPhoneRecognizer
 from app.utils.pii.norwegian_address_recognizer import NorwegianAddressRecognizer
+from app.config import PII_TIER
 
 # -------- Config --------
 WHITELIST_FILE = "data/pii_whitelist.txt"
 LANG_CODE = "no"
+PII_TIERS = ("fast", "standard", "auto")
 
 # Regex for ICD-10 (e.g., A01, B20.1) and ICPC (e.g., K50, L03.1)
 ICD_CODE_REGEX = re.compile(r"\b([A-TV-Z][0-9]{2}(?:\.[0-9A-Z]{1,2})?)\b", re.IGNORECASE)
@@ -26,22 +29,65 @@ else:
 
 # ------------------------
 
-# Initialize NLP Engine for Norwegian
-provider = NlpEngineProvider(nlp_configuration={
-    "nlp_engine_name": "spacy",
-    "models": [{"lang_code": LANG_CODE, "model_name": "nb_core_news_sm"}]
-})
-nlp_engine = provider.create_engine()
-
-# Analyzer with default + custom recognizers
-analyzer = AnalyzerEngine(nlp_engine=nlp_engine, supported_languages=[LANG_CODE])
-analyzer.registry.add_recognizer(SpacyRecognizer())  # PERSON, LOCATION, ORG, etc.
-analyzer.registry.add_recognizer(NorwegianFNRRecognizer())
-analyzer.registry.add_recognizer(NorwegianPhoneRecognizer())
-analyzer.registry.add_recognizer(NorwegianAddressRecognizer())
+# Pure-regex Norwegian recognizers (shared by the standard analyzer and the fast tier)
+REGEX_RECOGNIZERS = [
+    NorwegianFNRRecognizer(),
+    NorwegianPhoneRecognizer(),
+    NorwegianAddressRecognizer(),
+]
 
 anonymizer = AnonymizerEngine()
 
+# spaCy nb_core_news_sm and the Presidio analyzer load on first use, so the
+# fast tier (and anything that only anonymizes given entities) never needs the model
+_nlp_engine = None
+_analyzer = None
+_engine_lock = threading.Lock()
+
+
+def get_nlp_engine():
+    """Presidio's spaCy engine for Norwegian; also used by the local concept extractor."""
+    global _nlp_engine
+    if _nlp_engine is None:
+        with _engine_lock:
+            if _nlp_engine is None:
+                provider = NlpEngineProvider(nlp_configuration={
+                    "nlp_engine_name": "spacy",
+                    "models": [{"lang_code": LANG_CODE, "model_name": "nb_core_news_sm"}]
+                })
+                _nlp_engine = provider.create_engine()
+    return _nlp_engine
+
+
+def get_analyzer() -> AnalyzerEngine:
+    """Analyzer with default + custom recognizers (standard tier)."""
+    global _analyzer
+    if _analyzer is None:
+        nlp_engine = get_nlp_engine()
+        with _engine_lock:
+            if _analyzer is None:
+                analyzer = AnalyzerEngine(nlp_engine=nlp_engine, supported_languages=[LANG_CODE])
+                analyzer.registry.add_recognizer(SpacyRecognizer())  # PERSON, LOCATION, ORG, etc.
+                for recognizer in REGEX_RECOGNIZERS:
+                    analyzer.registry.add_recognizer(recognizer)
+                _analyzer = analyzer
+    return _analyzer
+
+
+# Fast tier: all regex recognizer patterns compiled into one alternation,
+# one named group per pattern → (entity_type, score)
+_FAST_GROUPS = {}
+_fast_alternatives = []
+for recognizer in REGEX_RECOGNIZERS:
+    for pattern in recognizer.patterns:
+        group = f"p{len(_FAST_GROUPS)}"
+        _FAST_GROUPS[group] = (recognizer.supported_entities[0], pattern.score)
+        _fast_alternatives.append(f"(?P<{group}>{pattern.regex})")
+FAST_PATTERN = re.compile("|".join(_fast_alternatives), re.DOTALL | re.MULTILINE | re.IGNORECASE)
+
+# Auto tier: capitalized words that are not sentence-initial look like names
+CAPITALIZED_WORD_REGEX = re.compile(r"\b[A-ZÆØÅ][a-zæøå]{1,}\b")
+
 def is_whitelisted(term: str) -> bool:
     """Check if a detected term should be preserved."""
     if not term:
@@ -55,9 +101,46 @@ def is_whitelisted(term: str) -> bool:
         return True
     return False
 
-def analyze_text(text: str):
-    """Analyze and return detected entities, filtering out whitelisted terms."""
-    entities = analyzer.analyze(text=text, language=LANG_CODE)
+def analyze_text_fast(text: str):
+    """Fast tier: one pass of the combined Norwegian regex pattern, no spaCy NER."""
+    entities = []
+    for m in FAST_PATTERN.finditer(text):
+        entity_type, score = _FAST_GROUPS[m.lastgroup]
+        entities.append(RecognizerResult(entity_type=entity_type, start=m.start(), end=m.end(), score=score))
+    return entities
+
+
+def has_name_like_tokens(text: str) -> bool:
+    """True if a capitalized, non-whitelisted word appears anywhere but the start of a sentence."""
+    for m in CAPITALIZED_WORD_REGEX.finditer(text):
+        preceding = text[:m.start()].rstrip()
+        if not preceding or preceding[-1] in ".!?:\n":
+            continue
+        if not is_whitelisted(m.group()):
+            return True
+    return False
+
+
+def resolve_tier(text: str, tier: str = None) -> str:
+    """Map 'auto' (or the configured default) to the concrete tier to run for this text."""
+    tier = tier or PII_TIER
+    if tier not in PII_TIERS:
+        raise ValueError(f"Unknown PII tier: {tier}")
+    if tier == "auto":
+        return "standard" if has_name_like_tokens(text) else "fast"
+    return tier
+
+
+def analyze_text(text: str, tier: str = None):
+    """
+    Analyze and return detected entities, filtering out whitelisted terms.
+    tier: 'fast' (regex only), 'standard' (regex + spaCy NER) or 'auto'
+    (escalates to standard only when name-like capitalized tokens are present).
+    """
+    if resolve_tier(text, tier) == "fast":
+        entities = analyze_text_fast(text)
+    else:
+        entities = get_analyzer().analyze(text=text, language=LANG_CODE)
 
     filtered_entities = []
     for ent in entities:
@@ -0,0 +1,150 @@
+# app/core/pii_batch.py
+"""
+Batch PII anonymization for bulk learning / batch prediction.
+
+Texts are split into chunks and spread over a process pool whose workers each
+load the Presidio analyzer once. Inside a worker, spaCy runs over the chunk via
+`nlp.pipe` (Presidio's BatchAnalyzerEngine), then the whitelist filter is
+applied once per distinct entity string rather than once per entity.
+
+The pool is process-wide with a fixed size (PII_BATCH_WORKERS) and is shared
+with chunked analysis of long notes; a request's `workers` only limits how
+many chunks it splits into, never the pool itself.
+
+The `fast` tier (regex only) needs no spaCy model and always runs in-process.
+"""
+import time
+import math
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List
+
+from app import config
+from app.core.telemetry import record_batch, record_stage
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _init_worker():
+    """Load spaCy + Presidio once per worker process."""
+    from app.core.pii_analyzer import get_analyzer
+    get_analyzer()
+
+
+def _analyze_chunk(texts: List[str], batch_size: int, return_entities: bool, tier: str = "standard") -> List[Dict[str, Any]]:
+    from presidio_analyzer import BatchAnalyzerEngine
+    from app.core.pii_analyzer import anonymizer, get_analyzer, is_whitelisted, analyze_text_fast, LANG_CODE
+
+    if tier == "fast":
+        raw_results = [analyze_text_fast(text) for text in texts]
+    else:
+        batch_engine = BatchAnalyzerEngine(analyzer_engine=get_analyzer())
+        raw_results = list(batch_engine.analyze_iterator(texts, language=LANG_CODE, batch_size=batch_size))
+
+    # Whitelist check once per distinct surface string across the whole chunk
+    surface = {
+        text[ent.start:ent.end]
+        for text, entities in zip(texts, raw_results)
+        for ent in entities
+    }
+    whitelisted = {term for term in surface if is_whitelisted(term)}
+
+    output = []
+    for text, entities in zip(texts, raw_results):
+        kept = [ent for ent in entities if text[ent.start:ent.end] not in whitelisted]
+        item = {"anonymized_text": anonymizer.anonymize(text=text, analyzer_results=kept).text}
+        if return_entities:
+            item["entities"] = [
+                {"entity_type": ent.entity_type, "start": ent.start, "end": ent.end, "score": ent.score}
+                for ent in kept
+            ]
+        output.append(item)
+    return output
+
+
+def _analyze_entities(text: str, tier: str) -> List[tuple]:
+    """Worker task for chunked analysis: whitelist-filtered entities as picklable tuples."""
+    from app.core.pii_analyzer import analyze_text
+
+    return [(ent.entity_type, ent.start, ent.end, ent.score) for ent in analyze_text(text, tier=tier)]
+
+
+def analyze_texts(texts: List[str], tier: str, workers: int) -> List[List[tuple]]:
+    """Per-text (entity_type, start, end, score) lists, in input order, spread over the pool."""
+    if workers <= 1 or len(texts) <= 1:
+        return [_analyze_entities(text, tier) for text in texts]
+    pool = _get_pool()
+    return list(pool.map(_analyze_entities, texts, [tier] * len(texts)))
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    """Process-wide pool of PII_BATCH_WORKERS processes, created on first use and never resized."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: the API process holds torch/FAISS threads, which fork does not handle safely
+            _pool = ProcessPoolExecutor(
+                max_workers=max(1, config.PII_BATCH_WORKERS),
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+            )
+        return _pool
+
+
+def anonymize_batch(texts: List[str], batch_size: int = None, workers: int = None,
+                    return_entities: bool = False, tier: str = None) -> Dict[str, Any]:
+    """
+    Anonymize many texts. Returns {"results": [...] in input order, "metrics": {...}}.
+    workers=1 runs in-process (no pool); more are capped at the pool size.
+    tier: 'fast' | 'standard' (defaults to config.PII_TIER; 'auto' is treated
+    as 'standard' for a whole batch).
+    """
+    batch_size = batch_size or config.PII_BATCH_SIZE
+    workers = min(max(1, workers or config.PII_BATCH_WORKERS), max(1, config.PII_BATCH_WORKERS))
+    tier = "fast" if (tier or config.PII_TIER) == "fast" else "standard"
+    start = time.perf_counter()
+    record_batch("pii_batch", len(texts))
+
+    if not texts:
+        results = []
+    elif tier == "fast":
+        results = _analyze_chunk(texts, batch_size, return_entities, tier)
+        workers = 1
+    elif workers == 1 or len(texts) <= batch_size:
+        results = _analyze_chunk(texts, batch_size, return_entities)
+    else:
+        chunk_size = max(batch_size, math.ceil(len(texts) / workers))
+        chunks = [texts[i:i + chunk_size] for i in range(0, len(texts), chunk_size)]
+        pool = _get_pool()
+        results = [
+            item
+            for chunk_result in pool.map(_analyze_chunk, chunks, [batch_size] * len(chunks), [return_entities] * len(chunks))
+            for item in chunk_result
+        ]
+
+    elapsed = time.perf_counter() - start
+    record_stage("pii_batch", elapsed)
+    chars = sum(len(t) for t in texts)
+    return {
+        "results": results,
+        "metrics": {
+            "texts": len(texts),
+            "chars": chars,
+            "elapsed_s": elapsed,
+            "texts_per_s": len(texts) / elapsed if elapsed else 0.0,
+            "chars_per_s": chars / elapsed if elapsed else 0.0,
+            "batch_size": batch_size,
+            "workers": workers,
+            "tier": tier,
+        },
+    }
+
+
+def shutdown_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=True)
+            _pool = None
@@ -1,10 +1,182 @@
 # app/core/pii_pipeline.py
-from app.core.pii_analyzer import analyze_text, anonymize_text
+import re
+import time
+import bisect
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, List, NamedTuple
 
-def anonymize_soap(soap: str) -> str:
+from app import config
+from presidio_analyzer import RecognizerResult
+
+from app.core.pii_analyzer import analyze_text, anonymize_text, resolve_tier
+from app.core.telemetry import record_cache, stage
+
+
+class PiiResult(NamedTuple):
+    entities: List[Any]
+    anonymized_text: str
+
+
+class _TTLCache:
+    """
+    Bounded LRU cache with per-entry TTL, keyed by the SHA-256 of the input text.
+    Only the digest, the entity offsets and the anonymized text are held; the raw
+    text is never stored, and entries are dropped once their TTL has passed.
+    """
+
+    def __init__(self, ttl_s: float, max_entries: int):
+        self.ttl_s = ttl_s
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple[float, PiiResult]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _purge_expired(self, now: float):
+        # Entries are in insertion/refresh order, but refreshing does not extend
+        # the TTL, so scan the whole (bounded) dict.
+        expired = [k for k, (expires_at, _) in self._entries.items() if expires_at <= now]
+        for key in expired:
+            del self._entries[key]
+
+    def get(self, key: str):
+        now = time.monotonic()
+        with self._lock:
+            self._purge_expired(now)
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: str, value: PiiResult):
+        now = time.monotonic()
+        with self._lock:
+            self._purge_expired(now)
+            self._entries[key] = (now + self.ttl_s, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._purge_expired(time.monotonic())
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_s": self.ttl_s,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+_cache = _TTLCache(ttl_s=config.PII_CACHE_TTL_S, max_entries=config.PII_CACHE_MAX_ENTRIES)
+
+
+# Sentence ends: after . ! ? followed by whitespace, or at a newline
+SENTENCE_BOUNDARY_REGEX = re.compile(r"(?<=[.!?])\s+|\n+")
+
+
+class _Chunk(NamedTuple):
+    start: int       # window start in the full text (analyzed span incl. overlap)
+    end: int
+    core_start: int  # entities starting inside [core_start, core_end) are kept from this window
+    core_end: int
+
+
+def split_chunks(text: str, chunk_size: int, overlap: int) -> List[_Chunk]:
+    """
+    Split at sentence boundaries into core regions of ~chunk_size chars. Each
+    window extends its core by at least `overlap` chars on both sides (snapped
+    outwards to sentence boundaries), so entities crossing a core boundary are
+    seen whole, with their surrounding context, by the window that owns them.
+    """
+    boundaries = [0] + [m.end() for m in SENTENCE_BOUNDARY_REGEX.finditer(text)] + [len(text)]
+    boundaries = sorted(set(boundaries))
+
+    cores = []
+    core_start = 0
+    for b in boundaries[1:]:
+        if b - core_start >= chunk_size or b == len(text):
+            cores.append((core_start, b))
+            core_start = b
+    # A single sentence longer than chunk_size stays one core
+
+    chunks = []
+    for core_start, core_end in cores:
+        start = boundaries[bisect.bisect_right(boundaries, max(0, core_start - overlap)) - 1]
+        end = boundaries[bisect.bisect_left(boundaries, min(len(text), core_end + overlap))]
+        chunks.append(_Chunk(start, end, core_start, core_end))
+    return chunks
+
+
+def _analyze_chunked(text: str, tier: str) -> List[Any]:
+    """
+    Analyze a long document as overlapping sentence-aligned windows in parallel
+    (process pool, one spaCy doc per window, so memory is bounded by the chunk
+    size) and merge the spans back into full-text offsets.
+    """
+    from app.core.pii_batch import analyze_texts
+
+    chunks = split_chunks(text, config.PII_CHUNK_SIZE_CHARS, config.PII_CHUNK_OVERLAP_CHARS)
+    per_chunk = analyze_texts([text[c.start:c.end] for c in chunks], tier, config.PII_CHUNK_WORKERS)
+
+    merged = {}
+    for chunk, entities in zip(chunks, per_chunk):
+        for entity_type, start, end, score in entities:
+            start, end = start + chunk.start, end + chunk.start
+            if not chunk.core_start <= start < chunk.core_end:
+                continue  # owned by the neighbouring window
+            key = (entity_type, start, end)
+            if key not in merged or merged[key].score < score:
+                merged[key] = RecognizerResult(entity_type=entity_type, start=start, end=end, score=score)
+    return sorted(merged.values(), key=lambda e: (e.start, e.end))
+
+
+def _text_key(text: str, tier: str) -> str:
+    return f"{tier}:" + hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def analyze_and_anonymize(text: str, tier: str = None) -> PiiResult:
+    """
+    One spaCy/Presidio pass per distinct text: returns detected entities and the
+    anonymized text, served from a short-lived cache when the same note was just
+    analyzed by another stage of the request.
+    tier: 'fast' | 'standard' | 'auto' (defaults to config.PII_TIER).
+    Documents longer than PII_CHUNK_THRESHOLD_CHARS are analyzed in chunks
+    (standard tier only; the regex-only fast tier is linear anyway) and
+    anonymized in one pass over the full text.
+    """
+    tier = resolve_tier(text, tier)
+    key = _text_key(text, tier)
+    cached = _cache.get(key)
+    record_cache("pii", cached is not None)
+    if cached is not None:
+        return PiiResult(list(cached.entities), cached.anonymized_text)
+
+    with stage("pii"):
+        if tier == "standard" and len(text) > config.PII_CHUNK_THRESHOLD_CHARS:
+            entities = _analyze_chunked(text, tier)
+        else:
+            entities = analyze_text(text, tier=tier)
+        result = PiiResult(entities, anonymize_text(text, entities))
+    _cache.put(key, result)
+    return PiiResult(list(entities), result.anonymized_text)
+
+
+def get_pii_cache_stats() -> dict:
+    return _cache.stats()
+
+
+def anonymize_soap(soap: str, tier: str = None) -> str:
     """
     Runs SOAP note through Presidio's Norwegian PII detection and anonymization.
     Returns anonymized text safe for LLM processing.
     """
-    entities = analyze_text(soap)
-    return anonymize_text(soap, entities)
+    return analyze_and_anonymize(soap, tier=tier).anonymized_text
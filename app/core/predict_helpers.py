@@ -2,24 +2,35 @@ import json
 import numpy as np
 from app.core.claim_learning_engine import FAISS_INDEX, embed_model, DB_CURSOR, _normalize_embeddings
 from app.core.pii_analyzer import anonymize_text
+from app.core.structured_logging import get_logger
+from app.core.telemetry import stage
+from app.core.tariff import estimate_claim
+from app.schemas import ClaimPredictionResponse
+
+log = get_logger(__name__)
 
 TOP_K_SIMILAR_PREDICT = 5
 SIM_THRESHOLD_PREDICT = 0.3  # 0.3 = 30% similarity
 
-def get_similar_failures(anon_soap: str, service_codes: list) -> list[dict]:
+def get_similar_failures(anon_soap: str, service_codes: list, embedding=None) -> list[dict]:
     """
     Returns top similar learned failures above the threshold.
     Each entry is a dict with 'score' and 'suggestions'.
+    embedding: precomputed nb-sbert vector of `anon_soap` (skips encoding).
     """
     if FAISS_INDEX.ntotal == 0:
         return []
 
     # Generate and normalize embedding
-    embedding = embed_model.encode([anon_soap], convert_to_numpy=True).astype(np.float32)
+    if embedding is None:
+        with stage("embed"):
+            embedding = embed_model.encode([anon_soap], convert_to_numpy=True)
+    embedding = np.asarray(embedding, dtype=np.float32).reshape(1, -1)
     normalized_embedding = _normalize_embeddings(embedding)
 
     # Search using L2 distance
-    D, I = FAISS_INDEX.search(normalized_embedding, TOP_K_SIMILAR_PREDICT)
+    with stage("faiss"):
+        D, I = FAISS_INDEX.search(normalized_embedding, TOP_K_SIMILAR_PREDICT)
 
     similar_failures = []
     for l2_distance, idx in zip(D[0], I[0]):
@@ -41,7 +52,7 @@ def get_similar_failures(anon_soap: str, service_codes: list) -> list[dict]:
             if not row:
                 continue
         except Exception as e:
-            print(f"Database error for idx {idx}: {e}")
+            log.warning("learning_db_error", idx=int(idx), error=str(e))
             continue
 
         stored_codes_str, stored_suggestions_json = row
@@ -122,6 +133,47 @@ def aggregate_suggestions(similar_failures: list[dict]) -> list[str]:
 
     return suggestions or ["Ensure detailed clinical terms in SOAP note"]
 
+def predict_outcome(anon_soap: str, service_codes: list, embedding=None) -> ClaimPredictionResponse:
+    """Steps 2-7 of /ai/predict-claim-outcome on an already anonymized note."""
+    # Step 2: Find similar past failures using anonymized SOAP
+    similar_failures = get_similar_failures(anon_soap, service_codes, embedding=embedding)
+
+    # Step 3: Calculate rejection probability
+    rejection_prob = calculate_rejection_probability(similar_failures)
+
+    # Step 4: Assign risk level
+    risk_level = assign_risk_level(rejection_prob)
+
+    # Step 5: Aggregate suggestions from similar failures
+    suggestions = aggregate_suggestions(similar_failures)
+
+    # Step 6: Estimate reimbursement from the HELFO tariff (refusjon incl. repetitions)
+    base_reimbursement = estimate_claim(service_codes)["total"]
+    estimated_reimbursement = base_reimbursement * (1.0 - rejection_prob)
+
+    # Step 7: Enhanced reasoning message with debugging info
+    num_similar = len(similar_failures)
+    if num_similar == 0:
+        reasoning = "Low risk: No similar past failures found in learning database."
+    else:
+        scores = [f["score"] for f in similar_failures]
+        avg_score = sum(scores) / len(scores)
+        max_score = max(scores)
+
+        reasoning = (
+            f"{risk_level.title()} risk: Found {num_similar} similar failure(s). "
+            f"Similarity scores: avg={avg_score:.3f}, max={max_score:.3f}. "
+            f"Calculated rejection probability: {rejection_prob:.3f}"
+        )
+
+    return ClaimPredictionResponse(
+        rejection_probability=rejection_prob,
+        risk_level=risk_level,
+        suggestions=suggestions,
+        reasoning=reasoning,
+        estimated_reimbursement=estimated_reimbursement
+    )
+
 # Additional helper function for testing different scenarios
 def get_risk_breakdown(anon_soap: str, service_codes: list) -> dict:
     """
@@ -0,0 +1,251 @@
+# app/core/reference_snapshot.py
+"""
+Versioned binary snapshot of all reference data, built by
+`scripts/build_reference_snapshot.py` and memory-mapped at startup.
+
+Layout:
+    MAGIC (8 bytes) | header length (uint64 LE) | header JSON | padding | data
+The header lists every array (dtype, shape, offset into data), the SHA-256 of
+the data section and of each source file it was built from. Arrays start on
+64-byte boundaries and are returned as zero-copy views of the mapping.
+Strings are stored as one UTF-8 blob plus int64 offsets, bitsets as packed
+uint8 rows.
+
+Consumers call `get_snapshot()` and fall back to parsing the source files when
+it returns None (missing, corrupt, or built from different source files).
+"""
+import os
+import json
+import time
+import hashlib
+import logging
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from app import config
+from app.core.tariff import TAKST_XML
+from app.core.validate_note_requirements.rule_store import RULE_FILES, TAKST_RULES_FILE
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"REFSNAP1"
+FORMAT_VERSION = 3  # bump whenever compiled content changes for the same sources, so old snapshots are rebuilt
+ALIGN = 64
+
+CODES_DB = "data/codes.db"
+DIAGNOSIS_DB = "data/diagnosis_codes.db"
+SOURCE_FILES = (CODES_DB, DIAGNOSIS_DB, TAKST_XML, TAKST_RULES_FILE)
+
+
+def file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+# ----------------------------
+# Writing
+# ----------------------------
+class SnapshotWriter:
+    def __init__(self):
+        self._arrays: Dict[str, np.ndarray] = {}
+
+    def add_array(self, name: str, array: np.ndarray):
+        self._arrays[name] = np.ascontiguousarray(array)
+
+    def add_strings(self, name: str, values: List[str]):
+        encoded = [str(v).encode("utf-8") for v in values]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(e) for e in encoded])
+        self.add_array(f"{name}.offsets", offsets)
+        self.add_array(f"{name}.data", np.frombuffer(b"".join(encoded), dtype=np.uint8))
+
+    def add_json(self, name: str, obj: Any):
+        self.add_array(name, np.frombuffer(json.dumps(obj, ensure_ascii=False).encode("utf-8"), dtype=np.uint8))
+
+    def write(self, path: str, sources: Dict[str, str]):
+        entries, chunks, offset = {}, [], 0
+        for name, array in self._arrays.items():
+            pad = -offset % ALIGN
+            chunks.append(b"\0" * pad)
+            offset += pad
+            raw = array.tobytes()
+            entries[name] = {"dtype": array.dtype.str, "shape": list(array.shape), "offset": offset, "nbytes": len(raw)}
+            chunks.append(raw)
+            offset += len(raw)
+        data = b"".join(chunks)
+
+        header = json.dumps({
+            "format_version": FORMAT_VERSION,
+            "built_at": time.time(),
+            "sources": sources,
+            "checksum": hashlib.sha256(data).hexdigest(),
+            "arrays": entries,
+        }).encode("utf-8")
+        prefix_len = len(MAGIC) + 8 + len(header)
+        padding = b"\0" * (-prefix_len % ALIGN)
+
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(MAGIC)
+            f.write(len(header).to_bytes(8, "little"))
+            f.write(header)
+            f.write(padding)
+            f.write(data)
+        os.replace(tmp_path, path)  # readers never see a half-written file
+
+
+# ----------------------------
+# Reading
+# ----------------------------
+class ReferenceSnapshot:
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is not a reference snapshot")
+            header_len = int.from_bytes(f.read(8), "little")
+            self.header = json.loads(f.read(header_len))
+        if self.header.get("format_version") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported snapshot format {self.header.get('format_version')}; rebuild it with scripts/build_reference_snapshot.py")
+        prefix_len = len(MAGIC) + 8 + header_len
+        self.data_offset = prefix_len + (-prefix_len % ALIGN)
+        self._map = np.memmap(path, dtype=np.uint8, mode="r")
+        self._data = self._map[self.data_offset:]
+
+    @property
+    def version(self) -> str:
+        return self.header["checksum"][:12]
+
+    @property
+    def sources(self) -> Dict[str, str]:
+        return self.header["sources"]
+
+    def verify_checksum(self) -> bool:
+        return hashlib.sha256(self._data).hexdigest() == self.header["checksum"]
+
+    def stale_sources(self) -> List[str]:
+        """Source files whose current content differs from what the snapshot was built from."""
+        stale = []
+        for path, digest in self.sources.items():
+            if not os.path.exists(path) or file_sha256(path) != digest:
+                stale.append(path)
+        return stale
+
+    def has(self, name: str) -> bool:
+        return name in self.header["arrays"]
+
+    def array(self, name: str) -> np.ndarray:
+        entry = self.header["arrays"][name]
+        raw = self._data[entry["offset"]:entry["offset"] + entry["nbytes"]]
+        return raw.view(np.dtype(entry["dtype"])).reshape(entry["shape"])
+
+    def strings(self, name: str) -> List[str]:
+        offsets = self.array(f"{name}.offsets")
+        blob = self.array(f"{name}.data").tobytes()
+        return [blob[offsets[i]:offsets[i + 1]].decode("utf-8") for i in range(len(offsets) - 1)]
+
+    def json(self, name: str) -> Any:
+        return json.loads(self.array(name).tobytes().decode("utf-8"))
+
+    def records(self, name: str) -> List[tuple]:
+        """(id, description) rows of a code table, in source (index) order."""
+        return list(zip(self.strings(f"{name}.ids"), self.strings(f"{name}.descriptions")))
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "path": self.path,
+            "version": self.version,
+            "built_at": self.header["built_at"],
+            "sources": self.sources,
+            "arrays": len(self.header["arrays"]),
+            "bytes": int(self._map.shape[0]),
+        }
+
+
+def load_snapshot(path: str, verify: bool = True) -> Optional[ReferenceSnapshot]:
+    """Open a snapshot; None if it is missing, corrupt or stale (caller falls back to sources)."""
+    if not os.path.exists(path):
+        return None
+    try:
+        snapshot = ReferenceSnapshot(path)
+        if verify and not snapshot.verify_checksum():
+            logger.warning("Reference snapshot %s failed its checksum; using source files.", path)
+            return None
+        stale = snapshot.stale_sources()
+        if stale:
+            logger.warning("Reference snapshot %s is stale (%s changed); using source files.", path, ", ".join(stale))
+            return None
+        return snapshot
+    except Exception:
+        logger.exception("Could not load reference snapshot %s; using source files.", path)
+        return None
+
+
+_snapshot = None
+_snapshot_loaded = False
+_snapshot_lock = threading.Lock()
+
+
+def get_snapshot() -> Optional[ReferenceSnapshot]:
+    """Process-wide snapshot, opened once (None when disabled, missing or stale)."""
+    global _snapshot, _snapshot_loaded
+    if not _snapshot_loaded:
+        with _snapshot_lock:
+            if not _snapshot_loaded:
+                if config.REFERENCE_SNAPSHOT_ENABLED:
+                    _snapshot = load_snapshot(config.REFERENCE_SNAPSHOT_PATH)
+                _snapshot_loaded = True
+    return _snapshot
+
+
+# ----------------------------
+# Building
+# ----------------------------
+def _read_code_table(db_path: str, table: str) -> List[tuple]:
+    conn = sqlite3.connect(db_path)
+    try:
+        # Same query and order as the search modules, so rows line up with the FAISS index
+        return conn.execute(f"SELECT * FROM {table} ORDER BY id").fetchall()
+    finally:
+        conn.close()
+
+
+def build_snapshot(path: str) -> Dict[str, Any]:
+    """Compile all reference data from the source files into `path`. Returns the snapshot info."""
+    from app.core.tariff import load_tariff_table
+    from app.core.combination_rules import load_combination_rules
+    from app.core.validate_note_requirements.rule_store import compile_rules
+
+    sources = {src: file_sha256(src) for src in SOURCE_FILES}
+    writer = SnapshotWriter()
+
+    for name, db_path, table in (("service_codes", CODES_DB, "codes"), ("icd10", DIAGNOSIS_DB, "diagnosis_codes")):
+        rows = _read_code_table(db_path, table)
+        writer.add_strings(f"{name}.ids", [row[0] for row in rows])
+        writer.add_strings(f"{name}.descriptions", [row[1] for row in rows])
+
+    tariff = load_tariff_table(TAKST_XML)
+    writer.add_strings("tariff.codes", tariff.codes)
+    for column, array in tariff.columns().items():
+        writer.add_array(f"tariff.{column}", array)
+
+    combos = load_combination_rules(TAKST_XML)
+    writer.add_strings("combination.codes", combos.codes)
+    writer.add_array("combination.known", np.array([code in combos.known for code in combos.codes], dtype=np.bool_))
+    writer.add_strings("combination.descriptions", [combos.descriptions.get(code, "") for code in combos.codes])
+    writer.add_array("combination.conflicts", combos.bit_matrix(combos.conflicts))
+    writer.add_array("combination.requires", combos.bit_matrix(combos.requires))
+
+    ruleset = compile_rules(RULE_FILES)
+    writer.add_json("note_rules", {
+        code: dict(rule.as_dict(), source=rule.source) for code, rule in ruleset.rules.items()
+    })
+
+    writer.write(path, sources)
+    return ReferenceSnapshot(path).info()
@@ -0,0 +1,217 @@
+# app/core/request_recorder.py
+"""
+Request recorder: payload shapes, timings and PII-scrubbed bodies of live
+traffic, written as JSONL for scripts/load_test.py to replay.
+
+Enabled with REQUEST_RECORDING_ENABLED; a share of requests
+(REQUEST_RECORDING_SAMPLE_RATE) is recorded to REQUEST_RECORDING_PATH, one line each:
+
+    {"ts": 1760000000.123, "method": "POST", "path": "/ai/extract-diagnoses",
+     "route": "/ai/extract-diagnoses", "query": {"mode": "fast"},
+     "content_type": "application/json", "body_bytes": 812, "truncated": false,
+     "shape": {"soap": "str[790]"}, "body": {"soap": "Pasient <PERSON> ..."},
+     "status": 200, "duration_ms": 1843.2}
+
+The middleware only copies the body and the response status; parsing and
+scrubbing happen on a writer thread, off the request path. Every string in
+the body goes through the PII pipeline (REQUEST_RECORDING_PII_TIER) except
+the fields in SAFE_FIELDS (codes and enum-like options), and every string has
+fnr/phone-like digit runs masked. When scrubbing fails the body is dropped and
+only the shape is kept: raw text is never written. REQUEST_RECORDING_BODIES=false keeps shapes only.
+
+duration_ms runs until the response body is fully sent, so for streaming
+endpoints it covers the whole stream (unlike request_seconds in /metrics).
+"""
+import os
+import json
+import time
+import queue
+import random
+import threading
+from typing import Any, Callable, Dict, List, Optional
+from urllib.parse import parse_qsl
+
+from app import config
+from app.core.pii_pipeline import anonymize_soap
+from app.core.structured_logging import DIGIT_RUN_REGEX, get_logger
+from app.core.telemetry import Counter, register
+
+log = get_logger(__name__)
+
+# Codes and enum-like options, recorded as sent; any other string field is anonymized.
+SAFE_FIELDS = frozenset({"service_codes", "service_code", "mode", "tier", "session_id", "kind", "priority"})
+EXCLUDED_PATHS = frozenset({"/health", "/metrics"})
+
+REQUEST_RECORDINGS = register(Counter(
+    "request_recordings_total", "Recorded requests by outcome (written, dropped when the queue is full, failed).",
+    ("outcome",),
+))
+
+
+# ----------------------------
+# Scrubbing and shapes
+# ----------------------------
+def payload_shape(value: Any) -> Any:
+    """Structure of a JSON payload without its content: {"soap": "str[790]", "service_codes": {"len": 2, "items": "str[3]"}}."""
+    if isinstance(value, dict):
+        return {key: payload_shape(v) for key, v in value.items()}
+    if isinstance(value, list):
+        return {"len": len(value), "items": payload_shape(value[0])} if value else {"len": 0}
+    if isinstance(value, str):
+        return f"str[{len(value)}]"
+    return "null" if value is None else type(value).__name__
+
+
+def scrub(value: Any, tier: str, key: Optional[str] = None) -> Any:
+    if isinstance(value, str):
+        if key not in SAFE_FIELDS:
+            value = anonymize_soap(value, tier=tier)
+        return DIGIT_RUN_REGEX.sub("<NUM>", value)
+    if isinstance(value, list):
+        return [scrub(v, tier, key) for v in value]
+    if isinstance(value, dict):
+        return {k: scrub(v, tier, k) for k, v in value.items()}
+    return value
+
+
+def build_record(raw: Dict[str, Any], bodies: bool, tier: str) -> Dict[str, Any]:
+    """JSONL record from what the middleware captured; `raw["body"]` (bytes) never reaches the output unscrubbed."""
+    record = dict(raw)
+    body = record.pop("body")
+    record["query"] = {k: DIGIT_RUN_REGEX.sub("<NUM>", v) for k, v in record["query"].items()}
+    record["shape"] = None
+    record["body"] = None
+    if record["truncated"] or not body:
+        return record
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        return record
+    record["shape"] = payload_shape(payload)
+    if bodies:
+        try:
+            record["body"] = scrub(payload, tier)
+        except Exception as e:
+            record["scrub_error"] = type(e).__name__
+    return record
+
+
+# ----------------------------
+# Writer
+# ----------------------------
+class RequestRecorder:
+    def __init__(self, path: str, bodies: bool = True, pii_tier: str = "standard", max_queue: int = 10000):
+        self.path = path
+        self.bodies = bodies
+        self.pii_tier = pii_tier
+        self._queue: "queue.Queue[Dict[str, Any]]" = queue.Queue(maxsize=max_queue)
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._thread = threading.Thread(target=self._run, name="request-recorder", daemon=True)
+        self._thread.start()
+
+    def submit(self, raw: Dict[str, Any]):
+        try:
+            self._queue.put_nowait(raw)
+        except queue.Full:
+            REQUEST_RECORDINGS.inc(outcome="dropped")
+
+    def _run(self):
+        with open(self.path, "a", encoding="utf-8") as f:
+            while True:
+                raw = self._queue.get()
+                try:
+                    record = build_record(raw, self.bodies, self.pii_tier)
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                    f.flush()
+                    REQUEST_RECORDINGS.inc(outcome="written")
+                    if "scrub_error" in record:
+                        log.warning("request_recorder.scrub_failed", path=record["path"], error=record["scrub_error"])
+                except Exception:
+                    REQUEST_RECORDINGS.inc(outcome="failed")
+                    log.exception("request_recorder.write_failed", path=raw.get("path"))
+
+
+_recorder: Optional[RequestRecorder] = None
+_recorder_lock = threading.Lock()
+
+
+def get_request_recorder() -> RequestRecorder:
+    """Process-wide recorder; the file is opened and the writer thread started on first use."""
+    global _recorder
+    if _recorder is None:
+        with _recorder_lock:
+            if _recorder is None:
+                _recorder = RequestRecorder(
+                    config.REQUEST_RECORDING_PATH,
+                    bodies=config.REQUEST_RECORDING_BODIES,
+                    pii_tier=config.REQUEST_RECORDING_PII_TIER,
+                    max_queue=config.REQUEST_RECORDING_MAX_QUEUE,
+                )
+    return _recorder
+
+
+# ----------------------------
+# Middleware
+# ----------------------------
+class RequestRecorderMiddleware:
+    """
+    ASGI middleware: tees the request body as the app reads it and notes the
+    response status, then hands both to the recorder once the response is sent.
+    `route_label(scope)` gives the route template for the record.
+    """
+
+    def __init__(self, app, route_label: Callable[[Dict[str, Any]], str]):
+        self.app = app
+        self.route_label = route_label
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or not config.REQUEST_RECORDING_ENABLED
+            or scope["path"] in EXCLUDED_PATHS
+            or random.random() >= config.REQUEST_RECORDING_SAMPLE_RATE
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        chunks: List[bytes] = []
+        captured = {"bytes": 0, "truncated": False, "status": 500}
+
+        async def tee_receive():
+            message = await receive()
+            if message["type"] == "http.request":
+                body = message.get("body", b"")
+                captured["bytes"] += len(body)
+                if captured["bytes"] > config.REQUEST_RECORDING_MAX_BODY_BYTES:
+                    captured["truncated"] = True
+                    chunks.clear()
+                elif body:
+                    chunks.append(body)
+            return message
+
+        async def capture_send(message):
+            if message["type"] == "http.response.start":
+                captured["status"] = message["status"]
+            await send(message)
+
+        ts = time.time()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, tee_receive, capture_send)
+        finally:
+            headers = dict(scope.get("headers") or [])
+            get_request_recorder().submit({
+                "ts": round(ts, 3),
+                "method": scope["method"],
+                "path": scope["path"],
+                "route": self.route_label(scope),
+                "query": dict(parse_qsl(scope.get("query_string", b"").decode("latin-1"))),
+                "content_type": headers.get(b"content-type", b"").decode("latin-1") or None,
+                "body_bytes": captured["bytes"],
+                "truncated": captured["truncated"],
+                "body": b"".join(chunks),
+                "status": captured["status"],
+                "duration_ms": round((time.perf_counter() - start) * 1000, 1),
+            })
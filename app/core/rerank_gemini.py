@@ -2,23 +2,39 @@ import google.generativeai as genai
 from app.config import GEMINI_API_KEY
 import json
 import re
+import logging
 from app.utils.json_utils import safe_extract_json, clean_model_text
 from app.core.service_search import get_service_code_descriptions
+from app.core.llm_provider import gemini_generate, gemini_generate_async, configure_gemini
+from app.core.telemetry import stage
+from app.core.structured_logging import get_logger
+
+log = get_logger(__name__)
+
+logger = logging.getLogger(__name__)
 
 
 if GEMINI_API_KEY:
-    genai.configure(api_key=GEMINI_API_KEY)
+    configure_gemini(GEMINI_API_KEY)
     model = genai.GenerativeModel("gemini-1.5-flash")
 else:
     model = None
 
 
-def get_best_code(query: str, candidates: list[dict], top_k: int = 5) -> list[dict]:
+def _cross_encoder_fallback(candidates: list[dict], top_k: int) -> list[dict]:
+    """Serve the candidates in their cross-encoder order when Gemini is unavailable."""
+    return [
+        {
+            "code": c.get("code"),
+            "reason": "Gemini unavailable; ranked by cross-encoder score.",
+            "description": c.get("description", "No description available")
+        }
+        for c in candidates[:top_k]
+    ]
 
-    if not model:
-        return [{"code": "N/A", "reason": "Gemini API key missing."}]
 
-    prompt = f"""
+def _build_prompt(query: str, candidates: list[dict]) -> str:
+    return f"""
 You are a medical expert assistant with deep clinical knowledge.
 
 You are given:
@@ -56,12 +72,14 @@ Candidate diagnoses:
 
 Output only the JSON object.
 """
-    response = model.generate_content(prompt)
+
+
+def _parse_response(response, top_k: int) -> list[dict]:
     text = clean_model_text(response.text)
 
     # Parse JSON from model response
     try:
-        print(f"Text from Gemini: {text}")
+        log.debug("gemini_rerank_output", model_output=text)
         output_json = safe_extract_json(text)
         codes = [d["code"] for d in output_json.get("diagnoses", [])]
         descriptions = get_service_code_descriptions(codes)
@@ -82,4 +100,32 @@ Output only the JSON object.
         return results
     except json.JSONDecodeError:
         # fallback if parsing fails
-        return [{"code": "N/A", "reason": "Failed to parse model output."}]
\ No newline at end of file
+        return [{"code": "N/A", "reason": "Failed to parse model output."}]
+
+
+def get_best_code(query: str, candidates: list[dict], top_k: int = 5) -> list[dict]:
+
+    if not model:
+        return [{"code": "N/A", "reason": "Gemini API key missing."}]
+
+    try:
+        with stage("llm_rerank"):
+            response = gemini_generate(model, _build_prompt(query, candidates))
+    except Exception:
+        logger.exception("Gemini rerank failed; falling back to cross-encoder order.")
+        return _cross_encoder_fallback(candidates, top_k)
+    return _parse_response(response, top_k)
+
+
+async def get_best_code_async(query: str, candidates: list[dict], top_k: int = 5) -> list[dict]:
+    """get_best_code with the async Gemini client (does not hold a thread while waiting)."""
+    if not model:
+        return [{"code": "N/A", "reason": "Gemini API key missing."}]
+
+    try:
+        with stage("llm_rerank"):
+            response = await gemini_generate_async(model, _build_prompt(query, candidates))
+    except Exception:
+        logger.exception("Gemini rerank failed; falling back to cross-encoder order.")
+        return _cross_encoder_fallback(candidates, top_k)
+    return _parse_response(response, top_k)
@@ -1,19 +1,54 @@
-from openai import OpenAI
-from app.config import OPENAI_API_KEY
+from openai import AsyncOpenAI, OpenAI
+from app.config import OPENAI_API_KEY, OPENAI_BASE_URL
+from app.core.llm_provider import get_provider
+from app.core.telemetry import stage
+import logging
 
-client = OpenAI(api_key=OPENAI_API_KEY)
+logger = logging.getLogger(__name__)
 
-def rerank_with_openai(query: str, candidates: list[str]) -> str:
+client = OpenAI(api_key=OPENAI_API_KEY, base_url=OPENAI_BASE_URL or None)
+async_client = AsyncOpenAI(api_key=OPENAI_API_KEY, base_url=OPENAI_BASE_URL or None)
+
+def _messages(query: str, candidates: list[str]) -> list[dict]:
     system_prompt = "You are a medical billing assistant. You help select the best matching medical code based on user input."
     user_prompt = f"A user entered the query: '{query}'\nSelect the most appropriate service code from the list below:\n" + \
                    "\n".join(f"{i+1}. {c}" for i, c in enumerate(candidates)) + "\n\nRespond with only the code ID and a short reasoning."
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt}
+    ]
+
+def _fallback(candidates: list[str]) -> str:
+    logger.exception("OpenAI rerank failed; falling back to cross-encoder order.")
+    if not candidates:
+        return "N/A - OpenAI unavailable and no candidates to rank."
+    top = candidates[0]
+    label = f"{top.get('code')}: {top.get('description')}" if isinstance(top, dict) else top
+    return f"{label} - OpenAI unavailable; top cross-encoder candidate."
+
+def rerank_with_openai(query: str, candidates: list[str]) -> str:
+    try:
+        with stage("llm_rerank"):
+            response = get_provider("openai").call(
+                client.chat.completions.create,
+                model="gpt-4o",
+                messages=_messages(query, candidates),
+                temperature=0.2
+            )
+    except Exception:
+        return _fallback(candidates)
+    return response.choices[0].message.content.strip()
 
-    response = client.chat.completions.create(
-        model="gpt-4o",
-        messages=[
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_prompt}
-        ],
-        temperature=0.2
-    )
+async def rerank_with_openai_async(query: str, candidates: list[str]) -> str:
+    """rerank_with_openai with the async OpenAI client."""
+    try:
+        with stage("llm_rerank"):
+            response = await get_provider("openai").call_async(
+                async_client.chat.completions.create,
+                model="gpt-4o",
+                messages=_messages(query, candidates),
+                temperature=0.2
+            )
+    except Exception:
+        return _fallback(candidates)
     return response.choices[0].message.content.strip()
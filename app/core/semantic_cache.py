@@ -0,0 +1,76 @@
+# app/core/semantic_cache.py
+"""
+Small in-memory semantic cache: maps query embeddings to a cached value
+(e.g. a Gemini rewrite) and returns it for any later query whose embedding
+lies within a cosine-similarity threshold.
+"""
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+
+class SemanticCache:
+    """
+    Fixed-capacity ring buffer of unit-normalized embeddings. Lookup is one
+    matrix-vector product over at most `max_entries` rows; the oldest entry is
+    overwritten when full.
+    """
+
+    def __init__(self, dim: int, threshold: float = 0.95, max_entries: int = 1024):
+        self.dim = dim
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self._vectors = np.zeros((max_entries, dim), dtype=np.float32)
+        self._values: list[Any] = [None] * max_entries
+        self._size = 0
+        self._next = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _normalize(vector: np.ndarray) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32).reshape(-1)
+        return vector / (np.linalg.norm(vector) + 1e-10)
+
+    def lookup(self, embedding: np.ndarray) -> Tuple[Optional[Any], float]:
+        """Returns (value, similarity) of the nearest entry above threshold, else (None, best_similarity)."""
+        query = self._normalize(embedding)
+        with self._lock:
+            if self._size == 0:
+                self.misses += 1
+                return None, 0.0
+            sims = self._vectors[:self._size] @ query
+            best = int(np.argmax(sims))
+            similarity = float(sims[best])
+            if similarity >= self.threshold:
+                self.hits += 1
+                return self._values[best], similarity
+            self.misses += 1
+            return None, similarity
+
+    def add(self, embedding: np.ndarray, value: Any):
+        with self._lock:
+            self._vectors[self._next] = self._normalize(embedding)
+            self._values[self._next] = value
+            self._next = (self._next + 1) % self.max_entries
+            self._size = min(self._size + 1, self.max_entries)
+
+    def clear(self):
+        with self._lock:
+            self._values = [None] * self.max_entries
+            self._size = 0
+            self._next = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": self._size,
+                "max_entries": self.max_entries,
+                "threshold": self.threshold,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
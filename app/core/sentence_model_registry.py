@@ -1,4 +1,7 @@
 from sentence_transformers import SentenceTransformer, CrossEncoder
+from app.core.structured_logging import get_logger
+
+log = get_logger(__name__)
 
 _model_cache: dict[str, SentenceTransformer] = {}
 
@@ -8,7 +11,7 @@ def get_sentence_model(model_name: str) -> SentenceTransformer:
     Avoids reloading the same model multiple times in memory.
     """
     if model_name not in _model_cache:
-        print(f"🔄 Loading model: {model_name}")
+        log.info("loading_model", model=model_name, kind="sentence_transformer")
         _model_cache[model_name] = SentenceTransformer(model_name)
     return _model_cache[model_name]
 
@@ -18,6 +21,6 @@ def get_cross_encoder_model(model_name: str) -> SentenceTransformer:
     Avoids reloading the same model multiple times in memory.
     """
     if model_name not in _model_cache:
-        print(f"🔄 Loading model: {model_name}")
+        log.info("loading_model", model=model_name, kind="cross_encoder")
         _model_cache[model_name] = CrossEncoder(model_name)
     return _model_cache[model_name]
\ No newline at end of file
@@ -0,0 +1,213 @@
+# app/core/service_diagnosis_compat.py
+"""
+Local service code ↔ ICD-10 diagnosis compatibility, no LLM round-trip.
+
+Verdict per (service_code, diagnosis) pair:
+1. Rule-based, when the service code has diagnosis constraints:
+   `kreverDiagnose` in taksttabell.xml and/or data/service_diagnosis_rules.yaml
+   (ICD-10 prefixes and chapters). All constraints live in one prefix trie
+   keyed by ICD code characters, whose nodes carry the service codes that
+   accept that prefix → "compatible" / "incompatible".
+2. Otherwise, optionally, cosine similarity between the service description
+   and the diagnosis description, read from the already-built code and
+   diagnosis FAISS indexes (same embedding model) → "likely_compatible" /
+   "uncertain".
+3. Else "unknown".
+"""
+import os
+import threading
+import xml.etree.ElementTree as ET
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+import yaml
+
+from app import config
+
+RULES_FILE = os.path.join("data", "service_diagnosis_rules.yaml")
+TAKST_XML = "data/taksttabell.xml"
+NS = {"t": "http://helfo.no/skjema/taksttabell"}
+
+# ICD-10 chapters as (first, last) three-character codes
+ICD_CHAPTERS = {
+    "I": ("A00", "B99"), "II": ("C00", "D48"), "III": ("D50", "D89"), "IV": ("E00", "E90"),
+    "V": ("F00", "F99"), "VI": ("G00", "G99"), "VII": ("H00", "H59"), "VIII": ("H60", "H95"),
+    "IX": ("I00", "I99"), "X": ("J00", "J99"), "XI": ("K00", "K93"), "XII": ("L00", "L99"),
+    "XIII": ("M00", "M99"), "XIV": ("N00", "N99"), "XV": ("O00", "O99"), "XVI": ("P00", "P96"),
+    "XVII": ("Q00", "Q99"), "XVIII": ("R00", "R99"), "XIX": ("S00", "T98"), "XX": ("V01", "Y98"),
+    "XXI": ("Z00", "Z99"), "XXII": ("U00", "U99"),
+}
+
+
+def normalize_icd(code: str) -> str:
+    return str(code).strip().replace(".", "").upper()
+
+
+def expand_range(first: str, last: str) -> List[str]:
+    """All three-character codes from `first` to `last` inclusive, e.g. S00..T98."""
+    codes = []
+    for letter in range(ord(first[0]), ord(last[0]) + 1):
+        start = int(first[1:3]) if chr(letter) == first[0] else 0
+        end = int(last[1:3]) if chr(letter) == last[0] else 99
+        codes.extend(f"{chr(letter)}{n:02d}" for n in range(start, end + 1))
+    return codes
+
+
+def icd_chapter(code: str) -> Optional[str]:
+    code = normalize_icd(code)[:3]
+    for chapter, (first, last) in ICD_CHAPTERS.items():
+        if first <= code <= last:
+            return chapter
+    return None
+
+
+class PrefixTrie:
+    """ICD prefix → set of service codes that accept any diagnosis starting with it."""
+
+    __slots__ = ("children", "services")
+
+    def __init__(self):
+        self.children: Dict[str, "PrefixTrie"] = {}
+        self.services: Set[str] = set()
+
+    def insert(self, prefix: str, service_code: str):
+        node = self
+        for ch in prefix:
+            node = node.children.setdefault(ch, PrefixTrie())
+        node.services.add(service_code)
+
+    def match(self, code: str) -> Dict[str, str]:
+        """{service_code: matched_prefix} for every stored prefix of `code`."""
+        found = {}
+        node = self
+        for depth, ch in enumerate(code):
+            node = node.children.get(ch)
+            if node is None:
+                break
+            for service in node.services:
+                found[service] = code[:depth + 1]
+        return found
+
+
+class CompatibilityEngine:
+    def __init__(self, constraints: Dict[str, Dict[str, Any]]):
+        """constraints: {service_code: {"prefixes": [...], "chapters": [...], "source": str}}"""
+        self.constraints = constraints
+        self.trie = PrefixTrie()
+        for service, rule in constraints.items():
+            for prefix in rule.get("prefixes", []):
+                self.trie.insert(normalize_icd(prefix), service)
+            for chapter in rule.get("chapters", []):
+                if chapter in ICD_CHAPTERS:
+                    for code in expand_range(*ICD_CHAPTERS[chapter]):
+                        self.trie.insert(code, service)
+
+    def _rule_verdict(self, service: str, diagnosis: str) -> Dict[str, Any]:
+        rule = self.constraints[service]
+        matched = self.trie.match(diagnosis).get(service)
+        if matched:
+            return {"verdict": "compatible", "reason": f"{diagnosis} matches {matched} ({rule['source']})"}
+        allowed = ", ".join(list(rule.get("prefixes", [])) + [f"chapter {c}" for c in rule.get("chapters", [])])
+        return {"verdict": "incompatible", "reason": f"{service} requires a diagnosis in: {allowed} ({rule['source']})"}
+
+    def check_pairs(self, pairs: Iterable[Tuple[str, str]], use_embeddings: bool = True) -> List[Dict[str, Any]]:
+        pairs = [(str(s).strip(), normalize_icd(d)) for s, d in pairs]
+        results = []
+        needs_similarity = []
+        for i, (service, diagnosis) in enumerate(pairs):
+            result = {"service_code": service, "diagnosis": diagnosis, "chapter": icd_chapter(diagnosis), "similarity": None}
+            if service in self.constraints:
+                result.update(self._rule_verdict(service, diagnosis))
+            else:
+                result.update({"verdict": "unknown", "reason": "No diagnosis constraints registered for this service code."})
+                needs_similarity.append(i)
+            results.append(result)
+
+        if use_embeddings and needs_similarity:
+            similarities = embedding_similarities([pairs[i] for i in needs_similarity])
+            for i, sim in zip(needs_similarity, similarities):
+                if sim is None:
+                    continue
+                results[i]["similarity"] = sim
+                if sim >= config.SERVICE_DIAGNOSIS_SIM_THRESHOLD:
+                    results[i].update({"verdict": "likely_compatible", "reason": f"Service and diagnosis descriptions are similar (cosine {sim:.2f})."})
+                else:
+                    results[i].update({"verdict": "uncertain", "reason": f"Low similarity between the descriptions (cosine {sim:.2f})."})
+        return results
+
+
+# ----------------------------
+# Embedding similarity from the existing FAISS indexes
+# ----------------------------
+def _row_vectors(index, row_of: Dict[str, int], codes: List[str]) -> Dict[str, np.ndarray]:
+    vectors = {}
+    for code in codes:
+        row = row_of.get(code)
+        if row is not None:
+            vec = index.reconstruct(row)
+            vectors[code] = vec / (np.linalg.norm(vec) + 1e-10)
+    return vectors
+
+
+def embedding_similarities(pairs: List[Tuple[str, str]]) -> List[Optional[float]]:
+    """Cosine similarity per pair; None where either code is not in its index."""
+    # Heavy modules (models + indexes); only imported when similarity is requested
+    from app.core import service_search, diagnosis_search
+
+    service_rows = {code: i for i, (code, _) in enumerate(service_search.all_codes)}
+    diagnosis_rows = {normalize_icd(code): i for i, (code, _) in enumerate(diagnosis_search.all_codes)}
+    service_vecs = _row_vectors(service_search.index, service_rows, sorted({s for s, _ in pairs}))
+    diagnosis_vecs = _row_vectors(diagnosis_search.index, diagnosis_rows, sorted({d for _, d in pairs}))
+
+    return [
+        float(np.dot(service_vecs[s], diagnosis_vecs[d])) if s in service_vecs and d in diagnosis_vecs else None
+        for s, d in pairs
+    ]
+
+
+# ----------------------------
+# Loading
+# ----------------------------
+def load_constraints(rules_file: str = RULES_FILE, takst_xml: str = TAKST_XML) -> Dict[str, Dict[str, Any]]:
+    constraints: Dict[str, Dict[str, Any]] = {}
+    if os.path.exists(rules_file):
+        with open(rules_file, "r", encoding="utf-8") as f:
+            for service, rule in (yaml.safe_load(f) or {}).items():
+                rule = rule or {}
+                constraints[str(service).strip()] = {
+                    "prefixes": [normalize_icd(p) for p in rule.get("icd_prefixes", [])],
+                    "chapters": [str(c).strip().upper() for c in rule.get("icd_chapters", [])],
+                    "source": os.path.basename(rules_file),
+                }
+
+    # kreverDiagnose in the official tariff takes precedence over the local file
+    if os.path.exists(takst_xml):
+        root = ET.parse(takst_xml).getroot()
+        for takst in root.findall(".//t:Takst", NS):
+            required = takst.findtext("t:kreverDiagnose", default="", namespaces=NS)
+            if not required or not required.strip():
+                continue
+            service = takst.findtext("t:takstkode", default="", namespaces=NS).strip()
+            constraints[service] = {
+                "prefixes": [normalize_icd(p) for p in required.split("|") if p.strip()],
+                "chapters": [],
+                "source": "kreverDiagnose",
+            }
+    return constraints
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_compatibility_engine() -> CompatibilityEngine:
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = CompatibilityEngine(load_constraints())
+    return _engine
+
+
+def check_service_diagnosis_pairs(pairs: Iterable[Tuple[str, str]], use_embeddings: bool = True) -> List[Dict[str, Any]]:
+    return get_compatibility_engine().check_pairs(pairs, use_embeddings=use_embeddings)
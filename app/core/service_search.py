@@ -3,7 +3,17 @@ import sqlite3
 import numpy as np
 from app.core.sentence_model_registry import get_sentence_model, get_cross_encoder_model
 import os
+import re
 import google.generativeai as genai
+from app import config
+from app.core.semantic_cache import SemanticCache
+from app.core.llm_provider import gemini_generate, gemini_generate_async, configure_gemini
+from app.core.executors import run_cpu
+from app.core.telemetry import record_batch, record_cache, stage
+from app.core.structured_logging import get_logger
+from app.core.reference_snapshot import get_snapshot
+
+log = get_logger(__name__)
 
 DB_PATH = "data/codes.db"
 INDEX_PATH = "index/codes_index.faiss"
@@ -21,10 +31,15 @@ cross_encoder = get_cross_encoder_model(CROSS_ENCODER)
 index = faiss.read_index(INDEX_PATH)
 
 # Load DB
-conn = sqlite3.connect(DB_PATH, check_same_thread=False)
-cursor = conn.cursor()
-cursor.execute("SELECT * FROM codes ORDER BY id")
-all_codes = cursor.fetchall()
+# Code rows come from the precompiled reference snapshot when it is current
+snapshot = get_snapshot()
+if snapshot is not None:
+    all_codes = snapshot.records("service_codes")
+else:
+    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
+    cursor = conn.cursor()
+    cursor.execute("SELECT * FROM codes ORDER BY id")
+    all_codes = cursor.fetchall()
 
 # --- Verification ---
 if index.ntotal != len(all_codes):
@@ -36,11 +51,22 @@ if index.ntotal != len(all_codes):
 
 
 if USE_GEMINI and GEMINI_API_KEY:
-    genai.configure(api_key=GEMINI_API_KEY)
+    configure_gemini(GEMINI_API_KEY)
     GEMINI_MODEL = genai.GenerativeModel("gemini-1.5-flash")
 else:
     GEMINI_MODEL = None
 
+if GEMINI_MODEL is not None and config.REWRITE_CACHE_ENABLED:
+    REWRITE_CACHE = SemanticCache(
+        dim=embed_model.get_sentence_embedding_dimension(),
+        threshold=config.REWRITE_CACHE_THRESHOLD,
+        max_entries=config.REWRITE_CACHE_MAX_ENTRIES,
+    )
+else:
+    REWRITE_CACHE = None
+
+PII_PLACEHOLDER_REGEX = re.compile(r"<[A-Z_]+>")
+
 GEMINI_PROMPT = """
 You are a clinical documentation assistant.
 
@@ -56,18 +82,99 @@ SOAP Text:
 
 def _call_gemini(prompt: str, timeout_s: int = 6) -> str:
     """Call Gemini (safely) and parse JSON. Returns dict or raises."""
-    if GEMINI_MODEL is None:
-        raise RuntimeError("Gemini not available/configured.")
-    resp = GEMINI_MODEL.generate_content(prompt)
+    with stage("llm_rewrite"):
+        resp = gemini_generate(GEMINI_MODEL, prompt)
     return resp.text.strip()
 
+def _cache_key_text(query: str) -> str:
+    """Canonical form for the rewrite cache: PII placeholders and whitespace collapsed."""
+    return " ".join(PII_PLACEHOLDER_REGEX.sub("<PII>", query).split())
+
+async def _call_gemini_async(prompt: str) -> str:
+    with stage("llm_rewrite"):
+        resp = await gemini_generate_async(GEMINI_MODEL, prompt)
+    return resp.text.strip()
+
+def _lookup_rewrite_cache(query: str, key_embedding=None):
+    """(cached rewrite or None, cache key embedding or None, similarity). key_embedding: precomputed for _cache_key_text(query)."""
+    if REWRITE_CACHE is None:
+        return None, None, None
+    if key_embedding is None:
+        with stage("embed"):
+            key_embedding = embed_model.encode([_cache_key_text(query)], convert_to_numpy=True)[0]
+    cached, similarity = REWRITE_CACHE.lookup(key_embedding)
+    record_cache("rewrite", cached is not None)
+    return cached, key_embedding, similarity
+
+def rewrite_query(query: str) -> dict:
+    """
+    Rewrite the (anonymized) query into one retrieval sentence with Gemini,
+    reusing a cached rewrite when a semantically near-identical query was seen.
+    Returns {"text", "source": "cache"|"gemini"|"raw", "cache_similarity"}.
+    """
+    cached, key_embedding, similarity = _lookup_rewrite_cache(query)
+    if cached is not None:
+        return {"text": cached, "source": "cache", "cache_similarity": similarity}
+
+    try:
+        rewrite = _call_gemini(prompt=GEMINI_PROMPT.format(soap=query))
+    except Exception:
+        log.exception("query_rewrite_failed", fallback="raw_query")
+        return {"text": query, "source": "raw", "cache_similarity": similarity}
+
+    if key_embedding is not None:
+        REWRITE_CACHE.add(key_embedding, rewrite)
+    return {"text": rewrite, "source": "gemini", "cache_similarity": similarity}
+
+async def rewrite_query_async(query: str, key_embedding=None) -> dict:
+    """rewrite_query with the cache embedding on the CPU executor and the async Gemini client."""
+    cached, key_embedding, similarity = await run_cpu(_lookup_rewrite_cache, query, key_embedding)
+    if cached is not None:
+        return {"text": cached, "source": "cache", "cache_similarity": similarity}
+
+    try:
+        rewrite = await _call_gemini_async(GEMINI_PROMPT.format(soap=query))
+    except Exception:
+        log.exception("query_rewrite_failed", fallback="raw_query")
+        return {"text": query, "source": "raw", "cache_similarity": similarity}
+
+    if key_embedding is not None:
+        REWRITE_CACHE.add(key_embedding, rewrite)
+    return {"text": rewrite, "source": "gemini", "cache_similarity": similarity}
+
+def get_rewrite_cache_stats() -> dict:
+    if REWRITE_CACHE is None:
+        return {"enabled": False}
+    return {"enabled": True, **REWRITE_CACHE.stats()}
+
 def search_codes(query: str):
-    prompt = GEMINI_PROMPT.format(soap=query)
-    soap = _call_gemini(prompt=prompt)
-    print(f"Gemini cleaned soap: {soap}")
+    return search_codes_with_rewrite(query)["candidates"]
+
+def search_codes_with_rewrite(query: str) -> dict:
+    """search_codes, also returning the query rewrite used for retrieval (for auditing)."""
+    rewrite = rewrite_query(query)
+    return {"query_rewrite": rewrite, "candidates": retrieve_candidates(query, rewrite["text"])}
+
+async def search_codes_with_rewrite_async(query: str) -> dict:
+    """search_codes_with_rewrite for async handlers: Gemini awaited, encode/FAISS/cross-encoder on the CPU executor."""
+    rewrite = await rewrite_query_async(query)
+    return {"query_rewrite": rewrite, "candidates": await run_cpu(retrieve_candidates, query, rewrite["text"])}
+
+def retrieve_candidates(query: str, soap: str, embedding=None, initial_k: int = 50,
+                        cross_encoder_rerank: bool = True) -> list[dict]:
+    """
+    FAISS top `initial_k` for the rewritten text, re-ranked by the cross-encoder against the original query.
+    embedding: precomputed bi-encoder vector for `soap`, e.g. from a composite request that already encoded it.
+    cross_encoder_rerank=False returns the FAISS order (fast latency tier).
+    """
+    log.debug("query_rewritten", query=query, rewrite=soap)
     # Step 1: Embed query with bi-encoder and retrieve top_k candidates
-    embedding = np.array(embed_model.encode([soap], convert_to_numpy=True), dtype=np.float32)
-    D, I = index.search(embedding, k=50)
+    if embedding is None:
+        with stage("embed"):
+            embedding = embed_model.encode([soap], convert_to_numpy=True)
+    embedding = np.asarray(embedding, dtype=np.float32).reshape(1, -1)
+    with stage("faiss"):
+        D, I = index.search(embedding, k=initial_k)
 
     candidates = []
     for score, idx in zip(D[0], I[0]):
@@ -78,17 +185,20 @@ def search_codes(query: str):
             "faiss_score": float(score),
         })
 
+    if not cross_encoder_rerank:
+        return candidates  # L2 distance, ascending
+
     # Step 2: Re-rank with cross-encoder
     ce_inputs = [(query, c["description"]) for c in candidates]
-    ce_scores = cross_encoder.predict(ce_inputs)
+    record_batch("cross_encoder", len(ce_inputs))
+    with stage("cross_encoder"):
+        ce_scores = cross_encoder.predict(ce_inputs)
 
     for c, ce_score in zip(candidates, ce_scores):
         c["cross_score"] = float(ce_score)
 
     # Sort by cross-encoder score (higher = better)
-    candidates = sorted(candidates, key=lambda x: x["cross_score"], reverse=True)
-
-    return candidates
+    return sorted(candidates, key=lambda x: x["cross_score"], reverse=True)
 
 def get_service_code_descriptions(codes: list[str]) -> dict:
     code_set = set(codes)
@@ -0,0 +1,91 @@
+# app/core/singleflight.py
+"""
+Single-flight for identical in-flight requests (double submits, frontend retries).
+
+    result = await singleflight.do("extract-diagnoses", {"soap": soap, "mode": mode}, compute)
+
+The first caller for a key (the leader) starts `compute()` as a task. Callers
+with the same key that arrive before it finishes (followers) await that same
+task and get the same result, or the same exception. The key is a SHA-256 of
+the endpoint name and the payload serialized as canonical JSON (sorted keys,
+no whitespace), so dict order in the request does not matter.
+
+Everyone awaits the task through `asyncio.shield`, so a caller that
+disconnects does not cancel the work for the others. The key is dropped when
+the task finishes. Nothing is cached after that point.
+
+Metrics (registered in app/core/telemetry.py):
+- singleflight_requests_total{endpoint,role}: role is leader or follower.
+- singleflight_saved_seconds_total{endpoint}: the leader's compute time
+  multiplied by its follower count, i.e. pipeline time that did not run.
+"""
+import json
+import time
+import asyncio
+import hashlib
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+from app import config
+from app.core.telemetry import Counter, record_stage, register
+
+SINGLEFLIGHT_REQUESTS = register(Counter(
+    "singleflight_requests_total", "Requests by single-flight role (leader ran the pipeline, follower reused it).",
+    ("endpoint", "role"),
+))
+SINGLEFLIGHT_SAVED_SECONDS = register(Counter(
+    "singleflight_saved_seconds_total", "Pipeline seconds not spent thanks to coalesced duplicates.", ("endpoint",),
+))
+
+
+def canonical_key(endpoint: str, payload: Any) -> str:
+    body = json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.sha256(f"{endpoint}\n{body}".encode("utf-8")).hexdigest()
+
+
+class SingleFlight:
+    def __init__(self):
+        # key -> (task, [follower count]); only touched from the event loop thread
+        self._inflight: Dict[str, Tuple[asyncio.Task, list]] = {}
+
+    def in_flight(self) -> int:
+        return len(self._inflight)
+
+    async def do(self, endpoint: str, payload: Any, compute: Callable[[], Awaitable[Any]]) -> Any:
+        if not config.SINGLEFLIGHT_ENABLED:
+            return await compute()
+
+        key = canonical_key(endpoint, payload)
+        entry = self._inflight.get(key)
+        if entry is not None:
+            task, followers = entry
+            followers[0] += 1
+            SINGLEFLIGHT_REQUESTS.inc(endpoint=endpoint, role="follower")
+            start = time.perf_counter()
+            try:
+                return await asyncio.shield(task)
+            finally:
+                record_stage("singleflight_wait", time.perf_counter() - start)
+
+        SINGLEFLIGHT_REQUESTS.inc(endpoint=endpoint, role="leader")
+        followers = [0]
+        start = time.perf_counter()
+        task = asyncio.ensure_future(compute())  # copies the leader's context: its stage timings
+        self._inflight[key] = (task, followers)
+
+        def _done(t: asyncio.Task):
+            self._inflight.pop(key, None)
+            if not t.cancelled():
+                t.exception()  # retrieved here too, in case every caller went away
+            if followers[0]:
+                SINGLEFLIGHT_SAVED_SECONDS.inc((time.perf_counter() - start) * followers[0], endpoint=endpoint)
+
+        task.add_done_callback(_done)
+        return await asyncio.shield(task)
+
+
+_singleflight = SingleFlight()
+
+
+async def do(endpoint: str, payload: Any, compute: Callable[[], Awaitable[Any]]) -> Any:
+    """Run `compute()` once per identical (endpoint, payload) among concurrent callers."""
+    return await _singleflight.do(endpoint, payload, compute)
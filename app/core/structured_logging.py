@@ -0,0 +1,143 @@
+# app/core/structured_logging.py
+"""
+Structured, sampled, redacting logging for the request hot path.
+
+    log = get_logger(__name__)
+    log.debug("faiss_candidates", concept=concept, candidates=lazy(top_candidates, rows, 5))
+
+- Level check first: a record below the logger's level costs one call and
+  builds nothing.
+- Sampling: DEBUG/INFO records are kept for a LOG_SAMPLE_RATE share of
+  requests, decided once per request so a sampled request logs all of its
+  stages. WARNING and above are never sampled away.
+- Lazy fields: `lazy(fn, *args)` is only evaluated when the record is emitted.
+- Redaction: fields that carry clinical text (soap, concept, query, prompt,
+  model output, ...) are replaced by their length and a short hash, and digit
+  runs that look like fødselsnummer/phone numbers are masked in every other
+  string field. Set LOG_REDACT=false for local debugging.
+
+Records are written as one JSON object per line through the standard
+`logging` module, so handlers/levels are configured as before.
+"""
+import re
+import json
+import random
+import hashlib
+import logging
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Optional
+
+from app import config
+
+REDACTED_FIELDS = frozenset({
+    "soap", "text", "concept", "concepts", "query", "rewrite", "prompt",
+    "response", "model_output", "candidates", "reranked", "matches",
+})
+DIGIT_RUN_REGEX = re.compile(r"\b\d(?:[ .-]?\d){7,10}\b")  # fnr (11), phone (8), with optional separators
+
+
+class lazy:
+    """A field value computed only if the record is emitted."""
+
+    __slots__ = ("fn", "args", "kwargs")
+
+    def __init__(self, fn: Callable[..., Any], *args, **kwargs):
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+
+    def __call__(self):
+        return self.fn(*self.args, **self.kwargs)
+
+
+# ----------------------------
+# Per-request sampling
+# ----------------------------
+_sampled: ContextVar[Optional[bool]] = ContextVar("log_sampled", default=None)
+
+
+def begin_request_sampling(rate: Optional[float] = None):
+    """Decide whether this request's DEBUG/INFO records are kept. Returns a token for `end_request_sampling`."""
+    rate = config.LOG_SAMPLE_RATE if rate is None else rate
+    return _sampled.set(rate >= 1.0 or random.random() < rate)
+
+
+def end_request_sampling(token):
+    _sampled.reset(token)
+
+
+def _is_sampled() -> bool:
+    sampled = _sampled.get()
+    return True if sampled is None else sampled  # outside a request (scripts, startup): keep everything
+
+
+# ----------------------------
+# Redaction
+# ----------------------------
+def _fingerprint(value: Any) -> str:
+    text = value if isinstance(value, str) else json.dumps(value, ensure_ascii=False, default=str, sort_keys=True)
+    return f"<redacted len={len(text)} sha={hashlib.sha256(text.encode('utf-8')).hexdigest()[:8]}>"
+
+
+def _mask_digits(value: Any) -> Any:
+    if isinstance(value, str):
+        return DIGIT_RUN_REGEX.sub("<NUM>", value)
+    if isinstance(value, list):
+        return [_mask_digits(v) for v in value]
+    if isinstance(value, dict):
+        return {k: _mask_digits(v) for k, v in value.items()}
+    return value
+
+
+def redact(fields: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        key: _fingerprint(value) if key in REDACTED_FIELDS and value is not None else _mask_digits(value)
+        for key, value in fields.items()
+    }
+
+
+# ----------------------------
+# Logger
+# ----------------------------
+class StructuredLogger:
+    def __init__(self, name: str):
+        self._logger = logging.getLogger(name)
+
+    def is_enabled(self, level: int) -> bool:
+        if not self._logger.isEnabledFor(level):
+            return False
+        return level >= logging.WARNING or _is_sampled()
+
+    def log(self, level: int, event: str, exc_info: bool = False, **fields):
+        if not self.is_enabled(level):
+            return
+        fields = {key: value() if isinstance(value, lazy) else value for key, value in fields.items()}
+        if config.LOG_REDACT:
+            fields = redact(fields)
+        record = {"event": event, **fields}
+        self._logger.log(level, json.dumps(record, ensure_ascii=False, default=str), exc_info=exc_info)
+
+    def debug(self, event: str, **fields):
+        self.log(logging.DEBUG, event, **fields)
+
+    def info(self, event: str, **fields):
+        self.log(logging.INFO, event, **fields)
+
+    def warning(self, event: str, **fields):
+        self.log(logging.WARNING, event, **fields)
+
+    def error(self, event: str, **fields):
+        self.log(logging.ERROR, event, **fields)
+
+    def exception(self, event: str, **fields):
+        self.log(logging.ERROR, event, exc_info=True, **fields)
+
+
+def get_logger(name: str) -> StructuredLogger:
+    return StructuredLogger(name)
+
+
+def configure_logging():
+    """Root level from LOG_LEVEL; leaves existing handlers (e.g. uvicorn's) alone."""
+    logging.basicConfig(level=config.LOG_LEVEL.upper(), format="%(asctime)s %(levelname)s %(name)s %(message)s")
+    logging.getLogger("app").setLevel(config.LOG_LEVEL.upper())
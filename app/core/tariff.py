@@ -0,0 +1,200 @@
+# app/core/tariff.py
+"""
+Array-backed HELFO tariff table (data/taksttabell.xml) and reimbursement estimator.
+
+Rows are sorted by (code, fradato) and addressed through one int64 key
+(code_id << 32 | day number), so "the version of code X in force on date D"
+is a single `np.searchsorted` for any number of lookups at once.
+
+Amount for a code billed n times on one claim:
+    refusjon * (1 + min(n - 1, maksRepetisjoner) * repetisjonsprosent / 100)
+(maksRepetisjoner absent = no cap).
+"""
+import threading
+import datetime as dt
+import xml.etree.ElementTree as ET
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+TAKST_XML = "data/taksttabell.xml"
+NS = {"t": "http://helfo.no/skjema/taksttabell"}
+NO_REPETITION_CAP = np.iinfo(np.int32).max
+EPOCH = dt.date(1970, 1, 1)
+COLUMNS = ("code_ids", "fradato", "honorar", "refusjon", "egenandel", "maks_repetisjoner", "repetisjonsprosent")
+
+
+def _day_number(value) -> int:
+    """ISO date string / date / None (today) → days since 1970-01-01."""
+    if value is None or value == "":
+        value = dt.date.today()
+    elif isinstance(value, str):
+        value = dt.date.fromisoformat(value[:10])
+    elif isinstance(value, dt.datetime):
+        value = value.date()
+    return (value - EPOCH).days
+
+
+def _float(takst, tag: str, default: float = 0.0) -> float:
+    text = takst.findtext(f"t:{tag}", default="", namespaces=NS)
+    return float(text) if text and text.strip() else default
+
+
+class TariffTable:
+    def __init__(self, rows: List[Dict[str, Any]]):
+        rows = sorted(rows, key=lambda r: (r["code"], r["fradato"]))
+        self.codes = sorted({r["code"] for r in rows})
+        self.code_index = {code: i for i, code in enumerate(self.codes)}
+
+        self.code_ids = np.array([self.code_index[r["code"]] for r in rows], dtype=np.int64)
+        self.fradato = np.array([r["fradato"] for r in rows], dtype=np.int64)
+        self.keys = (self.code_ids << 32) | self.fradato
+        self.honorar = np.array([r["honorar"] for r in rows], dtype=np.float64)
+        self.refusjon = np.array([r["refusjon"] for r in rows], dtype=np.float64)
+        self.egenandel = np.array([r["egenandel"] for r in rows], dtype=np.float64)
+        self.maks_repetisjoner = np.array([r["maks_repetisjoner"] for r in rows], dtype=np.int64)
+        self.repetisjonsprosent = np.array([r["repetisjonsprosent"] for r in rows], dtype=np.float64)
+
+    @classmethod
+    def from_columns(cls, codes: List[str], columns: Dict[str, np.ndarray]) -> "TariffTable":
+        """Rebuild from `columns()` output (e.g. arrays memory-mapped from the reference snapshot)."""
+        table = cls.__new__(cls)
+        table.codes = list(codes)
+        table.code_index = {code: i for i, code in enumerate(table.codes)}
+        for name in COLUMNS:
+            setattr(table, name, columns[name])
+        table.keys = (table.code_ids << 32) | table.fradato
+        return table
+
+    def columns(self) -> Dict[str, np.ndarray]:
+        return {name: getattr(self, name) for name in COLUMNS}
+
+    def __len__(self):
+        return len(self.keys)
+
+    def lookup(self, code_ids: np.ndarray, days: np.ndarray) -> np.ndarray:
+        """Row index in force for each (code_id, day); -1 if unknown code or before its first fradato."""
+        code_ids = np.asarray(code_ids, dtype=np.int64)
+        query = (code_ids << 32) | np.asarray(days, dtype=np.int64)
+        rows = np.searchsorted(self.keys, query, side="right") - 1
+        valid = (code_ids >= 0) & (rows >= 0)
+        valid &= self.code_ids[np.clip(rows, 0, None)] == code_ids
+        return np.where(valid, rows, -1)
+
+    def line_amounts(self, rows: np.ndarray, counts: np.ndarray) -> np.ndarray:
+        """Reimbursement (refusjon incl. repetitions) per line; 0 where rows == -1."""
+        safe = np.clip(rows, 0, None)
+        repetitions = np.minimum(np.asarray(counts, dtype=np.int64) - 1, self.maks_repetisjoner[safe])
+        amounts = self.refusjon[safe] * (1.0 + repetitions * self.repetisjonsprosent[safe] / 100.0)
+        return np.where(rows >= 0, amounts, 0.0)
+
+
+def load_tariff_table(path: str = TAKST_XML) -> TariffTable:
+    root = ET.parse(path).getroot()
+    rows = []
+    for takst in root.findall(".//t:Takst", NS):
+        code = (takst.findtext("t:takstkode", default="", namespaces=NS) or "").strip()
+        fradato = takst.findtext("t:fradato", default="", namespaces=NS)
+        if not code or not fradato:
+            continue
+        maks = takst.findtext("t:maksRepetisjoner", default="", namespaces=NS)
+        rows.append({
+            "code": code,
+            "fradato": _day_number(fradato),
+            "honorar": _float(takst, "honorar"),
+            "refusjon": _float(takst, "refusjon"),
+            "egenandel": _float(takst, "egenandel"),
+            "maks_repetisjoner": int(maks) if maks and maks.strip() else NO_REPETITION_CAP,
+            "repetisjonsprosent": _float(takst, "repetisjonsprosent", 100.0),
+        })
+    return TariffTable(rows)
+
+
+_table = None
+_table_lock = threading.Lock()
+
+
+def get_tariff_table() -> TariffTable:
+    """From the reference snapshot when it is current, else parsed from taksttabell.xml."""
+    from app.core.reference_snapshot import get_snapshot
+
+    global _table
+    if _table is None:
+        with _table_lock:
+            if _table is None:
+                snapshot = get_snapshot()
+                if snapshot is not None:
+                    _table = TariffTable.from_columns(
+                        snapshot.strings("tariff.codes"),
+                        {name: snapshot.array(f"tariff.{name}") for name in COLUMNS},
+                    )
+                else:
+                    _table = load_tariff_table()
+    return _table
+
+
+def estimate_claim(service_codes: List[str], service_date: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Reimbursement for one claim, with per-code lines.
+    Returns {"total", "lines": [{"code", "count", "amount", "honorar", "egenandel"}],
+             "unknown_codes", "not_in_force_codes"} (the latter: fradato after the service date).
+    """
+    table = get_tariff_table()
+    counts = Counter(str(c).strip() for c in service_codes if str(c).strip())
+    codes = list(counts)
+    code_ids = np.array([table.code_index.get(c, -1) for c in codes], dtype=np.int64)
+    rows = table.lookup(code_ids, np.full(len(codes), _day_number(service_date), dtype=np.int64))
+    amounts = table.line_amounts(rows, np.array([counts[c] for c in codes], dtype=np.int64))
+
+    lines, unknown, not_in_force = [], [], []
+    for code, code_id, row, amount in zip(codes, code_ids, rows, amounts):
+        if row < 0:
+            (unknown if code_id < 0 else not_in_force).append(code)
+            continue
+        lines.append({
+            "code": code,
+            "count": counts[code],
+            "amount": float(amount),
+            "honorar": float(table.honorar[row]),
+            "egenandel": float(table.egenandel[row]),
+        })
+    return {"total": float(amounts.sum()), "lines": lines, "unknown_codes": unknown, "not_in_force_codes": not_in_force}
+
+
+def estimate_claims(claims: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Vectorized estimate for many claims: each {"service_codes", "service_date"?,
+    "rejection_probability"?}. All lines of all claims go through one lookup and
+    one bincount. Returns per-claim gross/expected amounts and the totals.
+    """
+    table = get_tariff_table()
+    code_lists = [[str(c).strip() for c in claim.get("service_codes", []) if str(c).strip()] for claim in claims]
+    lengths = np.array([len(codes) for codes in code_lists], dtype=np.int64)
+    flat_codes = [code for codes in code_lists for code in codes]
+    unknown = sorted({code for code in flat_codes if code not in table.code_index})
+
+    # Collapse repeated codes within a claim into (claim, code, count) lines
+    line_claims = np.repeat(np.arange(len(claims), dtype=np.int64), lengths)
+    line_codes = np.fromiter((table.code_index.get(c, -1) for c in flat_codes), dtype=np.int64, count=len(flat_codes))
+    pair_keys = line_claims * (len(table.codes) + 1) + (line_codes + 1)
+    pair_keys, counts = np.unique(pair_keys, return_counts=True)
+    claim_idx = pair_keys // (len(table.codes) + 1)
+    code_ids = pair_keys % (len(table.codes) + 1) - 1
+
+    claim_days = np.array([_day_number(c.get("service_date")) for c in claims], dtype=np.int64)
+    rows = table.lookup(code_ids, claim_days[claim_idx])
+    amounts = table.line_amounts(rows, counts)
+    gross = np.bincount(claim_idx, weights=amounts, minlength=len(claims))
+    rejection = np.array([float(c.get("rejection_probability") or 0.0) for c in claims], dtype=np.float64)
+    expected = gross * (1.0 - np.clip(rejection, 0.0, 1.0))
+
+    return {
+        "claims": [
+            {"gross": float(g), "expected": float(e)}
+            for g, e in zip(gross, expected)
+        ],
+        "total_gross": float(gross.sum()),
+        "total_expected": float(expected.sum()),
+        "unknown_codes": unknown,
+    }
@@ -0,0 +1,211 @@
+# app/core/telemetry.py
+"""
+Lightweight in-process metrics and per-request stage timing.
+
+- `stage("faiss")` times a block. The duration is added to the current
+  request's timings (a contextvar, so it follows the request into the CPU
+  executor and into asyncio tasks) and to the `stage_seconds` histogram.
+- `Counter` / `Histogram` hold labelled values behind one lock each.
+- `render_prometheus()` writes every registered metric in the Prometheus text
+  exposition format for `GET /metrics`.
+
+The HTTP middleware in app/main.py opens a `RequestTimings` per request,
+records `request_seconds{endpoint}` and `stage_seconds{endpoint,stage}`, and
+can add the stage breakdown as an `X-Stage-Timings` response header.
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Seconds; covers sub-ms cache hits up to slow LLM calls
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self._values: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, value: float = 1.0, **labels):
+        key = tuple(str(labels.get(n, "")) for n in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + value
+
+    def value(self, **labels) -> float:
+        key = tuple(str(labels.get(n, "")) for n in self.labels)
+        with self._lock:
+            return self._values.get(key, 0.0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        lines += [f"{self.name}{_format_labels(self.labels, key)} {value:g}" for key, value in items]
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [bucket counts..., +Inf count, sum]
+        self._values: Dict[LabelValues, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels.get(n, "")) for n in self.labels)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = [0.0] * (len(self.buckets) + 2)
+            series[i] += 1
+            series[-1] += value
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, list(series)) for key, series in self._values.items())
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for key, series in items:
+            cumulative = 0.0
+            for bound, count in zip(self.buckets + (float("inf"),), series):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound:g}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, le)} {cumulative:g}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {series[-1]:g}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {cumulative:g}")
+        return lines
+
+
+# ----------------------------
+# Registry
+# ----------------------------
+REQUEST_SECONDS = Histogram("request_seconds", "End-to-end request latency.", ("endpoint", "method", "status"))
+STAGE_SECONDS = Histogram("stage_seconds", "Time spent in one pipeline stage.", ("endpoint", "stage"))
+CACHE_REQUESTS = Counter("cache_requests_total", "Cache lookups by cache and result (hit/miss).", ("cache", "result"))
+MODEL_BATCH_SIZE = Histogram("model_batch_size", "Inputs per model call.", ("model",), buckets=BATCH_SIZE_BUCKETS)
+LLM_TOKENS = Counter("llm_tokens_total", "LLM tokens reported by the provider.", ("provider", "kind"))
+
+_registry = [REQUEST_SECONDS, STAGE_SECONDS, CACHE_REQUESTS, MODEL_BATCH_SIZE, LLM_TOKENS]
+_registry_lock = threading.Lock()
+
+
+def register(metric):
+    """Add a Counter/Histogram defined elsewhere to the /metrics output."""
+    with _registry_lock:
+        if metric not in _registry:
+            _registry.append(metric)
+    return metric
+
+
+def render_prometheus() -> str:
+    with _registry_lock:
+        metrics = list(_registry)
+    lines = []
+    for metric in metrics:
+        lines += metric.render()
+    return "\n".join(lines) + "\n"
+
+
+# ----------------------------
+# Per-request stage timings
+# ----------------------------
+class RequestTimings:
+    """Accumulated seconds per stage for one request (stages may repeat, e.g. one rerank per concept)."""
+
+    def __init__(self, endpoint: str):
+        self.endpoint = endpoint
+        self.stages: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def add(self, stage_name: str, seconds: float):
+        with self._lock:
+            self.stages[stage_name] = self.stages.get(stage_name, 0.0) + seconds
+
+    def header_value(self) -> str:
+        """`pii;dur=12.3, faiss;dur=4.1` (milliseconds, Server-Timing syntax)."""
+        with self._lock:
+            items = list(self.stages.items())
+        return ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in items)
+
+
+_current: ContextVar[Optional[RequestTimings]] = ContextVar("request_timings", default=None)
+
+
+def start_request(endpoint: str):
+    """Open timings for the current request; returns a token for `end_request`."""
+    return _current.set(RequestTimings(endpoint))
+
+
+def end_request(token):
+    _current.reset(token)
+
+
+def current_timings() -> Optional[RequestTimings]:
+    return _current.get()
+
+
+def record_stage(name: str, seconds: float):
+    """Add an already-measured stage duration. Outside a request the endpoint label is "-" (scripts, background jobs)."""
+    timings = _current.get()
+    if timings is not None:
+        timings.add(name, seconds)
+    STAGE_SECONDS.observe(seconds, endpoint=timings.endpoint if timings else "-", stage=name)
+
+
+@contextmanager
+def stage(name: str):
+    """Time a pipeline stage."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - start)
+
+
+def record_cache(cache: str, hit: bool):
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+
+
+def record_batch(model: str, size: int):
+    MODEL_BATCH_SIZE.observe(size, model=model)
+
+
+def record_llm_usage(provider: str, response) -> None:
+    """Token counts from a Gemini (usage_metadata) or OpenAI (usage) response, when present."""
+    usage = getattr(response, "usage_metadata", None)
+    if usage is not None:
+        prompt = getattr(usage, "prompt_token_count", 0) or 0
+        completion = getattr(usage, "candidates_token_count", 0) or 0
+    else:
+        usage = getattr(response, "usage", None)
+        if usage is None:
+            return
+        prompt = getattr(usage, "prompt_tokens", 0) or 0
+        completion = getattr(usage, "completion_tokens", 0) or 0
+    if prompt:
+        LLM_TOKENS.inc(prompt, provider=provider, kind="prompt")
+    if completion:
+        LLM_TOKENS.inc(completion, provider=provider, kind="completion")
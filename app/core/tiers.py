@@ -0,0 +1,125 @@
+# app/core/tiers.py
+"""
+Latency tiers: how much of the retrieval pipeline one request runs.
+
+| tier     | LLM (rewrite/grouping, rerank) | FAISS candidates | cross-encoder |
+|----------|--------------------------------|------------------|---------------|
+| fast     | no (local spaCy grouping)      | 10               | no            |
+| balanced | no (local spaCy grouping)      | 20               | yes           |
+| accurate | yes                            | 50               | yes           |
+
+`accurate` is the existing pipeline and the default (LATENCY_TIER). Without
+the LLM rerank, the final ranking is the FAISS order (fast) or the
+cross-encoder order (balanced).
+
+`estimate_*_cost` return the work a request causes: LLM calls, input/output
+tokens, cross-encoder pairs, and an approximate USD figure from
+LLM_INPUT_USD_PER_1M / LLM_OUTPUT_USD_PER_1M. Tokens are estimated from the
+prompt size (about 4 characters per token), before any rewrite-cache hits.
+Actual usage is counted in `llm_tokens_total`.
+"""
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from app import config
+
+CHARS_PER_TOKEN = 4
+
+# Approximate prompt template sizes (characters) and output sizes (tokens)
+REWRITE_PROMPT_CHARS = 600
+REWRITE_OUTPUT_TOKENS = 40
+GROUPING_PROMPT_CHARS = 1200
+GROUPING_OUTPUT_TOKENS_PER_CONCEPT = 15
+RERANK_PROMPT_CHARS = 1500
+RERANK_CANDIDATE_CHARS = 160      # one JSON candidate (code, description, scores)
+RERANK_OUTPUT_TOKENS_PER_CODE = 60
+
+
+@dataclass(frozen=True)
+class TierProfile:
+    name: str
+    llm: bool              # Gemini rewrite/grouping and rerank
+    initial_k: int         # FAISS candidates kept (and passed to the cross-encoder / LLM)
+    cross_encoder: bool
+
+
+TIERS: Dict[str, TierProfile] = {
+    "fast": TierProfile("fast", llm=False, initial_k=10, cross_encoder=False),
+    "balanced": TierProfile("balanced", llm=False, initial_k=20, cross_encoder=True),
+    "accurate": TierProfile("accurate", llm=True, initial_k=50, cross_encoder=True),
+}
+
+
+def get_tier(name: Optional[str] = None) -> TierProfile:
+    name = (name or config.LATENCY_TIER).lower()
+    if name not in TIERS:
+        raise ValueError(f"Unknown latency tier '{name}'; expected one of {', '.join(TIERS)}")
+    return TIERS[name]
+
+
+# ----------------------------
+# Local ranking for tiers without the LLM rerank
+# ----------------------------
+def local_decision(candidates: List[dict], top_k: int, profile: TierProfile) -> List[dict]:
+    """Service-code decision in the shape of rerank_gemini.get_best_code, from the retrieval order."""
+    by = "cross-encoder score" if profile.cross_encoder else "FAISS distance"
+    return [
+        {
+            "code": c.get("code"),
+            "reason": f"Ranked by {by} ({profile.name} tier, no LLM rerank).",
+            "description": c.get("description", "No description available"),
+        }
+        for c in candidates[:top_k]
+    ]
+
+
+# ----------------------------
+# Cost estimates
+# ----------------------------
+class CostEstimate:
+    def __init__(self):
+        self.llm_calls = 0
+        self.llm_input_tokens = 0
+        self.llm_output_tokens = 0
+        self.cross_encoder_pairs = 0
+
+    def llm_call(self, prompt_chars: int, output_tokens: int):
+        self.llm_calls += 1
+        self.llm_input_tokens += prompt_chars // CHARS_PER_TOKEN
+        self.llm_output_tokens += output_tokens
+
+    def as_dict(self) -> Dict[str, float]:
+        usd = (self.llm_input_tokens * config.LLM_INPUT_USD_PER_1M
+               + self.llm_output_tokens * config.LLM_OUTPUT_USD_PER_1M) / 1_000_000
+        return {
+            "llm_calls": self.llm_calls,
+            "llm_input_tokens": self.llm_input_tokens,
+            "llm_output_tokens": self.llm_output_tokens,
+            "cross_encoder_pairs": self.cross_encoder_pairs,
+            "usd": round(usd, 6),
+        }
+
+
+def estimate_suggest_cost(profile: TierProfile, query: str, top_k: int) -> Dict[str, float]:
+    cost = CostEstimate()
+    if profile.llm:
+        cost.llm_call(REWRITE_PROMPT_CHARS + len(query), REWRITE_OUTPUT_TOKENS)
+        cost.llm_call(RERANK_PROMPT_CHARS + len(query) + profile.initial_k * RERANK_CANDIDATE_CHARS,
+                      top_k * RERANK_OUTPUT_TOKENS_PER_CODE)
+    if profile.cross_encoder:
+        cost.cross_encoder_pairs += profile.initial_k
+    return cost.as_dict()
+
+
+def estimate_extract_cost(profile: TierProfile, soap: str, concepts: List[str], top_k: int,
+                          final_top_n: int, mode: str = "llm") -> Dict[str, float]:
+    cost = CostEstimate()
+    if profile.llm:
+        if mode != "fast":
+            cost.llm_call(GROUPING_PROMPT_CHARS + len(soap), len(concepts) * GROUPING_OUTPUT_TOKENS_PER_CONCEPT)
+        for concept in concepts:
+            cost.llm_call(RERANK_PROMPT_CHARS + len(concept) + top_k * RERANK_CANDIDATE_CHARS,
+                          final_top_n * RERANK_OUTPUT_TOKENS_PER_CODE)
+    if profile.cross_encoder:
+        cost.cross_encoder_pairs += len(concepts) * profile.initial_k
+    return cost.as_dict()
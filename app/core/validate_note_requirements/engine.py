@@ -1,12 +1,20 @@
 # app/core/validate_note_requirements/engine.py
 import os
+import time
+import asyncio
+import hashlib
 import logging
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from itertools import islice
 import google.generativeai as genai
-from typing import List, Dict, Any
-from app.core.validate_note_requirements.rules_loader import load_rules
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Tuple
+from app import config
+from app.core.validate_note_requirements.rule_store import get_rule_set
 from app.core.validate_note_requirements.prompts import build_gemini_prompt
 from app.schemas_new.validate_note_requirements import PerCodeResult
 from app.utils.json_utils import safe_extract_json, clean_model_text
+from app.core.llm_provider import gemini_generate, gemini_generate_async, configure_gemini
+from app.core.telemetry import stage
 
 logger = logging.getLogger(__name__)
 
@@ -14,103 +22,262 @@ USE_GEMINI = os.getenv("USE_GEMINI", "true").lower() == "true"
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 
 if USE_GEMINI and GEMINI_API_KEY:
-    genai.configure(api_key=GEMINI_API_KEY)
+    configure_gemini(GEMINI_API_KEY)
     GEMINI_MODEL = genai.GenerativeModel("gemini-1.5-flash")
 else:
     GEMINI_MODEL = None
 
-def _simple_term_check(soap: str, required_terms: List[str]) -> List[str]:
-    """Return list of terms that are missing (case-insensitive)."""
-    missing = []
-    s = soap.lower()
-    for term in required_terms:
-        if term.lower() not in s:
-            missing.append(term)
-    return missing
+def _simple_term_check(found: Dict[str, List[Tuple[int, int]]], required_terms: Tuple[str, ...]) -> Tuple[List[str], List[Dict[str, Any]]]:
+    """
+    Split required terms into missing ones and matched ones (with spans),
+    given this code's entry of `TermMatcher.match(soap)`.
+    """
+    missing = [term for term in required_terms if term not in found]
+    matched = [
+        {"term": term, "start": start, "end": end}
+        for term in required_terms
+        for start, end in found.get(term, [])
+    ]
+    return missing, matched
 
 def _call_gemini(prompt: str, timeout_s: int = 6) -> Dict[str, Any]:
     """Call Gemini (safely) and parse JSON. Returns dict or raises."""
-    if GEMINI_MODEL is None:
-        raise RuntimeError("Gemini not available/configured.")
-    resp = GEMINI_MODEL.generate_content(prompt)
+    with stage("llm_note_review"):
+        resp = gemini_generate(GEMINI_MODEL, prompt)
     text = clean_model_text(resp.text)
     return safe_extract_json(text) 
 
+def _deterministic_result(code_key: str, rule, found: Dict[str, List[Tuple[int, int]]]) -> PerCodeResult:
+    """Term-check verdict for one code: unknown (no rule), pass, or fail pending Gemini review."""
+    if not rule:
+        return PerCodeResult(
+            service_code=code_key,
+            compliance="unknown",
+            missing_terms=[],
+            suggestions=None,
+            gemini_used=False,
+            gemini_reasoning=None,
+            rule_version=None
+        )
+    missing_terms, matched_terms = _simple_term_check(found, rule.required_terms)
+    # If nothing missing → deterministic pass
+    return PerCodeResult(
+        service_code=code_key,
+        compliance="fail" if missing_terms else "pass",
+        missing_terms=missing_terms,
+        suggestions=list(rule.suggestions),
+        gemini_used=False,
+        gemini_reasoning=None,
+        rule_version=rule.version,
+        matched_terms=matched_terms
+    )
+
+def _needs_gemini(result: PerCodeResult) -> bool:
+    return result.compliance == "fail" and bool(USE_GEMINI and GEMINI_MODEL)
+
+def _reviewed_result(result: PerCodeResult, resp: Optional[Dict[str, Any]]) -> PerCodeResult:
+    """Fold Gemini's verdict into a term-check result; resp=None means the call failed."""
+    if resp is None:
+        return result  # deterministic "fail" stands
+    # Expect: {"status": "pass"|"warn"|"fail", ...}
+    status = resp.get("status", "").lower()
+    if status in ["pass", "warn", "fail"]:
+        compliance = status
+    else:
+        # fallback: treat "pass" bool if older prompt format
+        compliance = "pass" if resp.get("pass") else "fail"
+
+    # Sync missing terms if model provided them
+    missing_terms = resp["missing_terms"] if isinstance(resp.get("missing_terms"), list) else result.missing_terms
+
+    return PerCodeResult(
+        service_code=result.service_code,
+        compliance=compliance,
+        missing_terms=missing_terms,
+        suggestions=result.suggestions,
+        gemini_used=True,
+        gemini_reasoning=resp['explanation'],
+        rule_version=result.rule_version,
+        matched_terms=result.matched_terms
+    )
+
+def _gemini_review(code_key: str, rule, soap: str, result: PerCodeResult) -> PerCodeResult:
+    """Ask Gemini to judge a code whose required terms were not all found."""
+    try:
+        resp = _call_gemini(build_gemini_prompt(code_key, rule.requirement, soap))
+        return _reviewed_result(result, resp)
+    except Exception:
+        logger.exception("Gemini call failed; using deterministic result.")
+        return _reviewed_result(result, None)
+
+async def _gemini_review_async(code_key: str, rule, soap: str, result: PerCodeResult) -> PerCodeResult:
+    try:
+        with stage("llm_note_review"):
+            resp = await gemini_generate_async(GEMINI_MODEL, build_gemini_prompt(code_key, rule.requirement, soap))
+        return _reviewed_result(result, safe_extract_json(clean_model_text(resp.text)))
+    except Exception:
+        logger.exception("Gemini call failed; using deterministic result.")
+        return _reviewed_result(result, None)
+
+def _overall_status(results: List[PerCodeResult]) -> str:
+    statuses = [r.compliance for r in results]
+    if all(s == "pass" for s in statuses):
+        return "pass"
+    elif any(s == "pass" for s in statuses) or any(s == "warn" for s in statuses):
+        return "partial"
+    elif all(s == "unknown" for s in statuses):
+        return "unknown"
+    return "fail"
+
 def validate_soap_against_codes(soap: str, service_codes: List[str]) -> Dict[str, Any]:
     """Main function. Returns structure matching CheckNoteResponse."""
-    rules = load_rules()
+    # Hold one rule set for the whole request; a hot reload swaps in a new one
+    ruleset = get_rule_set()
+    rules = ruleset.rules
+    # One pass over the note for the required terms of all codes
+    with stage("term_match"):
+        term_matches = ruleset.matcher.match(soap)
     results = []
     for code in service_codes:
         code_key = str(code).strip()
         rule = rules.get(code_key)
-        if not rule:
-            r = PerCodeResult(
-                service_code=code_key,
-                compliance="unknown",
-                missing_terms=[],
-                suggestions=None,
-                gemini_used=False,
-                gemini_reasoning=None,
-                rule_version=None
-            )
-            results.append(r)
-            continue
-
-        required_terms = rule.get("required_terms", [])
-        missing_terms = _simple_term_check(soap, required_terms)
-
-        # Default assumption before Gemini
-        compliance = "fail"
-        gemini_used = False
-        gemini_reasoning = None
-
-        # If nothing missing → deterministic pass
-        if not missing_terms:
-            compliance = "pass"
-        elif USE_GEMINI and GEMINI_MODEL:
-            try:
-                prompt = build_gemini_prompt(code_key, rule.get("requirement", ""), soap)
-                resp = _call_gemini(prompt)
-                gemini_used = True
-                gemini_reasoning = resp['explanation']
-                # gemini_reasoning = json.dumps(resp)
-
-                # Expect: {"status": "pass"|"warn"|"fail", ...}
-                status = resp.get("status", "").lower()
-                if status in ["pass", "warn", "fail"]:
-                    compliance = status
-                else:
-                    # fallback: treat "pass" bool if older prompt format
-                    compliance = "pass" if resp.get("pass") else "fail"
-
-                # Sync missing terms if model provided them
-                if isinstance(resp.get("missing_terms"), list):
-                    missing_terms = resp["missing_terms"]
-
-            except Exception:
-                logger.exception("Gemini call failed; using deterministic result.")
-                compliance = "fail"
-
-        r = PerCodeResult(
-            service_code=code_key,
-            compliance=compliance,
-            missing_terms=missing_terms,
-            suggestions=rule.get("suggestions", []),
-            gemini_used=gemini_used,
-            gemini_reasoning=gemini_reasoning,
-            rule_version=rule.get("version")
-        )
+        r = _deterministic_result(code_key, rule, term_matches.get(code_key, {}))
+        if _needs_gemini(r):
+            r = _gemini_review(code_key, rule, soap, r)
         results.append(r)
 
-    # Overall status
-    statuses = [r.compliance for r in results]
-    if all(s == "pass" for s in statuses):
-        overall = "pass"
-    elif any(s == "pass" for s in statuses) or any(s == "warn" for s in statuses):
-        overall = "partial"
-    elif all(s == "unknown" for s in statuses):
-        overall = "unknown"
-    else:
-        overall = "fail"
+    return {"overall": _overall_status(results), "results": results}
+
+async def validate_soap_against_codes_async(soap: str, service_codes: List[str]) -> Dict[str, Any]:
+    """validate_soap_against_codes for async handlers: Gemini reviews of all failing codes run concurrently."""
+    ruleset = get_rule_set()
+    with stage("term_match"):
+        term_matches = ruleset.matcher.match(soap)
+    results = []
+    reviews = {}
+    for position, code in enumerate(service_codes):
+        code_key = str(code).strip()
+        rule = ruleset.rules.get(code_key)
+        r = _deterministic_result(code_key, rule, term_matches.get(code_key, {}))
+        if _needs_gemini(r):
+            reviews[position] = _gemini_review_async(code_key, rule, soap, r)
+        results.append(r)
+
+    for position, reviewed in zip(reviews, await asyncio.gather(*reviews.values())):
+        results[position] = reviewed
+    return {"overall": _overall_status(results), "results": results}
+
+# ----------------------------
+# Batch validation
+# ----------------------------
+def _note_key(soap: str) -> str:
+    return hashlib.sha256(soap.encode("utf-8")).hexdigest()
+
+def _claim_payload(index: int, claim: Dict[str, Any], results: List[PerCodeResult]) -> Dict[str, Any]:
+    return {
+        "index": index,
+        "claim_id": claim.get("claim_id"),
+        "overall": _overall_status(results),
+        "results": [r.dict() for r in results],
+    }
+
+def iter_validate_batch(claims: Iterable[Dict[str, Any]], llm_workers: Optional[int] = None,
+                        window: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Validate many claims ({"claim_id"?, "soap", "service_codes"}) and yield one
+    result dict per claim as soon as it is complete, then a final summary
+    ({"summary": {...}}).
+
+    Claims are read in windows of `window`; within a window each distinct note
+    is term-matched once (one automaton pass for all of its codes), and each
+    distinct (note, code) Gemini review runs once per batch on a bounded
+    thread pool. Claims that need no LLM call are yielded right
+    away, so results come back in completion order — use "index" to re-order.
+    The rule set is held for the whole batch.
+    """
+    llm_workers = max(1, llm_workers or config.NOTE_CHECK_LLM_WORKERS)
+    window = max(1, window or config.NOTE_CHECK_BATCH_WINDOW)
+    ruleset = get_rule_set()
+    rules = ruleset.rules
+
+    started = time.perf_counter()
+    stats = {"claims": 0, "unique_notes": 0, "term_checks": 0, "llm_calls": 0, "llm_deduplicated": 0}
+    seen_notes = set()
+    reviewed: Dict[Tuple[str, str], PerCodeResult] = {}  # finished Gemini reviews, reused across windows
+    claims = iter(claims)
+    index = 0
+
+    with ThreadPoolExecutor(max_workers=llm_workers, thread_name_prefix="note-check-llm") as pool:
+        while True:
+            chunk = list(islice(claims, window))
+            if not chunk:
+                break
+
+            # Deterministic pass: one matcher run per distinct note in the window
+            matches_by_note: Dict[str, Dict[str, Any]] = {}
+            for claim in chunk:
+                key = _note_key(claim["soap"])
+                if key not in matches_by_note:
+                    with stage("term_match"):
+                        matches_by_note[key] = ruleset.matcher.match(claim["soap"])
+                    stats["term_checks"] += 1
+                seen_notes.add(key)
+
+            # claim slot -> per-code results; pending Gemini futures keyed by (note, code)
+            futures: Dict[Tuple[str, str], Future] = {}
+            waiting: Dict[Future, List[Tuple[int, int]]] = {}
+            slots = []
+            for slot, claim in enumerate(chunk):
+                key = _note_key(claim["soap"])
+                results = []
+                for position, code in enumerate(claim.get("service_codes") or []):
+                    code_key = str(code).strip()
+                    rule = rules.get(code_key)
+                    r = _deterministic_result(code_key, rule, matches_by_note[key].get(code_key, {}))
+                    if _needs_gemini(r) and (key, code_key) in reviewed:
+                        r = reviewed[(key, code_key)]
+                        stats["llm_deduplicated"] += 1
+                    elif _needs_gemini(r):
+                        future = futures.get((key, code_key))
+                        if future is None:
+                            future = pool.submit(_gemini_review, code_key, rule, claim["soap"], r)
+                            futures[(key, code_key)] = future
+                            waiting[future] = []
+                            stats["llm_calls"] += 1
+                        else:
+                            stats["llm_deduplicated"] += 1
+                        waiting[future].append((slot, position))
+                    results.append(r)
+                slots.append({"index": index, "claim": claim, "results": results, "pending": 0})
+                index += 1
+
+            for future, targets in waiting.items():
+                for slot, _ in targets:
+                    slots[slot]["pending"] += 1
+
+            for entry in slots:
+                if entry["pending"] == 0:
+                    yield _claim_payload(entry["index"], entry["claim"], entry["results"])
+
+            remaining = set(waiting)
+            while remaining:
+                done, remaining = wait(remaining, return_when=FIRST_COMPLETED)
+                for future in done:
+                    result = future.result()  # _gemini_review never raises
+                    for slot, position in waiting[future]:
+                        entry = slots[slot]
+                        entry["results"][position] = result
+                        entry["pending"] -= 1
+                        if entry["pending"] == 0:
+                            yield _claim_payload(entry["index"], entry["claim"], entry["results"])
+
+            for note_code, future in futures.items():
+                reviewed[note_code] = future.result()
+            stats["claims"] += len(chunk)
 
-    return {"overall": overall, "results": results}
+    elapsed = time.perf_counter() - started
+    stats["unique_notes"] = len(seen_notes)
+    stats["elapsed_s"] = round(elapsed, 4)
+    stats["claims_per_s"] = round(stats["claims"] / elapsed, 1) if elapsed > 0 else None
+    stats["rule_version"] = ruleset.version
+    yield {"summary": stats}
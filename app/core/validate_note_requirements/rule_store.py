@@ -0,0 +1,225 @@
+# app/core/validate_note_requirements/rule_store.py
+"""
+Compiled, hot-reloadable takst rule set.
+
+Rules come from `takst_rules.yaml` only. As before, a code whose entry is
+empty stays "unknown", and a rule without required terms passes
+deterministically.
+
+The compiled `RuleSet` (typed rules + one TermMatcher over all required terms)
+is immutable. A polling watcher rebuilds it when the file changes and swaps
+the reference in one assignment, so a request that already holds a RuleSet
+finishes against the version it started with.
+"""
+import os
+import time
+import hashlib
+import logging
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Dict, Mapping, Optional, Tuple
+
+import yaml
+
+from app import config
+from app.core.validate_note_requirements.term_matcher import TermMatcher
+
+logger = logging.getLogger(__name__)
+
+TAKST_RULES_FILE = os.path.join("data", "takst_rules.yaml")
+# helfo_fee_codes_structured.yaml is deliberately not merged in: its scraped alternatives
+# would become all-required terms, and codes without a takst rule would fail
+# deterministically instead of staying unknown.
+RULE_FILES = (TAKST_RULES_FILE,)
+
+
+@dataclass(frozen=True, slots=True)
+class CompiledRule:
+    code: str
+    name: str
+    required_terms: Tuple[str, ...]
+    warn_terms: Tuple[str, ...]
+    suggestions: Tuple[str, ...]
+    version: Optional[str]
+    requirement: str
+    severity: Mapping[str, str]
+    source: str
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Raw-YAML shaped dict, for callers of the old `load_rules()`."""
+        return {
+            "name": self.name,
+            "required_terms": list(self.required_terms),
+            "warn_terms": list(self.warn_terms),
+            "suggestions": list(self.suggestions),
+            "version": self.version,
+            "requirement": self.requirement,
+            "severity": dict(self.severity),
+        }
+
+
+@dataclass(frozen=True, slots=True)
+class RuleSet:
+    rules: Mapping[str, CompiledRule]
+    matcher: TermMatcher
+    version: str                     # content hash of all rule files
+    loaded_at: float                 # unix time of compilation
+    sources: Mapping[str, str] = field(default_factory=dict)  # path -> sha256
+
+
+def _as_tuple(value) -> Tuple[str, ...]:
+    if not value:
+        return ()
+    if isinstance(value, str):
+        return (value,)
+    return tuple(str(v) for v in value)
+
+
+def _compile_rule(code: str, raw: Dict[str, Any], source: str) -> CompiledRule:
+    return CompiledRule(
+        code=code,
+        name=str(raw.get("name", "")),
+        required_terms=_as_tuple(raw.get("required_terms")),
+        warn_terms=_as_tuple(raw.get("warn_terms")),
+        suggestions=_as_tuple(raw.get("suggestions")),
+        version=raw.get("version"),
+        requirement=str(raw.get("requirement", "")),
+        severity=dict(raw.get("severity") or {}),
+        source=source,
+    )
+
+
+def compile_rules(paths=RULE_FILES) -> RuleSet:
+    """Read and compile the rule files. Raises on missing/invalid YAML."""
+    rules: Dict[str, CompiledRule] = {}
+    sources: Dict[str, str] = {}
+    for path in paths:
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Rules file not found: {path}")
+        with open(path, "rb") as f:
+            content = f.read()
+        sources[path] = hashlib.sha256(content).hexdigest()
+        for code, raw in (yaml.safe_load(content) or {}).items():
+            if not raw:
+                continue  # empty entry: the code stays "unknown"
+            code = str(code).strip()
+            rules[code] = _compile_rule(code, raw, os.path.basename(path))
+    return _build_ruleset(rules, sources, paths)
+
+
+def _compile_from_snapshot(paths) -> Optional[RuleSet]:
+    """Merged rules from the reference snapshot, if it was built from these exact rule files."""
+    from app.core.reference_snapshot import get_snapshot
+
+    snapshot = get_snapshot()
+    if snapshot is None or not snapshot.has("note_rules") or not all(p in snapshot.sources for p in paths):
+        return None
+    rules = {
+        code: _compile_rule(code, raw, raw.get("source", ""))
+        for code, raw in snapshot.json("note_rules").items()
+    }
+    return _build_ruleset(rules, {p: snapshot.sources[p] for p in paths}, paths)
+
+
+def _build_ruleset(rules: Dict[str, CompiledRule], sources: Dict[str, str], paths) -> RuleSet:
+    matcher = TermMatcher(
+        {code: rule.required_terms for code, rule in rules.items()},
+        stem=config.TERM_MATCH_STEMMING,
+    )
+    version = hashlib.sha256("".join(sources[p] for p in paths).encode()).hexdigest()[:12]
+    return RuleSet(rules=rules, matcher=matcher, version=version, loaded_at=time.time(), sources=sources)
+
+
+class RuleStore:
+    def __init__(self, paths=RULE_FILES, poll_interval_s: float = 5.0):
+        self.paths = tuple(paths)
+        self.poll_interval_s = poll_interval_s
+        self._current = _compile_from_snapshot(self.paths) or compile_rules(self.paths)
+        self._stamps = self._file_stamps()
+        self._reload_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.reload_count = 0
+        self.last_error = None
+
+    def _file_stamps(self):
+        stamps = []
+        for path in self.paths:
+            try:
+                st = os.stat(path)
+                stamps.append((st.st_mtime_ns, st.st_size))
+            except OSError:
+                stamps.append(None)
+        return tuple(stamps)
+
+    def current(self) -> RuleSet:
+        return self._current
+
+    def reload(self, force: bool = False) -> bool:
+        """Recompile if a file changed (or force). Returns True if a new RuleSet was swapped in."""
+        with self._reload_lock:
+            stamps = self._file_stamps()
+            if not force and stamps == self._stamps:
+                return False
+            try:
+                ruleset = compile_rules(self.paths)
+            except Exception as e:
+                # Keep serving the previous rule set; retry on the next change
+                self.last_error = str(e)
+                self._stamps = stamps
+                logger.exception("Rule reload failed; keeping version %s", self._current.version)
+                return False
+            self._stamps = stamps
+            self.last_error = None
+            if ruleset.version == self._current.version:
+                return False
+            self._current = ruleset
+            self.reload_count += 1
+            logger.info("Loaded takst rules version %s (%d codes)", ruleset.version, len(ruleset.rules))
+            return True
+
+    def _watch(self):
+        while not self._stop.wait(self.poll_interval_s):
+            self.reload()
+
+    def start_watcher(self):
+        if self.poll_interval_s <= 0 or (self._thread and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._watch, name="rule-store-watcher", daemon=True)
+        self._thread.start()
+
+    def stop_watcher(self):
+        self._stop.set()
+
+    def info(self) -> Dict[str, Any]:
+        ruleset = self._current
+        return {
+            "version": ruleset.version,
+            "loaded_at": ruleset.loaded_at,
+            "rule_count": len(ruleset.rules),
+            "term_patterns": len(ruleset.matcher),
+            "sources": dict(ruleset.sources),
+            "reload_count": self.reload_count,
+            "last_error": self.last_error,
+            "watching": bool(self._thread and self._thread.is_alive()),
+        }
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_rule_store() -> RuleStore:
+    """Process-wide store; compiled and watched on first use."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = RuleStore(poll_interval_s=config.RULES_RELOAD_INTERVAL_S)
+                _store.start_watcher()
+    return _store
+
+
+def get_rule_set() -> RuleSet:
+    return get_rule_store().current()
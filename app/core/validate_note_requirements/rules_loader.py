@@ -1,17 +1,8 @@
 # app/core/validate_note_requirements/rules_loader.py
-import yaml
-import os
-from functools import lru_cache
+from app.core.validate_note_requirements.rule_store import get_rule_set, TAKST_RULES_FILE
 
-RULES_FILE = os.path.join("data", "takst_rules.yaml")
+RULES_FILE = TAKST_RULES_FILE
 
-@lru_cache(maxsize=1)
 def load_rules():
-    """Load takst rules from YAML and return as dict keyed by service code (string)."""
-    if not os.path.exists(RULES_FILE):
-        raise FileNotFoundError(f"Rules file not found: {RULES_FILE}")
-    with open(RULES_FILE, "r", encoding="utf-8") as f:
-        data = yaml.safe_load(f)
-    # Ensure keys are strings & normalized
-    normalized = {str(k).strip(): v for k, v in (data or {}).items()}
-    return normalized
+    """Current takst rules as raw dicts keyed by service code (string)."""
+    return {code: rule.as_dict() for code, rule in get_rule_set().rules.items()}
@@ -0,0 +1,141 @@
+# app/core/validate_note_requirements/term_matcher.py
+"""
+Aho–Corasick matcher for the required terms of all service codes.
+
+Terms are compiled once into one automaton; a single pass over the note then
+reports every matched term of every code with its character span in the
+original text (for UI highlighting).
+
+Matching keeps the semantics of the old `term.lower() in soap.lower()` check
+(case-insensitive substring), with whitespace runs folded to one space. With
+stemming enabled, the last word of each term is also indexed as its light
+Norwegian stem, so "blodtrykk" matches "blodtrykket" / "blodtrykkene".
+"""
+from collections import deque
+from typing import Dict, Iterable, List, Tuple
+
+# Norwegian inflection suffixes, longest first (Snowball step 1, simplified)
+NORWEGIAN_SUFFIXES = (
+    "hetenes", "hetene", "hetens", "heten", "endes", "ende", "ande", "edes",
+    "enes", "erte", "ene", "ane", "ede", "ens", "ers", "ets", "het", "ert",
+    "er", "en", "ar", "et", "es", "as", "e", "a", "s",
+)
+MIN_STEM_LEN = 4
+
+
+def normalize(text: str) -> Tuple[str, List[int]]:
+    """
+    Lower-case and fold whitespace runs to one space.
+    Returns (normalized_text, offsets) where offsets[i] is the index in `text`
+    of normalized character i.
+    """
+    chars, offsets = [], []
+    previous_space = False
+    for i, ch in enumerate(text):
+        if ch.isspace():
+            if previous_space:
+                continue
+            previous_space = True
+            chars.append(" ")
+            offsets.append(i)
+            continue
+        previous_space = False
+        for lowered in ch.lower():
+            chars.append(lowered)
+            offsets.append(i)
+    return "".join(chars), offsets
+
+
+def stem_norwegian(word: str) -> str:
+    for suffix in NORWEGIAN_SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= MIN_STEM_LEN:
+            return word[:-len(suffix)]
+    return word
+
+
+def _term_variants(term: str, stem: bool) -> List[str]:
+    normalized, _ = normalize(term.strip())
+    if not normalized:
+        return []
+    variants = [normalized]
+    if stem:
+        head, _, last = normalized.rpartition(" ")
+        stemmed = stem_norwegian(last)
+        if stemmed != last:
+            variants.append(f"{head} {stemmed}" if head else stemmed)
+    return variants
+
+
+class TermMatcher:
+    """
+    terms_by_key: {service_code: [required_term, ...]}.
+    `match(text)` → {service_code: {term: [(start, end), ...]}} for matched terms only.
+    """
+
+    def __init__(self, terms_by_key: Dict[str, Iterable[str]], stem: bool = False):
+        self.stem = stem
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        # Per state: pattern ids ending here (own + inherited through fail links)
+        self._out: List[List[int]] = [[]]
+        self._patterns: List[Tuple[int, List[Tuple[str, str]]]] = []  # (length, [(key, term)])
+        pattern_ids: Dict[str, int] = {}
+
+        for key, terms in terms_by_key.items():
+            for term in terms or []:
+                for variant in _term_variants(str(term), stem):
+                    pid = pattern_ids.get(variant)
+                    if pid is None:
+                        pid = pattern_ids[variant] = len(self._patterns)
+                        self._patterns.append((len(variant), []))
+                        self._insert(variant, pid)
+                    owners = self._patterns[pid][1]
+                    if (key, term) not in owners:
+                        owners.append((key, term))
+        self._build_fail_links()
+
+    def _insert(self, pattern: str, pid: int):
+        state = 0
+        for ch in pattern:
+            nxt = self._goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            state = nxt
+        self._out[state].append(pid)
+
+    def _build_fail_links(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fallback = self._fail[state]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[nxt] = self._goto[fallback].get(ch, 0)
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def match(self, text: str) -> Dict[str, Dict[str, List[Tuple[int, int]]]]:
+        normalized, offsets = normalize(text)
+        found: Dict[str, Dict[str, List[Tuple[int, int]]]] = {}
+        goto, fail, out = self._goto, self._fail, self._out
+        state = 0
+        for i, ch in enumerate(normalized):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            for pid in out[state]:
+                length, owners = self._patterns[pid]
+                span = (offsets[i - length + 1], offsets[i] + 1)
+                for key, term in owners:
+                    spans = found.setdefault(key, {}).setdefault(term, [])
+                    if span not in spans:
+                        spans.append(span)
+        return found
+
+    def __len__(self):
+        return len(self._patterns)
@@ -1,20 +1,30 @@
 import re
 import json
+import asyncio
 import logging
-from typing import List
+from typing import List, Optional
 
 import google.generativeai as genai
 
 from app.config import GEMINI_API_KEY
 from app.utils.json_utils import safe_extract_json, clean_model_text
-from app.core.diagnosis_search import search_diagnosis_with_explanation
-from app.core.pii_analyzer import analyze_text, anonymize_text
+from app.core.diagnosis_search import search_concept
+from app.core.pii_pipeline import anonymize_soap
+from app.core.llm_provider import gemini_generate, gemini_generate_async, configure_gemini
+from app.core.executors import Overloaded, run_cpu
+from app.core.telemetry import stage
+from app.core.structured_logging import get_logger, lazy
+from app.core.concept_extractor import extract_concepts
+from app.core.combination_rules import check_combination, get_combination_rules
+from app.core.service_diagnosis_compat import check_service_diagnosis_pairs
+from app.core.tiers import estimate_extract_cost, get_tier
 
 # Configure Gemini
-genai.configure(api_key=GEMINI_API_KEY)
+configure_gemini(GEMINI_API_KEY)
 model = genai.GenerativeModel("gemini-1.5-flash")
 
 logger = logging.getLogger(__name__)
+log = get_logger(__name__)
 
 
 def _extract_first_json_array(text: str) -> List:
@@ -75,34 +85,54 @@ def group_clinical_concepts_with_gemini(soap_text: str) -> list[str]:
     """
     prompt = GROUPING_PROMPT_TEMPLATE.format(soap=soap_text)
     try:
-        response = model.generate_content(prompt)
-        logger.debug(f"Gemini grouping response: {response.text}")
+        with stage("llm_grouping"):
+            response = gemini_generate(model, prompt)
         text = clean_model_text(response.text)
         concepts = _extract_first_json_array(text)
         if not concepts:
-            logger.warning("Gemini returned empty or invalid JSON for grouping; falling back to whole SOAP.")
-            return [soap_text.strip()]
-        print(f"[DEBUG] Searching concept: '{concepts}'")
+            logger.warning("Gemini returned empty or invalid JSON for grouping; falling back to local extraction.")
+            return group_clinical_concepts_locally(soap_text)
+        log.debug("gemini_grouped", count=len(concepts), concepts=concepts)
         return concepts
     except Exception as e:
-        logger.exception("Gemini grouping failed, falling back to whole SOAP.")
-        return [soap_text.strip()]
+        logger.exception("Gemini grouping failed, falling back to local extraction.")
+        return group_clinical_concepts_locally(soap_text)
 
 
-# ----------------------------
-# Gemini reranking for diagnoses
-# ----------------------------
-def rerank_diagnoses_with_gemini(grouped_concepts: List[str], search_results: dict, final_top_n: int = 1):
+async def group_clinical_concepts_with_gemini_async(soap_text: str) -> list[str]:
+    """group_clinical_concepts_with_gemini with the async Gemini client; local fallback on the CPU executor."""
+    prompt = GROUPING_PROMPT_TEMPLATE.format(soap=soap_text)
+    try:
+        with stage("llm_grouping"):
+            response = await gemini_generate_async(model, prompt)
+        concepts = _extract_first_json_array(clean_model_text(response.text))
+        if concepts:
+            return concepts
+        logger.warning("Gemini returned empty or invalid JSON for grouping; falling back to local extraction.")
+    except Exception:
+        logger.exception("Gemini grouping failed, falling back to local extraction.")
+    return await run_cpu(group_clinical_concepts_locally, soap_text)
+
+
+def group_clinical_concepts_locally(soap_text: str) -> list[str]:
     """
-    Use Gemini LLM to rerank and validate diagnoses for each clinical concept.
-    Returns updated detailed_matches with filtered and ranked diagnoses limited to final_top_n per concept.
+    Fast path: spaCy-based section/clause segmentation with negation filtering.
+    Falls back to the whole SOAP as one concept if nothing is extracted.
     """
-    updated_results = []
-    for concept_block in search_results.get("diagnoses", []):
-        concept = concept_block["concept"]
-        matches = concept_block["matches"]
+    try:
+        with stage("concept_extraction"):
+            concepts = extract_concepts(soap_text)
+    except Exception:
+        logger.exception("Local concept extraction failed, falling back to whole SOAP.")
+        concepts = []
+    return concepts or [soap_text.strip()]
+
 
-        prompt = f"""
+# ----------------------------
+# Gemini reranking for diagnoses
+# ----------------------------
+def _build_rerank_prompt(concept: str, matches: list) -> str:
+    return f"""
 You are a medical expert assistant with deep clinical knowledge.
 
 You are given:
@@ -143,87 +173,115 @@ Candidate diagnoses:
 
 Output only the JSON object.
 """
-        try:
-            logger.debug(f"Prompt for Gemini rerank for concept: {concept}")
-            resp = model.generate_content(prompt)
-            logger.debug(f"[DEBUG] Gemini raw response for concept '{concept}': {resp.text}")
-            text = clean_model_text(resp.text)
-
-            try:
-                filtered = safe_extract_json(text)
-            except Exception:
-                logger.warning(f"Failed to parse Gemini response JSON, falling back to original matches for concept: {concept}")
-                filtered = matches  # fallback if JSON parsing fails
-
-            # Limit final top N matches here
-            if len(filtered['diagnoses']) > final_top_n:
-                filtered['diagnoses'] = filtered['diagnoses'][:final_top_n]
-
-            # Add ranking if missing
-            # for i, diag in enumerate(filtered):
-            #     diag['rank'] = i + 1
-
-            updated_results.append({
-                "concept": concept,
-                "matches": filtered['diagnoses']
-            })
-        except Exception as e:
-            print(f"Gemini reranking failed for concept: {concept}, error: {e}")
-            logger.exception(f"Gemini reranking failed for concept: {concept}")
-            # fallback to original matches with limit
-            updated_results.append({
-                "concept": concept,
-                "matches": matches[:final_top_n]
-            })
-    return updated_results
-
-
-def extract_diagnoses_from_soap(soap: str, top_k: int = 5, min_similarity: float = 0.6, final_top_n: int = 1):
+
+
+def _parse_rerank_response(concept: str, matches: list, resp, final_top_n: int) -> list:
+    log.debug("gemini_rerank_output", concept=concept, model_output=lazy(lambda: resp.text))
+    text = clean_model_text(resp.text)
+
+    try:
+        filtered = safe_extract_json(text)
+    except Exception:
+        log.warning("gemini_rerank_unparseable", concept=concept)
+        filtered = matches  # fallback if JSON parsing fails
+
+    # Limit final top N matches here
+    if len(filtered['diagnoses']) > final_top_n:
+        filtered['diagnoses'] = filtered['diagnoses'][:final_top_n]
+
+    return filtered['diagnoses']
+
+
+def rerank_concept_with_gemini(concept: str, matches: list, final_top_n: int = 1) -> list:
     """
-    Enhanced flow:
-    1. Remove PII
-    2. Group clinical concepts via Gemini LLM (instead of simple regex splitting)
-    3. For each concept, get top_k diagnosis matches with explanations from FAISS
-    4. Use Gemini LLM to rerank and filter diagnosis matches, limiting final matches to final_top_n
-    5. Return both:
-       - unique_codes: deduplicated list of all matched codes
-       - detailed_matches: full concept → matches mapping
+    Use Gemini LLM to rerank and validate the diagnoses of one clinical concept.
+    Falls back to the cross-encoder order (limited to final_top_n) on failure.
+    """
+    try:
+        with stage("llm_rerank"):
+            resp = gemini_generate(model, _build_rerank_prompt(concept, matches))
+        return _parse_rerank_response(concept, matches, resp, final_top_n)
+    except Exception:
+        log.exception("gemini_rerank_failed", concept=concept)
+        # fallback to original matches with limit
+        return matches[:final_top_n]
+
+
+async def rerank_concept_with_gemini_async(concept: str, matches: list, final_top_n: int = 1) -> list:
+    """rerank_concept_with_gemini with the async Gemini client."""
+    try:
+        with stage("llm_rerank"):
+            resp = await gemini_generate_async(model, _build_rerank_prompt(concept, matches))
+        return _parse_rerank_response(concept, matches, resp, final_top_n)
+    except Exception:
+        log.exception("gemini_rerank_failed", concept=concept)
+        return matches[:final_top_n]
+
+
+def rerank_diagnoses_with_gemini(grouped_concepts: List[str], search_results: dict, final_top_n: int = 1):
+    """
+    Use Gemini LLM to rerank and validate diagnoses for each clinical concept.
+    Returns updated detailed_matches with filtered and ranked diagnoses limited to final_top_n per concept.
+    """
+    return [
+        {
+            "concept": concept_block["concept"],
+            "matches": rerank_concept_with_gemini(concept_block["concept"], concept_block["matches"], final_top_n)
+        }
+        for concept_block in search_results.get("diagnoses", [])
+    ]
+
+
+def iter_extract_diagnoses_events(soap: str, top_k: int = 5, min_similarity: float = 0.6, final_top_n: int = 1,
+                                  mode: str = "llm"):
+    """
+    Same flow as extract_diagnoses_from_soap, yielding (event, data) tuples as
+    each stage completes so callers can stream partial results:
+    - "grouped":    {"concepts": [...]}
+    - "candidates": {"concept", "matches"} after FAISS + cross-encoder, per concept
+    - "reranked":   {"concept", "matches"} after Gemini rerank, per concept
+    - "done":       {"unique_codes", "detailed_matches"}
     """
     # --- Step 0: PII removal ---
     try:
-        entities = analyze_text(soap)  # returns analyzer results
-        soap_no_pii = anonymize_text(soap, entities)
+        soap_no_pii = anonymize_soap(soap)  # shares the PII pass with other stages of the request
     except Exception:
         logger.exception("PII removal failed; falling back to original SOAP.")
         soap_no_pii = soap
 
-    # --- Step 1: Group clinical concepts using Gemini ---
+    # --- Step 1: Group clinical concepts (Gemini, or local fast path) ---
     try:
-        grouped = group_clinical_concepts_with_gemini(soap_no_pii)
-        print(f"[DEBUG] Gemini grouped clinical concepts ({len(grouped)}): {grouped}")
-        logger.debug(f"[DEBUG] Gemini grouped clinical concepts ({len(grouped)}): {grouped}")
+        if mode == "fast":
+            grouped = group_clinical_concepts_locally(soap_no_pii)
+        else:
+            grouped = group_clinical_concepts_with_gemini(soap_no_pii)
+        log.debug("concepts_grouped", mode=mode, count=len(grouped), concepts=grouped)
     except Exception:
         logger.exception("Gemini grouping failed; using whole SOAP as single concept.")
         grouped = [soap_no_pii.strip()]
+    yield "grouped", {"concepts": grouped}
 
-    # --- Step 2: Search for diagnoses with explanations ---
-    try:
-        search_results = search_diagnosis_with_explanation(
-            grouped_concepts=grouped, top_k=top_k, min_similarity=min_similarity
-        )
-    except Exception:
-        logger.exception("search_diagnosis_with_explanation failed.")
-        return {
-            "unique_codes": [],
-            "detailed_matches": []
+    detailed_matches = []
+    for concept in grouped:
+        # --- Step 2: Search for diagnoses with explanations ---
+        try:
+            concept_block = search_concept(concept, top_k=top_k, min_similarity=min_similarity)
+        except Exception:
+            logger.exception("search_concept failed.")
+            yield "done", {
+                "unique_codes": [],
+                "detailed_matches": []
+            }
+            return
+        yield "candidates", concept_block
+
+        # --- Step 3: Gemini reranking (falls back to cross-encoder order) ---
+        reranked_block = {
+            "concept": concept,
+            "matches": rerank_concept_with_gemini(concept, concept_block["matches"], final_top_n=final_top_n)
         }
-
-    # --- Step 3: Gemini reranking with error handling ---
-    try:
-        detailed_matches = rerank_diagnoses_with_gemini(grouped, search_results, final_top_n=final_top_n)
-    except Exception:
-        logger.exception("Gemini reranking failed, using original matches.")
-        detailed_matches = search_results.get("diagnoses", [])
+        detailed_matches.append(reranked_block)
+        yield "reranked", reranked_block
 
     # --- Step 4: Deduplicate codes ---
     unique_codes = set()
@@ -232,7 +290,206 @@ def extract_diagnoses_from_soap(soap: str, top_k: int = 5, min_similarity: float
             if match.get("code"):
                 unique_codes.add(match["code"])
 
-    return {
+    yield "done", {
         "unique_codes": list(unique_codes),
         "detailed_matches": detailed_matches
     }
+
+
+def extract_diagnoses_from_soap(soap: str, top_k: int = 5, min_similarity: float = 0.6, final_top_n: int = 1,
+                                mode: str = "llm"):
+    """
+    Enhanced flow:
+    1. Remove PII
+    2. Group clinical concepts via Gemini LLM, or locally with spaCy when mode="fast"
+    3. For each concept, get top_k diagnosis matches with explanations from FAISS
+    4. Use Gemini LLM to rerank and filter diagnosis matches, limiting final matches to final_top_n
+    5. Return both:
+       - unique_codes: deduplicated list of all matched codes
+       - detailed_matches: full concept → matches mapping
+    """
+    for event, data in iter_extract_diagnoses_events(soap, top_k, min_similarity, final_top_n, mode):
+        if event == "done":
+            return data
+
+
+async def extract_diagnoses_from_soap_async(soap: str, top_k: int = 5, min_similarity: float = 0.6,
+                                            final_top_n: int = 1, mode: str = "llm", anonymized: bool = False,
+                                            tier: Optional[str] = None):
+    """
+    extract_diagnoses_from_soap for async handlers. PII removal, local grouping,
+    FAISS and the cross-encoder run on the CPU executor; Gemini calls are awaited.
+    Concepts are searched and reranked concurrently, results keep concept order.
+    anonymized=True: `soap` has already been through anonymize_soap, skip PII removal.
+    tier: latency tier (app/core/tiers.py); fast/balanced use local grouping and
+    skip the Gemini rerank. The result includes the tier and its estimated cost.
+    Raises executors.Overloaded when the CPU executor is full.
+    """
+    profile = get_tier(tier)
+    if not profile.llm:
+        mode = "fast"
+    if anonymized:
+        soap_no_pii = soap
+    else:
+        try:
+            soap_no_pii = await run_cpu(anonymize_soap, soap)
+        except Overloaded:
+            raise
+        except Exception:
+            logger.exception("PII removal failed; falling back to original SOAP.")
+            soap_no_pii = soap
+
+    try:
+        if mode == "fast":
+            grouped = await run_cpu(group_clinical_concepts_locally, soap_no_pii)
+        else:
+            grouped = await group_clinical_concepts_with_gemini_async(soap_no_pii)
+    except Overloaded:
+        raise
+    except Exception:
+        logger.exception("Concept grouping failed; using whole SOAP as single concept.")
+        grouped = [soap_no_pii.strip()]
+
+    async def concept_pipeline(concept: str) -> Optional[dict]:
+        try:
+            concept_block = await run_cpu(
+                search_concept, concept, top_k=top_k, min_similarity=min_similarity,
+                initial_k=profile.initial_k, cross_encoder=profile.cross_encoder
+            )
+        except Overloaded:
+            raise
+        except Exception:
+            logger.exception("search_concept failed.")
+            return None
+        if not profile.llm:
+            return {"concept": concept, "matches": concept_block["matches"][:final_top_n]}
+        return {
+            "concept": concept,
+            "matches": await rerank_concept_with_gemini_async(concept, concept_block["matches"], final_top_n=final_top_n)
+        }
+
+    detailed_matches = await asyncio.gather(*(concept_pipeline(concept) for concept in grouped))
+    if any(block is None for block in detailed_matches):
+        # Same as the sync path: a failed search yields an empty result rather than an error
+        detailed_matches = []
+
+    unique_codes = {
+        match["code"]
+        for concept_block in detailed_matches
+        for match in concept_block.get("matches", [])
+        if match.get("code")
+    }
+    return {
+        "unique_codes": list(unique_codes),
+        "detailed_matches": list(detailed_matches),
+        "tier": profile.name,
+        "estimated_cost": estimate_extract_cost(profile, soap_no_pii, grouped, top_k, final_top_n, mode),
+    }
+
+
+# ----------------------------
+# Service code ↔ diagnosis compatibility
+# ----------------------------
+def check_service_diagnosis(soap: str, diagnoses: List[str], service_codes: List[str],
+                            use_embeddings: bool = True) -> list:
+    """
+    Verdict for every (service code, diagnosis) pair, computed locally from
+    kreverDiagnose / ICD prefix rules and description similarity (no LLM call).
+    `soap` is accepted for API compatibility and not sent anywhere.
+    """
+    pairs = [(code, diagnosis) for code in service_codes for diagnosis in diagnoses]
+    return check_service_diagnosis_pairs(pairs, use_embeddings=use_embeddings)
+
+
+# ----------------------------
+# Service code combination warnings
+# ----------------------------
+COMBO_EXPLAIN_PROMPT_TEMPLATE = """You are a Norwegian medical billing assistant (HELFO takster).
+
+The following problems were found deterministically in the service codes billed for one consultation.
+They are facts from the official fee table; do NOT question or add to them.
+
+Problems:
+{problems}
+
+SOAP Note:
+{soap}
+
+For each problem, write one or two sentences explaining it to the clinician and how the documentation
+or the billed codes could be corrected. Answer in the language of the SOAP note.
+
+✳️ Output format:
+- Return a JSON array of strings, one explanation per problem, in the same order.
+"""
+
+def _describe_code(code: str) -> str:
+    description = get_combination_rules().descriptions.get(code, "")
+    return f"{code} ({description[:80]})" if description else code
+
+
+def check_semantic_combo_warning(service_codes: List[str], soap: str, explain: bool = False) -> list:
+    """
+    Deterministic combination check against taksttabell.xml (ugyldigKombinasjon /
+    kreverTakst). Returns a list of warnings; with explain=True, Gemini adds a
+    natural-language "explanation" to each (the verdicts never depend on it).
+    """
+    result = check_combination(service_codes)
+    warnings = []
+    for a, b in result["invalid_pairs"]:
+        warnings.append({
+            "type": "invalid_combination",
+            "codes": [a, b],
+            "message": f"{_describe_code(a)} kan ikke kombineres med {_describe_code(b)}."
+        })
+    for item in result["missing_requirements"]:
+        warnings.append({
+            "type": "missing_required_code",
+            "codes": [item["code"]],
+            "requires_any_of": item["requires_any_of"],
+            "message": f"{_describe_code(item['code'])} krever en av: {', '.join(item['requires_any_of'])}."
+        })
+    for code in result["unknown_codes"]:
+        warnings.append({
+            "type": "unknown_code",
+            "codes": [code],
+            "message": f"{code} finnes ikke i taksttabellen."
+        })
+
+    problems = [w for w in warnings if w["type"] != "unknown_code"]
+    if explain and problems:
+        try:
+            prompt = _combo_explain_prompt(problems, anonymize_soap(soap))
+            with stage("llm_combo_explain"):
+                response = gemini_generate(model, prompt)
+            _attach_explanations(problems, response)
+        except Exception:
+            logger.exception("Gemini combo explanation failed; returning deterministic warnings only.")
+    return warnings
+
+
+def _combo_explain_prompt(problems: list, anonymized_soap: str) -> str:
+    return COMBO_EXPLAIN_PROMPT_TEMPLATE.format(
+        problems="\n".join(f"{i + 1}. {w['message']}" for i, w in enumerate(problems)),
+        soap=anonymized_soap
+    )
+
+
+def _attach_explanations(problems: list, response):
+    explanations = _extract_first_json_array(clean_model_text(response.text))
+    for warning, explanation in zip(problems, explanations):
+        warning["explanation"] = explanation
+
+
+async def check_semantic_combo_warning_async(service_codes: List[str], soap: str, explain: bool = False) -> list:
+    """check_semantic_combo_warning with PII removal on the CPU executor and the async Gemini client."""
+    warnings = check_semantic_combo_warning(service_codes, soap, explain=False)
+    problems = [w for w in warnings if w["type"] != "unknown_code"]
+    if explain and problems:
+        anonymized = await run_cpu(anonymize_soap, soap)
+        try:
+            with stage("llm_combo_explain"):
+                response = await gemini_generate_async(model, _combo_explain_prompt(problems, anonymized))
+            _attach_explanations(problems, response)
+        except Exception:
+            logger.exception("Gemini combo explanation failed; returning deterministic warnings only.")
+    return warnings
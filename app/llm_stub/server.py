@@ -0,0 +1,198 @@
+# app/llm_stub/server.py
+"""
+Local deterministic stand-in for the Gemini and OpenAI HTTP APIs.
+
+Speaks the REST shapes used by `google-generativeai` (transport="rest") and the
+`openai` SDK, answering every prompt with rule-derived JSON from responders.py.
+Latency and error rate are configurable so load tests see realistic timing.
+
+Run:
+    python -m app.llm_stub.server --port 8001 --latency lognormal:300:0.5 --error-rate 0.02
+
+Point the app at it:
+    GEMINI_API_ENDPOINT=http://127.0.0.1:8001
+    OPENAI_BASE_URL=http://127.0.0.1:8001/v1
+"""
+import os
+import time
+import random
+import hashlib
+import asyncio
+import argparse
+import threading
+from typing import Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+from app.llm_stub.responders import respond
+
+
+class LatencyModel:
+    """
+    Parses a latency spec (milliseconds):
+      fixed:<ms>
+      uniform:<min_ms>:<max_ms>
+      lognormal:<median_ms>:<sigma>
+    """
+
+    def __init__(self, spec: str, rng: random.Random):
+        parts = spec.split(":")
+        self.kind = parts[0]
+        self.params = [float(p) for p in parts[1:]]
+        self.rng = rng
+        expected = {"fixed": 1, "uniform": 2, "lognormal": 2}
+        if self.kind not in expected or len(self.params) != expected[self.kind]:
+            raise ValueError(f"Invalid latency spec: {spec}")
+
+    def sample_s(self) -> float:
+        if self.kind == "fixed":
+            ms = self.params[0]
+        elif self.kind == "uniform":
+            ms = self.rng.uniform(*self.params)
+        else:
+            median_ms, sigma = self.params
+            ms = median_ms * self.rng.lognormvariate(0.0, sigma)
+        return max(0.0, ms) / 1000.0
+
+
+class StubSettings:
+    def __init__(self, latency: str, error_rate: float, error_status: int, seed: int):
+        self.rng = random.Random(seed)
+        self.latency = LatencyModel(latency, self.rng)
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.lock = threading.Lock()
+        self.stats = {"requests": 0, "errors": 0, "latency_total_s": 0.0}
+
+    def draw(self) -> tuple[float, bool]:
+        """(delay in seconds, whether to fail) for the next request."""
+        with self.lock:
+            return self.latency.sample_s(), self.rng.random() < self.error_rate
+
+
+settings = StubSettings(
+    latency=os.getenv("LLM_STUB_LATENCY", "fixed:0"),
+    error_rate=float(os.getenv("LLM_STUB_ERROR_RATE", "0")),
+    error_status=int(os.getenv("LLM_STUB_ERROR_STATUS", "503")),
+    seed=int(os.getenv("LLM_STUB_SEED", "42")),
+)
+
+app = FastAPI(title="Local LLM stand-in", description="Deterministic Gemini/OpenAI replacement for benchmarks.")
+
+
+async def _simulate() -> Optional[float]:
+    """Sleep for the sampled latency. Returns None if this request should fail."""
+    delay, fail = settings.draw()
+    await asyncio.sleep(delay)
+    with settings.lock:
+        settings.stats["requests"] += 1
+        settings.stats["latency_total_s"] += delay
+        if fail:
+            settings.stats["errors"] += 1
+    return None if fail else delay
+
+
+def _token_count(text: str) -> int:
+    return len(text.split())
+
+
+# ----------------------------
+# Gemini: POST /v1beta/models/{model}:generateContent
+# ----------------------------
+@app.post("/v1beta/models/{model_action}")
+@app.post("/v1/models/{model_action}")
+async def gemini_generate_content(model_action: str, request: Request):
+    model, _, action = model_action.partition(":")
+    if action != "generateContent":
+        return JSONResponse(status_code=404, content={"error": {"code": 404, "message": f"Unsupported action: {action}", "status": "NOT_FOUND"}})
+
+    body = await request.json()
+    prompt = "\n".join(
+        part.get("text", "")
+        for content in body.get("contents", [])
+        for part in content.get("parts", [])
+    )
+    if await _simulate() is None:
+        return JSONResponse(status_code=settings.error_status, content={
+            "error": {"code": settings.error_status, "message": "Simulated provider error.", "status": "UNAVAILABLE"}
+        })
+
+    text = respond(prompt)
+    return {
+        "candidates": [{
+            "content": {"parts": [{"text": text}], "role": "model"},
+            "finishReason": "STOP",
+            "index": 0,
+        }],
+        "usageMetadata": {
+            "promptTokenCount": _token_count(prompt),
+            "candidatesTokenCount": _token_count(text),
+            "totalTokenCount": _token_count(prompt) + _token_count(text),
+        },
+        "modelVersion": model,
+    }
+
+
+# ----------------------------
+# OpenAI: POST /v1/chat/completions
+# ----------------------------
+@app.post("/v1/chat/completions")
+async def openai_chat_completions(request: Request):
+    body = await request.json()
+    prompt = "\n".join(str(m.get("content", "")) for m in body.get("messages", []))
+    if await _simulate() is None:
+        return JSONResponse(status_code=settings.error_status, content={
+            "error": {"message": "Simulated provider error.", "type": "server_error", "code": None}
+        })
+
+    text = respond(prompt)
+    return {
+        "id": f"chatcmpl-stub-{hashlib.sha1(prompt.encode('utf-8')).hexdigest()[:12]}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "gpt-4o"),
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": text},
+            "finish_reason": "stop",
+        }],
+        "usage": {
+            "prompt_tokens": _token_count(prompt),
+            "completion_tokens": _token_count(text),
+            "total_tokens": _token_count(prompt) + _token_count(text),
+        },
+    }
+
+
+@app.get("/health")
+def health():
+    return {"status": "ok"}
+
+
+@app.get("/stats")
+def stats():
+    with settings.lock:
+        return dict(settings.stats)
+
+
+def main():
+    global settings
+    parser = argparse.ArgumentParser(description="Run the local LLM stand-in server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency", default=os.getenv("LLM_STUB_LATENCY", "fixed:0"),
+                        help="fixed:<ms> | uniform:<min_ms>:<max_ms> | lognormal:<median_ms>:<sigma>")
+    parser.add_argument("--error-rate", type=float, default=float(os.getenv("LLM_STUB_ERROR_RATE", "0")))
+    parser.add_argument("--error-status", type=int, default=int(os.getenv("LLM_STUB_ERROR_STATUS", "503")))
+    parser.add_argument("--seed", type=int, default=int(os.getenv("LLM_STUB_SEED", "42")))
+    args = parser.parse_args()
+
+    settings = StubSettings(args.latency, args.error_rate, args.error_status, args.seed)
+
+    import uvicorn
+    uvicorn.run(app, host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
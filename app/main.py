@@ -1,6 +1,18 @@
-from fastapi import FastAPI
+import math
+import time
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+from starlette.routing import Match
+from app import config
 from app.api import router
+from app.core.telemetry import REQUEST_SECONDS, current_timings, end_request, start_request
+from app.core.structured_logging import begin_request_sampling, configure_logging, end_request_sampling
+from app.core.executors import Overloaded
+from app.core.llm_provider import ProviderUnavailable
+from app.core.request_recorder import RequestRecorderMiddleware
+
+configure_logging()
 
 app = FastAPI()
 
@@ -15,6 +27,56 @@ app.add_middleware(
 
 app.include_router(router)
 
+def _route_label(scope) -> str:
+    """Route template as the metrics label, so unknown paths cannot blow up label cardinality."""
+    for route in scope["app"].router.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route.path
+    return "unmatched"
+
+@app.middleware("http")
+async def stage_timings(request: Request, call_next):
+    endpoint = _route_label(request.scope)
+    token = start_request(endpoint)
+    sampling_token = begin_request_sampling()
+    timings = current_timings()
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+    finally:
+        # Streaming responses are timed until their headers are sent
+        REQUEST_SECONDS.observe(time.perf_counter() - start, endpoint=endpoint, method=request.method, status=str(status))
+        end_request_sampling(sampling_token)
+        end_request(token)
+    if config.STAGE_TIMINGS_HEADER and timings.stages:
+        response.headers["X-Stage-Timings"] = timings.header_value()
+    return response
+
+# Optional capture of PII-scrubbed payloads and timings for load-test replay (REQUEST_RECORDING_ENABLED)
+app.add_middleware(RequestRecorderMiddleware, route_label=_route_label)
+
+# Backpressure: fail fast with Retry-After instead of queueing without bound
+@app.exception_handler(Overloaded)
+async def overloaded_handler(request: Request, exc: Overloaded):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(math.ceil(exc.retry_after_s))}
+    )
+
+@app.exception_handler(ProviderUnavailable)
+async def provider_unavailable_handler(request: Request, exc: ProviderUnavailable):
+    # Rate/concurrency limits are ours to enforce (429); an open circuit means the provider is down (503)
+    status_code = 503 if exc.reason == "circuit open" else 429
+    return JSONResponse(
+        status_code=status_code,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(math.ceil(exc.retry_after_s))}
+    )
+
 @app.get("/health")
 def health():
     return {"status": "ok"}
\ No newline at end of file
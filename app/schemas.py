@@ -1,5 +1,6 @@
-from pydantic import BaseModel
-from typing import List, Optional
+from datetime import date
+from pydantic import BaseModel, Field
+from typing import Any, Dict, List, Literal, Optional
 
 class QueryRequest(BaseModel):
     session_id: str
@@ -23,9 +24,26 @@ class ServiceDiagnosisInput(BaseModel):
     diagnoses: List[str]
     service_codes: List[str]
 
+class ServiceDiagnosisPair(BaseModel):
+    service_code: str
+    diagnosis: str
+
+class ServiceDiagnosisBatchInput(BaseModel):
+    pairs: List[ServiceDiagnosisPair]
+    use_embeddings: bool = True
+
 class ComboInput(BaseModel):
     soap: str
     service_codes: List[str]
+    explain: bool = False
+
+class ClaimEstimateInput(BaseModel):
+    service_codes: List[str]
+    service_date: Optional[date] = None           # ISO date, defaults to today; invalid dates get 422
+    rejection_probability: Optional[float] = None
+
+class ReimbursementEstimateRequest(BaseModel):
+    claims: List[ClaimEstimateInput]
 
 class DiagnosisSearchRequest(BaseModel):
     query: str
@@ -34,6 +52,13 @@ class DiagnosisSearchRequest(BaseModel):
 class PiiTextInput(BaseModel):
     text: str
 
+class PiiBatchInput(BaseModel):
+    texts: List[str]
+    batch_size: Optional[int] = Field(None, ge=1, le=1024)
+    workers: Optional[int] = Field(None, ge=1, le=64)  # capped at PII_BATCH_WORKERS, the shared pool size
+    return_entities: bool = False
+    tier: Optional[Literal["fast", "standard"]] = None
+
 class ClaimRejectionRequest(BaseModel):
     claim_id: str
     soap: str
@@ -49,4 +74,51 @@ class ClaimPredictionResponse(BaseModel):
     risk_level: str
     suggestions: List[str]
     reasoning: str
-    estimated_reimbursement: float
\ No newline at end of file
+    estimated_reimbursement: float
+
+class ExtractDiagnosesJobInput(BaseModel):
+    soap: str
+    top_k: int = Field(5, ge=1, le=10)
+    min_similarity: float = Field(0.6, ge=0.0, le=1.0)
+    final_top_n: int = Field(1, ge=1, le=10)
+    mode: Literal["llm", "fast"] = "llm"
+
+class JobSubmitRequest(BaseModel):
+    kind: Literal["extract_diagnoses", "check_note_v3"]
+    payload: Dict[str, Any]             # ExtractDiagnosesJobInput or CheckNoteRequest, by kind
+    priority: Literal["interactive", "bulk"] = "interactive"
+
+class JobSubmitResponse(BaseModel):
+    job_id: str
+    kind: str
+    priority: str
+    status: str
+
+class JobStatusResponse(BaseModel):
+    job_id: str
+    kind: str
+    priority: str
+    status: str                         # 'queued' / 'running' / 'succeeded' / 'failed'
+    partial: List[Dict[str, Any]]       # intermediate events, in order
+    result: Optional[Any] = None
+    error: Optional[str] = None
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    expires_at: Optional[float] = None
+
+class ClaimAnalysisRequest(BaseModel):
+    soap: str
+    service_codes: List[str]
+    top_k: int = Field(5, ge=1, le=10)  # service-code suggestions
+    mode: Literal["llm", "fast"] = "llm"  # diagnosis concept grouping
+
+class ClaimAnalysisResponse(BaseModel):
+    anonymized_soap: str
+    service_codes: Optional[Dict[str, Any]] = None      # as /ai/suggest-service-codes, minus session_id
+    diagnoses: Optional[Dict[str, Any]] = None          # as /ai/extract-diagnoses
+    rules: Optional[Dict[str, Any]] = None              # as /ai/v2/check-note-requirements
+    prediction: Optional[Dict[str, Any]] = None         # as /ai/predict-claim-outcome
+    errors: Dict[str, str]                              # failed or skipped branches
+    timings: Dict[str, Dict[str, Any]]                  # per DAG node: start_ms, duration_ms, status
+    total_ms: float
@@ -1,11 +1,16 @@
 # app/schemas/validate_note_requirements.py
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import List, Optional, Dict
 
 class CheckNoteRequest(BaseModel):
     soap: str
     service_codes: List[str]
 
+class MatchedTerm(BaseModel):
+    term: str
+    start: int                          # character offsets in the submitted SOAP
+    end: int
+
 class PerCodeResult(BaseModel):
     service_code: str
     compliance: str                     # 'pass', 'warn', 'fail', or 'unknown'
@@ -14,8 +19,19 @@ class PerCodeResult(BaseModel):
     gemini_used: bool
     gemini_reasoning: Optional[str] = None
     rule_version: Optional[str] = None
+    matched_terms: Optional[List[MatchedTerm]] = None
 
 
 class CheckNoteResponse(BaseModel):
     overall: str                         # 'pass' / 'partial' / 'fail' / 'unknown'
     results: List[PerCodeResult]
+
+
+class NoteCheckBatchClaim(BaseModel):
+    claim_id: Optional[str] = None
+    soap: str
+    service_codes: List[str]
+
+class NoteCheckBatchRequest(BaseModel):
+    claims: List[NoteCheckBatchClaim]
+    llm_workers: Optional[int] = Field(None, ge=1, le=64)  # default NOTE_CHECK_LLM_WORKERS; same bounds as the query parameter
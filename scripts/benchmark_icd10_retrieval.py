@@ -0,0 +1,193 @@
+import os
+import csv
+import json
+import time
+import argparse
+import numpy as np
+from app import config
+from app.core.pii_pipeline import anonymize_soap
+from app.core.diagnosis_search import search_concept
+from app.core.llm_provider import gemini_generate
+from app.core.validation_gemini import (
+    GROUPING_PROMPT_TEMPLATE, _build_rerank_prompt, _extract_first_json_array, _parse_rerank_response,
+    group_clinical_concepts_locally, model,
+)
+from app.utils.json_utils import clean_model_text
+from app.core.tiers import TIERS, estimate_extract_cost
+
+# --------- Config ---------
+DATA_FILE = "docs/benchmark/icd10_diagnosis_retrieval/soap_eval_data.csv"
+K = 5
+# --------------------------
+
+def group_with_gemini(soap):
+    """Gemini grouping without the endpoint's silent local fallback: raises when Gemini fails or answers nothing usable."""
+    response = gemini_generate(model, GROUPING_PROMPT_TEMPLATE.format(soap=soap))
+    concepts = _extract_first_json_array(clean_model_text(response.text))
+    if not concepts:
+        raise ValueError("Gemini grouping returned no concepts")
+    return concepts
+
+def rerank_with_gemini(concept, matches):
+    """Gemini rerank of one concept; raises instead of falling back to the cross-encoder order."""
+    return _parse_rerank_response(concept, matches, gemini_generate(model, _build_rerank_prompt(concept, matches)), K)
+
+GROUPERS = {
+    "gemini": group_with_gemini,
+    "fast": group_clinical_concepts_locally,
+}
+
+class Fallbacks:
+    """LLM steps that failed and were replaced by the local path, so rows labelled Gemini/accurate say how much was local."""
+
+    def __init__(self):
+        self.grouping = 0
+        self.rerank = 0
+
+    def as_dict(self):
+        return {"grouping": self.grouping, "rerank": self.rerank}
+
+def load_eval_data(path):
+    """
+    Rows of the ICD-10 retrieval benchmark CSV:
+    patient_id,soap,expected_codes,lang  (expected_codes separated by ';' or '|')
+    """
+    with open(path, newline="", encoding="utf-8") as f:
+        rows = []
+        for row in csv.DictReader(f):
+            codes = row["expected_codes"].replace("|", ";").split(";")
+            row["expected_codes"] = [c.strip().replace(".", "").upper() for c in codes if c.strip()]
+            rows.append(row)
+    return rows
+
+def rank_codes(concepts, initial_k, cross_encoder=True):
+    """Merge per-concept cross-encoder (or FAISS) results into one ranking (best score per code)."""
+    best = {}
+    for concept in concepts:
+        block = search_concept(concept, top_k=initial_k, return_raw=True, initial_k=initial_k, cross_encoder=cross_encoder)
+        for match in block["matches"]:
+            code = match.get("code")
+            if code and match["similarity"] is not None:
+                best[code] = max(best.get(code, 0.0), match["similarity"])
+    return [code for code, _ in sorted(best.items(), key=lambda x: x[1], reverse=True)]
+
+def rank_codes_llm(concepts, initial_k, fallbacks):
+    """Accurate tier: Gemini rerank of each concept's top K, merged by best rank; cross-encoder order fills up."""
+    best_rank = {}
+    for concept in concepts:
+        block = search_concept(concept, top_k=K, return_raw=True, initial_k=initial_k)
+        try:
+            reranked = rerank_with_gemini(concept, block["matches"])
+        except Exception:
+            fallbacks.rerank += 1
+            reranked = block["matches"][:K]
+        for rank, match in enumerate(reranked):
+            code = match.get("code")
+            if code:
+                best_rank[code] = min(best_rank.get(code, rank), rank)
+    ranked = [code for code, _ in sorted(best_rank.items(), key=lambda x: x[1])]
+    return ranked + [c for c in rank_codes(concepts, initial_k) if c not in best_rank]
+
+def evaluate(rows, grouping, initial_k, tier=None):
+    """One grouping mode with the cross-encoder pipeline, or, with `tier`, that latency tier's pipeline."""
+    profile = TIERS[tier] if tier else None
+    if profile:
+        grouping, initial_k = ("gemini" if profile.llm else "fast"), profile.initial_k
+    group_fn = GROUPERS[grouping]
+    fallbacks = Fallbacks()
+    per_lang = {}
+    grouping_ms, total_ms, costs = [], [], []
+
+    for row in rows:
+        soap = anonymize_soap(row["soap"])
+        start = time.perf_counter()
+        try:
+            concepts = group_fn(soap)
+        except Exception:
+            fallbacks.grouping += 1
+            concepts = group_clinical_concepts_locally(soap)
+        grouped_at = time.perf_counter()
+        if profile and profile.llm:
+            ranking = rank_codes_llm(concepts, initial_k, fallbacks)
+        else:
+            ranking = rank_codes(concepts, initial_k, cross_encoder=profile.cross_encoder if profile else True)
+        ranked = [c.replace(".", "").upper() for c in ranking[:K]]
+        end = time.perf_counter()
+        if profile:
+            costs.append(estimate_extract_cost(profile, soap, concepts, K, K)["usd"])
+
+        grouping_ms.append((grouped_at - start) * 1000)
+        total_ms.append((end - start) * 1000)
+
+        hit_rank = next((i + 1 for i, c in enumerate(ranked) if c in row["expected_codes"]), None)
+        stats = per_lang.setdefault(row.get("lang", "ALL"), {"n": 0, "hits": 0, "rr": 0.0})
+        stats["n"] += 1
+        if hit_rank:
+            stats["hits"] += 1
+            stats["rr"] += 1.0 / hit_rank
+
+    n = sum(s["n"] for s in per_lang.values())
+    return {
+        "tier": tier,
+        "grouping": grouping,
+        "estimated_usd_per_note": float(np.mean(costs)) if costs else None,
+        "llm_fallbacks": fallbacks.as_dict(),
+        "n": n,
+        f"recall@{K}": sum(s["hits"] for s in per_lang.values()) / n if n else 0.0,
+        f"mrr@{K}": sum(s["rr"] for s in per_lang.values()) / n if n else 0.0,
+        "per_lang": {
+            lang: {f"recall@{K}": s["hits"] / s["n"], f"mrr@{K}": s["rr"] / s["n"], "n": s["n"]}
+            for lang, s in per_lang.items()
+        },
+        "grouping_latency_ms": {"p50": float(np.percentile(grouping_ms, 50)), "p95": float(np.percentile(grouping_ms, 95))},
+        "total_latency_ms": {"p50": float(np.percentile(total_ms, 50)), "p95": float(np.percentile(total_ms, 95))},
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="ICD-10 retrieval benchmark: Recall@5 / MRR@5 and latency per grouping mode")
+    parser.add_argument("--data", default=DATA_FILE, help="CSV with patient_id,soap,expected_codes,lang")
+    parser.add_argument("--grouping", nargs="+", choices=list(GROUPERS), default=list(GROUPERS))
+    parser.add_argument("--initial-k", type=int, default=50, help="FAISS candidates per concept before the cross-encoder")
+    parser.add_argument("--tier", nargs="+", choices=list(TIERS), help="Evaluate latency tiers instead of grouping modes")
+    parser.add_argument("--output", help="Optional JSON file for the results")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.data):
+        print(f"Evaluation data not found at {args.data}")
+        return
+
+    rows = load_eval_data(args.data)
+    print(f"Loaded {len(rows)} SOAP notes")
+
+    runs = [(None, None, tier) for tier in args.tier] if args.tier else [(g, args.initial_k, None) for g in args.grouping]
+    results = []
+    for grouping, initial_k, tier in runs:
+        needs_llm = TIERS[tier].llm if tier else grouping == "gemini"
+        if needs_llm and not config.GEMINI_API_KEY:
+            print(f"Skipping {tier or grouping}: GEMINI_API_KEY is not set, so every LLM step would fall back to local")
+            continue
+        results.append(evaluate(rows, grouping, initial_k, tier=tier))
+
+    label = "Tier" if args.tier else "Grouping"
+    print(f"\n| {label} | R@{K} | MRR@{K} | Grouping p50 (ms) | Grouping p95 (ms) | Total p50 (ms) | Total p95 (ms) |" + (" Est. USD/note |" if args.tier else ""))
+    print("|----------|------|-------|-------------------|-------------------|----------------|----------------|" + ("---------------|" if args.tier else ""))
+    for r in results:
+        print(
+            f"| {r['tier'] or r['grouping']} | {r[f'recall@{K}']:.3f} | {r[f'mrr@{K}']:.3f} "
+            f"| {r['grouping_latency_ms']['p50']:.0f} | {r['grouping_latency_ms']['p95']:.0f} "
+            f"| {r['total_latency_ms']['p50']:.0f} | {r['total_latency_ms']['p95']:.0f} |"
+            + (f" {r['estimated_usd_per_note']:.6f} |" if args.tier else "")
+        )
+    for r in results:
+        fallbacks = r["llm_fallbacks"]
+        if fallbacks["grouping"] or fallbacks["rerank"]:
+            print(f"Warning: {r['tier'] or r['grouping']} fell back to local for {fallbacks['grouping']}/{r['n']} groupings "
+                  f"and {fallbacks['rerank']} concept reranks; its scores partly measure the local path")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results saved to {args.output}")
+
+if __name__ == "__main__":
+    main()
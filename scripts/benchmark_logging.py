@@ -0,0 +1,116 @@
+import os
+import json
+import time
+import random
+import sqlite3
+import logging
+import argparse
+import contextlib
+from app.core import structured_logging
+from app.core.structured_logging import get_logger, lazy, begin_request_sampling, end_request_sampling
+
+# --------- Config ---------
+DIAGNOSIS_DB = "data/diagnosis_codes.db"
+CANDIDATES_PER_CONCEPT = 50
+TOP_K = 5
+# --------------------------
+
+def load_rows(path):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute("SELECT id, description FROM diagnosis_codes ORDER BY id").fetchall()
+    finally:
+        conn.close()
+
+def synthesize_request(rows, concepts, rng):
+    """What search_concept handles for one request: per concept 50 FAISS candidates and their reranked dicts."""
+    request = []
+    for i in range(concepts):
+        sample = rng.sample(rows, CANDIDATES_PER_CONCEPT)
+        candidates = [(code, desc, rng.random()) for code, desc in sample]
+        reranked = sorted(
+            [
+                {
+                    "code": code,
+                    "description": desc,
+                    "reason": f"Cross-encoder re-ranked match. Original FAISS similarity: {sim:.2f}, cross-encoder score: {sim:.2f}.",
+                    "similarity": sim,
+                }
+                for code, desc, sim in candidates
+            ],
+            key=lambda m: m["similarity"],
+            reverse=True,
+        )
+        request.append((f"Pasient med feber og hoste i {i + 2} dager, tlf 912 34 567.", candidates, reranked))
+    return request
+
+def log_before(request):
+    """The print statements search_concept / search_diagnosis_with_explanation used to run."""
+    results = []
+    for concept, candidates, reranked in request:
+        print(f"[DEBUG] Searching concept: '{concept}'")
+        print("---------------------------------------------------")
+        print(f"Initial FAISS search results for '{concept}':")
+        print(f"Candidates: {json.dumps(candidates, indent=2, ensure_ascii=False, default=str)}")
+        print(f"Renranked: {json.dumps(reranked, indent=2, ensure_ascii=False, default=str)}")
+        results.append({"concept": concept, "matches": reranked[:TOP_K]})
+    print(f"[DEBUG] Finished searching {len(request)} concepts.")
+    print(f"Results from Encoders: {results}")
+
+def log_after(request, log):
+    """The structured calls that replaced them."""
+    for concept, candidates, reranked in request:
+        log.debug("faiss_candidates", concept=concept, count=len(candidates),
+                  top=lazy(lambda: [(code, round(float(sim), 3)) for code, _, sim in candidates[:TOP_K]]))
+        log.debug("cross_encoder_reranked", concept=concept,
+                  top=lazy(lambda: [(m["code"], round(m["similarity"], 3)) for m in reranked[:TOP_K]]))
+    log.debug("concepts_searched", count=len(request))
+
+def measure(fn, requests, sample_rate=None):
+    """CPU seconds per request (process time, so sleeping/IO waits are excluded)."""
+    start = time.process_time()
+    for request in requests:
+        token = begin_request_sampling(sample_rate) if sample_rate is not None else None
+        fn(request)
+        if token is not None:
+            end_request_sampling(token)
+    return (time.process_time() - start) / len(requests)
+
+def main():
+    parser = argparse.ArgumentParser(description="CPU cost per request of the old debug prints vs. structured logging")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concepts", type=int, default=3, help="Concepts per request (one search_concept call each)")
+    parser.add_argument("--sample-rate", type=float, default=0.01)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    rows = load_rows(DIAGNOSIS_DB)
+    requests = [synthesize_request(rows, args.concepts, rng) for _ in range(args.requests)]
+
+    handler = logging.StreamHandler(open(os.devnull, "w", encoding="utf-8"))
+    bench_logger = logging.getLogger("benchmark.structured")
+    bench_logger.addHandler(handler)
+    bench_logger.propagate = False
+    log = get_logger("benchmark.structured")
+
+    report = {"requests": args.requests, "concepts_per_request": args.concepts}
+    with open(os.devnull, "w", encoding="utf-8") as devnull, contextlib.redirect_stdout(devnull):
+        report["print_ms"] = measure(log_before, requests) * 1000
+
+    after = lambda request: log_after(request, log)
+    bench_logger.setLevel(logging.INFO)
+    report["structured_info_level_ms"] = measure(after, requests) * 1000
+    bench_logger.setLevel(logging.DEBUG)
+    report[f"structured_debug_sampled_{args.sample_rate:g}_ms"] = measure(after, requests, args.sample_rate) * 1000
+    report["structured_debug_all_ms"] = measure(after, requests, 1.0) * 1000
+    report["redaction"] = structured_logging.config.LOG_REDACT
+
+    for key in list(report):
+        if key.endswith("_ms"):
+            report[key] = round(report[key], 4)
+    report["cpu_saved_per_request_ms"] = round(report["print_ms"] - report["structured_info_level_ms"], 4)
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+import re
+import json
+import time
+import random
+import argparse
+from app.core.validate_note_requirements.engine import validate_soap_against_codes, iter_validate_batch
+
+# --------- Config ---------
+INPUTS_FILE = "data/inputs.md"
+SECTION = "# AI Check Note Requirements"
+# --------------------------
+
+def load_scenes(path):
+    """The PASS / WARN / FAIL example requests from the note-requirements section of data/inputs.md."""
+    with open(path, encoding="utf-8") as f:
+        text = f.read()
+    section = text[text.index(SECTION):]
+    section = section[:section.index("\n# ", len(SECTION))]
+    return [json.loads(block) for block in re.findall(r"```json\s*(\{.*?\})\s*`", section, re.DOTALL)]
+
+def synthesize_claims(scenes, n, duplicate_ratio, seed):
+    """
+    `n` claims built from the scenes. A `duplicate_ratio` share reuse an
+    earlier note verbatim (as in a nightly run, where one note is often billed
+    on several claims); the rest get a unique suffix so they match nothing cached.
+    """
+    rng = random.Random(seed)
+    claims = []
+    for i in range(n):
+        if claims and rng.random() < duplicate_ratio:
+            soap = rng.choice(claims)["soap"]
+        else:
+            soap = f"{rng.choice(scenes)['soap']} Ref {i}."
+        codes = rng.sample(scenes[0]["service_codes"], rng.randint(1, len(scenes[0]["service_codes"])))
+        claims.append({"claim_id": f"c{i}", "soap": soap, "service_codes": codes})
+    return claims
+
+def run_serial(claims):
+    start = time.perf_counter()
+    for claim in claims:
+        validate_soap_against_codes(claim["soap"], claim["service_codes"])
+    return time.perf_counter() - start
+
+def run_batch(claims, llm_workers):
+    start = time.perf_counter()
+    first = None
+    summary = None
+    for line in iter_validate_batch(claims, llm_workers=llm_workers):
+        if first is None:
+            first = time.perf_counter() - start
+        if "summary" in line:
+            summary = line["summary"]
+    return time.perf_counter() - start, first, summary
+
+def main():
+    parser = argparse.ArgumentParser(description="Throughput of batch vs per-claim note-requirement checks")
+    parser.add_argument("--claims", type=int, default=2000)
+    parser.add_argument("--duplicate-ratio", type=float, default=0.3)
+    parser.add_argument("--llm-workers", type=int, default=None)
+    parser.add_argument("--skip-serial", action="store_true", help="Only run the batch path (serial is slow with a real LLM)")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    claims = synthesize_claims(load_scenes(INPUTS_FILE), args.claims, args.duplicate_ratio, args.seed)
+    report = {"claims": len(claims), "duplicate_ratio": args.duplicate_ratio}
+
+    if not args.skip_serial:
+        serial_s = run_serial(claims)
+        report["serial"] = {"elapsed_s": round(serial_s, 3), "claims_per_s": round(len(claims) / serial_s, 1)}
+
+    batch_s, first_s, summary = run_batch(claims, args.llm_workers)
+    report["batch"] = {
+        "elapsed_s": round(batch_s, 3),
+        "claims_per_s": round(len(claims) / batch_s, 1),
+        "first_result_ms": round(first_s * 1000, 1),
+        "unique_notes": summary["unique_notes"],
+        "llm_calls": summary["llm_calls"],
+        "llm_deduplicated": summary["llm_deduplicated"],
+    }
+    if "serial" in report:
+        report["speedup"] = round(serial_s / batch_s, 2)
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from app.core import service_search
+from app.core.diagnosis_search import search_diagnosis_with_explanation
+from app.core.predict_helpers import get_similar_failures
+from app.core.claim_learning_engine import FAISS_INDEX
+from app.core.pii_pipeline import anonymize_soap
+from app.core.telemetry import current_timings, end_request, stage, start_request
+from app.core.validation_gemini import GROUPING_PROMPT_TEMPLATE
+from app.llm_stub.responders import respond
+from app.llm_stub.server import LatencyModel
+from scripts.sample_notes import INPUT_FILES, load_notes
+
+# --------- Config ---------
+TARGETS = ("service_search", "diagnosis_search", "similar_failures")
+PERCENTILES = (50, 95, 99)
+# --------------------------
+
+def prepare_notes(notes):
+    """Inputs each target gets, computed once outside the timings: anonymized note and grouped concepts."""
+    for note in notes:
+        note["anon_soap"] = anonymize_soap(note["soap"])
+        note["concepts"] = json.loads(respond(GROUPING_PROMPT_TEMPLATE.format(soap=note["anon_soap"]))) or [note["anon_soap"]]
+    return notes
+
+def stub_llm(latency_spec, seed):
+    """Answer the query rewrite in-process with the LLM stand-in's responders, sleeping for the sampled latency."""
+    latency = LatencyModel(latency_spec, random.Random(seed))
+
+    def call_stub(prompt, timeout_s=6):
+        with stage("llm_rewrite"):
+            time.sleep(latency.sample_s())
+            return respond(prompt).strip()
+
+    service_search._call_gemini = call_stub
+
+def run_target(target):
+    if target == "service_search":
+        return lambda note: service_search.search_codes(note["soap"])
+    if target == "diagnosis_search":
+        return lambda note: search_diagnosis_with_explanation(note["concepts"], top_k=5)
+    return lambda note: get_similar_failures(note["anon_soap"], note["service_codes"])
+
+def timed_call(fn, target, note):
+    """(total seconds, {stage: seconds}, error) for one request, with the request's stage timings."""
+    token = start_request(f"bench:{target}")
+    start = time.perf_counter()
+    error = None
+    try:
+        fn(note)
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    total = time.perf_counter() - start
+    stages = dict(current_timings().stages)
+    end_request(token)
+    return total, stages, error
+
+def percentiles_ms(samples):
+    if not samples:
+        return None
+    values = np.percentile(np.array(samples) * 1000, PERCENTILES)
+    return {f"p{p}": round(float(v), 2) for p, v in zip(PERCENTILES, values)}
+
+def measure(target, notes, requests, concurrency):
+    fn = run_target(target)
+    workload = [notes[i % len(notes)] for i in range(requests)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        outcomes = list(pool.map(lambda note: timed_call(fn, target, note), workload))
+    elapsed = time.perf_counter() - start
+
+    stage_samples = {}
+    for _, stages, _ in outcomes:
+        for name, seconds in stages.items():
+            stage_samples.setdefault(name, []).append(seconds)
+    errors = [e for _, _, e in outcomes if e]
+    return {
+        "requests": requests,
+        "qps": round(requests / elapsed, 2),
+        "latency_ms": percentiles_ms([total for total, _, _ in outcomes]),
+        "stages_ms": {name: percentiles_ms(samples) for name, samples in sorted(stage_samples.items())},
+        "errors": len(errors),
+        "first_error": errors[0] if errors else None,
+    }
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far (None where it cannot be read)."""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)  # bytes on macOS, KiB on Linux
+    except ImportError:
+        pass
+    try:
+        import psutil
+        info = psutil.Process().memory_info()
+        return round(getattr(info, "peak_wset", info.rss) / (1024 * 1024), 1)
+    except ImportError:
+        return None
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True, stderr=subprocess.DEVNULL).strip()
+    except Exception:
+        return None
+
+def compare(baseline, current, threshold):
+    """Rows of (target, concurrency, metric, old, new, change %, regressed) and whether any regressed by > threshold."""
+    rows, regressed = [], False
+    for target, levels in current["results"].items():
+        for level, result in levels.items():
+            old = baseline.get("results", {}).get(target, {}).get(level)
+            if not old or not old.get("latency_ms") or not result.get("latency_ms"):
+                continue
+            for metric, old_value, new_value, higher_is_better in (
+                ("qps", old["qps"], result["qps"], True),
+                ("p50_ms", old["latency_ms"]["p50"], result["latency_ms"]["p50"], False),
+                ("p95_ms", old["latency_ms"]["p95"], result["latency_ms"]["p95"], False),
+                ("p99_ms", old["latency_ms"]["p99"], result["latency_ms"]["p99"], False),
+            ):
+                change = (new_value - old_value) / old_value * 100 if old_value else 0.0
+                worse = change < -threshold if higher_is_better else change > threshold
+                regressed |= worse
+                rows.append((target, level, metric, old_value, new_value, change, worse))
+    old_rss, new_rss = baseline.get("peak_rss_mb"), current.get("peak_rss_mb")
+    if old_rss and new_rss:
+        change = (new_rss - old_rss) / old_rss * 100
+        worse = change > threshold
+        regressed |= worse
+        rows.append(("process", "-", "peak_rss_mb", old_rss, new_rss, change, worse))
+    return rows, regressed
+
+def print_comparison(rows, baseline_commit, current_commit):
+    print(f"\nComparison {baseline_commit or 'baseline'} → {current_commit or 'current'}")
+    print("| Target | Concurrency | Metric | Baseline | Current | Change |")
+    print("|--------|-------------|--------|----------|---------|--------|")
+    for target, level, metric, old, new, change, worse in rows:
+        print(f"| {target} | {level} | {metric} | {old} | {new} | {change:+.1f}%{' ⚠' if worse else ''} |")
+
+def print_report(report):
+    print("\n| Target | Concurrency | QPS | p50 (ms) | p95 (ms) | p99 (ms) | Errors |")
+    print("|--------|-------------|-----|----------|----------|----------|--------|")
+    for target, levels in report["results"].items():
+        for level, r in levels.items():
+            lat = r["latency_ms"] or {"p50": 0, "p95": 0, "p99": 0}
+            print(f"| {target} | {level} | {r['qps']} | {lat['p50']} | {lat['p95']} | {lat['p99']} | {r['errors']} |")
+    for target, levels in report["results"].items():
+        level, first = next(iter(levels.items()))
+        print(f"\nPer-stage latency of {target} at concurrency {level} (ms, p50 / p95 / p99):")
+        for name, p in first["stages_ms"].items():
+            print(f"  {name:14s} {p['p50']:>8} / {p['p95']:>8} / {p['p99']:>8}")
+    print(f"\nPeak RSS: {report['peak_rss_mb']} MB")
+
+def main():
+    parser = argparse.ArgumentParser(description="Latency (per stage), throughput and memory of the retrieval modules, LLM stubbed in-process")
+    parser.add_argument("--targets", nargs="+", choices=TARGETS, default=list(TARGETS))
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 2, 4, 8])
+    parser.add_argument("--requests", type=int, default=200, help="Requests per target and concurrency level")
+    parser.add_argument("--llm-latency", default="fixed:0", help="Stubbed rewrite latency: fixed:<ms>, uniform:<min>:<max>, lognormal:<median>:<sigma>")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="Write the report as JSON")
+    parser.add_argument("--baseline", help="JSON report of an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=10.0, help="Percent change counted as a regression")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="Only compare two existing reports")
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare[0], encoding="utf-8") as f:
+            baseline = json.load(f)
+        with open(args.compare[1], encoding="utf-8") as f:
+            current = json.load(f)
+        rows, regressed = compare(baseline, current, args.threshold)
+        print_comparison(rows, baseline["meta"].get("commit"), current["meta"].get("commit"))
+        sys.exit(1 if regressed else 0)
+
+    stub_llm(args.llm_latency, args.seed)
+    notes = prepare_notes(load_notes(INPUT_FILES))
+    print(f"Loaded {len(notes)} SOAP notes; learning index holds {FAISS_INDEX.ntotal} failures")
+    if "similar_failures" in args.targets and FAISS_INDEX.ntotal == 0:
+        print("Warning: the learning index is empty, so similar_failures returns before encoding")
+
+    rss_after_load = peak_rss_mb()
+    results = {}
+    for target in args.targets:
+        fn = run_target(target)
+        for note in notes:  # warm-up: lazy model init, allocator, caches
+            fn(note)
+        results[target] = {}
+        for level in args.concurrency:
+            results[target][str(level)] = measure(target, notes, args.requests, level)
+            print(f"{target} c={level}: {results[target][str(level)]['qps']} req/s")
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "notes": len(notes),
+            "requests_per_level": args.requests,
+            "llm_latency": args.llm_latency,
+            "rewrite_cache": service_search.REWRITE_CACHE is not None,
+            "learning_index_size": int(FAISS_INDEX.ntotal),
+        },
+        "results": results,
+        "peak_rss_after_load_mb": rss_after_load,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+    print_report(report)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results saved to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        rows, regressed = compare(baseline, report, args.threshold)
+        print_comparison(rows, baseline["meta"].get("commit"), report["meta"]["commit"])
+        sys.exit(1 if regressed else 0)
+
+if __name__ == "__main__":
+    main()
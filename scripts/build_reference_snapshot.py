@@ -0,0 +1,25 @@
+import time
+import argparse
+from app import config
+from app.core.reference_snapshot import build_snapshot, load_snapshot
+
+def main():
+    parser = argparse.ArgumentParser(description="Compile codes, ICD-10, tariff, combination and note rules into one binary snapshot")
+    parser.add_argument("--output", default=config.REFERENCE_SNAPSHOT_PATH, help="Snapshot file to write")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    info = build_snapshot(args.output)
+    print(f"Built {info['path']} ({info['bytes']} bytes, {info['arrays']} arrays) in {(time.perf_counter() - start) * 1000:.0f} ms")
+    print(f"Version: {info['version']}")
+    for path, digest in info["sources"].items():
+        print(f"  {path}: {digest[:12]}")
+
+    start = time.perf_counter()
+    if load_snapshot(args.output) is None:
+        print("[ERROR] Snapshot failed verification after writing.")
+        return
+    print(f"Verified load in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+if __name__ == "__main__":
+    main()
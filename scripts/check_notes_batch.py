@@ -0,0 +1,73 @@
+import sys
+import json
+import argparse
+
+# --------- Config ---------
+ENDPOINT = "/ai/v2/check-note-requirements/batch"
+# --------------------------
+
+def read_claims(stream):
+    """JSONL ({"claim_id"?, "soap", "service_codes"} per line) or one JSON list / {"claims": [...]} document."""
+    text = stream.read()
+    stripped = text.lstrip()
+    if stripped.startswith("["):
+        return json.loads(stripped)
+    if stripped.startswith("{") and '"claims"' in stripped[:200]:
+        try:
+            return json.loads(stripped)["claims"]
+        except json.JSONDecodeError:
+            pass  # JSONL whose first claim happens to mention "claims"
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+def run_local(claims, llm_workers):
+    from app.core.validate_note_requirements.engine import iter_validate_batch
+    yield from iter_validate_batch(claims, llm_workers=llm_workers)
+
+def run_remote(claims, url, llm_workers):
+    import requests
+    params = {"llm_workers": llm_workers} if llm_workers else None
+    body = "".join(json.dumps(c, ensure_ascii=False) + "\n" for c in claims).encode("utf-8")
+    with requests.post(url.rstrip("/") + ENDPOINT, data=body, params=params, stream=True,
+                       headers={"Content-Type": "application/x-ndjson"}) as resp:
+        resp.raise_for_status()
+        for line in resp.iter_lines():
+            if line:
+                yield json.loads(line)
+
+def main():
+    parser = argparse.ArgumentParser(description="Check note requirements for many claims; writes one NDJSON line per claim")
+    parser.add_argument("input", nargs="?", default="-", help="JSONL/JSON claims file (default: stdin)")
+    parser.add_argument("--output", "-o", default="-", help="NDJSON output file (default: stdout)")
+    parser.add_argument("--url", help="Send to a running API (e.g. http://127.0.0.1:8000) instead of checking in-process")
+    parser.add_argument("--llm-workers", type=int, default=None, help="Concurrent Gemini reviews (default NOTE_CHECK_LLM_WORKERS)")
+    parser.add_argument("--ordered", action="store_true", help="Write results in input order instead of completion order")
+    args = parser.parse_args()
+
+    if args.input == "-":
+        claims = read_claims(sys.stdin)
+    else:
+        with open(args.input, encoding="utf-8") as f:
+            claims = read_claims(f)
+
+    lines = run_remote(claims, args.url, args.llm_workers) if args.url else run_local(claims, args.llm_workers)
+    out = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    try:
+        buffered, summary = [], None
+        for line in lines:
+            if "summary" in line:
+                summary = line
+            elif args.ordered:
+                buffered.append(line)
+            else:
+                out.write(json.dumps(line, ensure_ascii=False) + "\n")
+        for line in sorted(buffered, key=lambda l: l["index"]):
+            out.write(json.dumps(line, ensure_ascii=False) + "\n")
+        if summary:
+            out.write(json.dumps(summary, ensure_ascii=False) + "\n")
+            print(json.dumps(summary["summary"]), file=sys.stderr)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+if __name__ == "__main__":
+    main()
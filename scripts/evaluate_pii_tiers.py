@@ -0,0 +1,106 @@
+import json
+import time
+import argparse
+import numpy as np
+from app.core.pii_analyzer import analyze_text, resolve_tier, PII_TIERS
+
+# --------- Config ---------
+FIXTURE_FILE = "data/pii_fixtures.jsonl"
+# --------------------------
+
+def load_fixtures(path):
+    """One JSON object per line: {"id", "text", "entities": [{"entity_type", "start", "end", "text"}]}"""
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def _overlaps(a, b):
+    return a["start"] < b["end"] and b["start"] < a["end"]
+
+def evaluate(fixtures, tier):
+    """
+    Span-overlap precision/recall, type-agnostic: for anonymization what matters
+    is whether the characters were masked, not which label they got.
+    """
+    tp_pred = fp = tp_gold = fn = 0
+    per_type = {}
+    latencies_ms = []
+    escalated = 0
+
+    for fx in fixtures:
+        start = time.perf_counter()
+        predicted = [
+            {"entity_type": e.entity_type, "start": e.start, "end": e.end}
+            for e in analyze_text(fx["text"], tier=tier)
+        ]
+        latencies_ms.append((time.perf_counter() - start) * 1000)
+        if tier == "auto" and resolve_tier(fx["text"], tier) == "standard":
+            escalated += 1
+
+        for p in predicted:
+            if any(_overlaps(p, g) for g in fx["entities"]):
+                tp_pred += 1
+            else:
+                fp += 1
+        for g in fx["entities"]:
+            stats = per_type.setdefault(g["entity_type"], {"n": 0, "found": 0})
+            stats["n"] += 1
+            if any(_overlaps(p, g) for p in predicted):
+                tp_gold += 1
+                stats["found"] += 1
+            else:
+                fn += 1
+
+    precision = tp_pred / (tp_pred + fp) if tp_pred + fp else 0.0
+    recall = tp_gold / (tp_gold + fn) if tp_gold + fn else 0.0
+    result = {
+        "tier": tier,
+        "n": len(fixtures),
+        "precision": precision,
+        "recall": recall,
+        "f1": 2 * precision * recall / (precision + recall) if precision + recall else 0.0,
+        "false_positives": fp,
+        "missed": fn,
+        "recall_per_type": {t: s["found"] / s["n"] for t, s in sorted(per_type.items())},
+        "latency_ms": {"p50": float(np.percentile(latencies_ms, 50)), "p95": float(np.percentile(latencies_ms, 95))},
+    }
+    if tier == "auto":
+        result["escalation_rate"] = escalated / len(fixtures) if fixtures else 0.0
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description="Precision / recall / latency of each PII detection tier on the fixture set")
+    parser.add_argument("--data", default=FIXTURE_FILE, help="JSONL fixtures with gold entity spans")
+    parser.add_argument("--tier", nargs="+", choices=list(PII_TIERS), default=list(PII_TIERS))
+    parser.add_argument("--output", help="Optional JSON file for the results")
+    args = parser.parse_args()
+
+    fixtures = load_fixtures(args.data)
+    print(f"Loaded {len(fixtures)} fixture notes")
+
+    # Warm-up so loading spaCy on the first call does not skew the latency numbers (fast alone needs no model)
+    if any(tier != "fast" for tier in args.tier):
+        analyze_text(fixtures[0]["text"], tier="standard")
+
+    results = [evaluate(fixtures, tier) for tier in args.tier]
+
+    print("\n| Tier | Precision | Recall | F1 | FP | Missed | p50 (ms) | p95 (ms) |")
+    print("|------|-----------|--------|----|----|--------|----------|----------|")
+    for r in results:
+        print(
+            f"| {r['tier']} | {r['precision']:.3f} | {r['recall']:.3f} | {r['f1']:.3f} "
+            f"| {r['false_positives']} | {r['missed']} "
+            f"| {r['latency_ms']['p50']:.1f} | {r['latency_ms']['p95']:.1f} |"
+        )
+    for r in results:
+        per_type = ", ".join(f"{t}={v:.2f}" for t, v in r["recall_per_type"].items())
+        print(f"{r['tier']} recall per type: {per_type}")
+        if "escalation_rate" in r:
+            print(f"auto escalated to standard on {r['escalation_rate']:.0%} of notes")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results saved to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,346 @@
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import platform
+import subprocess
+import httpx
+import numpy as np
+from scripts.sample_notes import INPUT_FILES, load_notes
+
+# --------- Config ---------
+# name -> (method, path, query params, body from a sample note)
+SYNTH_ENDPOINTS = {
+    "suggest-service-codes": ("POST", "/ai/suggest-service-codes", {}, lambda n, i: {"session_id": f"load-{i}", "query": n["soap"], "top_k": 5}),
+    "extract-diagnoses": ("POST", "/ai/extract-diagnoses", {}, lambda n, i: {"soap": n["soap"]}),
+    "check-note": ("POST", "/ai/v2/check-note-requirements", {}, lambda n, i: {"soap": n["soap"], "service_codes": n["service_codes"]}),
+    "predict-claim-outcome": ("POST", "/ai/predict-claim-outcome", {}, lambda n, i: {"soap": n["soap"], "service_codes": n["service_codes"]}),
+    "claim-analysis": ("POST", "/ai/claim-analysis", {}, lambda n, i: {"soap": n["soap"], "service_codes": n["service_codes"]}),
+    "pii-anonymize": ("POST", "/pii/anonymize", {}, lambda n, i: {"text": n["soap"]}),
+}
+DEFAULT_MIX = {"suggest-service-codes": 3, "extract-diagnoses": 3, "check-note": 2, "predict-claim-outcome": 1, "pii-anonymize": 1}
+PERCENTILES = (50, 95, 99)
+SHED_STATUSES = (429, 503)
+# --------------------------
+
+# ----------------------------
+# Workload
+# ----------------------------
+def parse_mix(items):
+    mix = dict(DEFAULT_MIX)
+    for item in items or []:
+        name, _, weight = item.partition("=")
+        if name not in SYNTH_ENDPOINTS:
+            raise SystemExit(f"Unknown endpoint '{name}'; expected one of {', '.join(SYNTH_ENDPOINTS)}")
+        mix[name] = float(weight)
+    return {name: weight for name, weight in mix.items() if weight > 0}
+
+def synthesize(notes, mix, count, unique, rng):
+    """`count` requests over the endpoint mix, cycling through the sample notes."""
+    names, weights = zip(*mix.items())
+    workload = []
+    for i in range(count):
+        name = rng.choices(names, weights)[0]
+        method, path, params, body = SYNTH_ENDPOINTS[name]
+        note = dict(notes[i % len(notes)])
+        if unique:  # defeats single-flight and the PII / rewrite caches, like distinct real notes
+            note["soap"] = f"{note['soap']} (ref {i})"
+        workload.append({"endpoint": name, "method": method, "path": path, "params": params, "body": body(note, i)})
+    return workload
+
+def load_recording(path):
+    """Replayable requests from a request-recorder file: scrubbed bodies, in recorded order."""
+    workload = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            record = json.loads(line)
+            if record["method"] != "GET" and record.get("body") is None:
+                continue  # shape-only record (bodies off, truncated or scrub failure)
+            workload.append({
+                "endpoint": record.get("route") or record["path"],
+                "method": record["method"],
+                "path": record["path"],
+                "params": record.get("query") or {},
+                "body": record.get("body"),
+            })
+    return workload
+
+# ----------------------------
+# Open-loop driver
+# ----------------------------
+async def send(client, request, scheduled, timeout_s):
+    """(endpoint, latency s from the scheduled send time, status or error name)."""
+    try:
+        response = await client.request(
+            request["method"], request["path"], params=request["params"],
+            json=request["body"] if request["method"] != "GET" else None, timeout=timeout_s,
+        )
+        outcome = response.status_code
+    except httpx.TimeoutException:
+        outcome = "timeout"
+    except httpx.HTTPError as e:
+        outcome = type(e).__name__
+    return request["endpoint"], time.perf_counter() - scheduled, outcome
+
+async def run_step(client, workload, offset, rate, duration_s, arrival, max_in_flight, timeout_s, rng):
+    """
+    Fire requests at `rate`/s for `duration_s` regardless of completions (open
+    loop). Latency is measured from each request's scheduled time, so a stalled
+    client or server shows up as latency instead of a lower send rate.
+    """
+    tasks, pending, skipped = [], set(), {}
+    start = time.perf_counter()
+    next_at, i = 0.0, 0
+    while next_at < duration_s:
+        delay = start + next_at - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        request = workload[(offset + i) % len(workload)]
+        if len(pending) >= max_in_flight:
+            skipped[request["endpoint"]] = skipped.get(request["endpoint"], 0) + 1
+        else:
+            task = asyncio.ensure_future(send(client, request, start + next_at, timeout_s))
+            pending.add(task)
+            task.add_done_callback(pending.discard)
+            tasks.append(task)
+        i += 1
+        next_at += rng.expovariate(rate) if arrival == "poisson" else 1.0 / rate
+    outcomes = await asyncio.gather(*tasks)
+    return outcomes, skipped, time.perf_counter() - start, i
+
+def percentiles_ms(samples):
+    if not samples:
+        return None
+    values = np.percentile(np.array(samples) * 1000, PERCENTILES)
+    return {f"p{p}": round(float(v), 2) for p, v in zip(PERCENTILES, values)}
+
+def summarize(outcomes, skipped, duration_s):
+    """Per-endpoint offered/achieved rate, latency of successful requests, error and shed counts."""
+    by_endpoint = {}
+    for endpoint, latency, outcome in outcomes:
+        by_endpoint.setdefault(endpoint, []).append((latency, outcome))
+    for endpoint in skipped:
+        by_endpoint.setdefault(endpoint, [])
+    summary = {}
+    for endpoint, results in sorted(by_endpoint.items()):
+        ok = [latency for latency, outcome in results if isinstance(outcome, int) and outcome < 400]
+        statuses = {}
+        for _, outcome in results:
+            statuses[str(outcome)] = statuses.get(str(outcome), 0) + 1
+        sent = len(results) + skipped.get(endpoint, 0)
+        errors = sent - len(ok)
+        summary[endpoint] = {
+            "sent": sent,
+            "offered_rps": round(sent / duration_s, 2),
+            "achieved_rps": round(len(ok) / duration_s, 2),  # successful responses over the same window
+            "latency_ms": percentiles_ms(ok),
+            "error_rate": round(errors / sent, 4) if sent else 0.0,
+            "shed": sum(statuses.get(str(s), 0) for s in SHED_STATUSES),
+            "client_skipped": skipped.get(endpoint, 0),
+            "statuses": statuses,
+        }
+    return summary
+
+def saturation_points(steps, slo_p95_ms, max_error_rate, min_throughput_ratio):
+    """
+    Per endpoint: the first offered rate at which p95 exceeds the SLO, the
+    error rate exceeds the limit, or achieved throughput falls below
+    `min_throughput_ratio` × offered, and the last rate before it.
+    """
+    points = {}
+    for step in steps:
+        for endpoint, r in step["endpoints"].items():
+            point = points.setdefault(endpoint, {"saturated_at_rps": None, "reason": None, "max_sustained_rps": None})
+            if point["saturated_at_rps"] is not None:
+                continue
+            p95 = (r["latency_ms"] or {}).get("p95")
+            reasons = []
+            if p95 is None or p95 > slo_p95_ms:
+                reasons.append(f"p95 {p95} ms > {slo_p95_ms} ms" if p95 is not None else "no successful requests")
+            if r["error_rate"] > max_error_rate:
+                reasons.append(f"error rate {r['error_rate']:.1%} > {max_error_rate:.1%}")
+            if r["achieved_rps"] < min_throughput_ratio * r["offered_rps"]:
+                reasons.append(f"achieved {r['achieved_rps']} < {min_throughput_ratio:.0%} of offered {r['offered_rps']} req/s")
+            if reasons:
+                point["saturated_at_rps"] = r["offered_rps"]
+                point["step_rps"] = step["rate_rps"]
+                point["reason"] = "; ".join(reasons)
+            else:
+                point["max_sustained_rps"] = r["achieved_rps"]
+    return points
+
+# ----------------------------
+# Local app + LLM stand-in
+# ----------------------------
+def wait_healthy(url, timeout_s, process):
+    deadline = time.time() + timeout_s
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f"{url} exited with code {process.returncode} before becoming healthy")
+        try:
+            if httpx.get(url, timeout=2).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(1)
+    raise SystemExit(f"{url} not healthy after {timeout_s}s")
+
+def spawn_stack(args):
+    """Start the LLM stand-in and `app.main:app` (uvicorn) pointed at it; returns the processes."""
+    stub_url = f"http://127.0.0.1:{args.stub_port}"
+    stub = subprocess.Popen([
+        sys.executable, "-m", "app.llm_stub.server", "--port", str(args.stub_port),
+        "--latency", args.llm_latency, "--error-rate", str(args.llm_error_rate), "--seed", str(args.seed),
+    ])
+    wait_healthy(f"{stub_url}/health", 60, stub)
+    env = dict(os.environ,
+               GEMINI_API_KEY="stub", OPENAI_API_KEY="stub",
+               GEMINI_API_ENDPOINT=stub_url, OPENAI_BASE_URL=f"{stub_url}/v1")
+    app = subprocess.Popen([
+        sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(args.app_port),
+        "--workers", str(args.app_workers), "--log-level", "warning",
+    ], env=env)
+    processes = [stub, app]
+    try:
+        wait_healthy(f"http://127.0.0.1:{args.app_port}/health", args.startup_timeout, app)
+    except BaseException:
+        stop_stack(processes)
+        raise
+    return processes
+
+def stop_stack(processes):
+    for process in reversed(processes):
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True, stderr=subprocess.DEVNULL).strip()
+    except Exception:
+        return None
+
+# ----------------------------
+# Report
+# ----------------------------
+def print_report(report):
+    print("\n| Offered (req/s) | Endpoint | Sent | Achieved (req/s) | p50 (ms) | p95 (ms) | p99 (ms) | Errors | Shed |")
+    print("|-----------------|----------|------|------------------|----------|----------|----------|--------|------|")
+    for step in report["steps"]:
+        for endpoint, r in step["endpoints"].items():
+            lat = r["latency_ms"] or {"p50": "-", "p95": "-", "p99": "-"}
+            print(f"| {step['rate_rps']} | {endpoint} | {r['sent']} | {r['achieved_rps']} | {lat['p50']} | {lat['p95']} | {lat['p99']} | {r['error_rate']:.1%} | {r['shed']} |")
+    print("\nSaturation per endpoint:")
+    for endpoint, point in report["saturation"].items():
+        if point["saturated_at_rps"] is None:
+            print(f"  {endpoint}: not saturated up to {report['steps'][-1]['rate_rps']} req/s total")
+        else:
+            sustained = f"{point['max_sustained_rps']} req/s" if point["max_sustained_rps"] is not None else "none"
+            print(f"  {endpoint}: saturated at {point['saturated_at_rps']} req/s "
+                  f"(total {point['step_rps']} req/s; {point['reason']}); last sustained: {sustained}")
+
+async def run(args, workload):
+    rng = random.Random(args.seed)
+    steps = []
+    limits = httpx.Limits(max_connections=args.max_in_flight, max_keepalive_connections=args.max_in_flight)
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits) as client:
+        if args.warmup:
+            for request in workload[:args.warmup]:  # lazy model loads, connection pool
+                await send(client, request, time.perf_counter(), args.timeout)
+        offset = 0
+        for rate in args.rates:
+            outcomes, skipped, wall_s, sent = await run_step(
+                client, workload, offset, rate, args.duration, args.arrival, args.max_in_flight, args.timeout, rng
+            )
+            offset += sent
+            summary = summarize(outcomes, skipped, args.duration)
+            steps.append({"rate_rps": rate, "wall_s": round(wall_s, 2), "endpoints": summary})
+            print(f"{rate} req/s: sent {sent}, " + ", ".join(
+                f"{name} p95={(r['latency_ms'] or {}).get('p95')} ms err={r['error_rate']:.1%}" for name, r in summary.items()
+            ))
+            points = saturation_points(steps, args.slo_p95_ms, args.max_error_rate, args.min_throughput_ratio)
+            if args.stop_on_saturation and all(p["saturated_at_rps"] is not None for p in points.values()):
+                print("Every endpoint is saturated; stopping")
+                break
+    return steps
+
+def main():
+    parser = argparse.ArgumentParser(description="Open-loop HTTP load test of the API with replayed or synthesized requests")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--replay", help="Request-recorder JSONL to replay instead of synthesizing from the sample inputs")
+    parser.add_argument("--mix", nargs="+", metavar="ENDPOINT=WEIGHT", help=f"Synthetic endpoint weights (default {DEFAULT_MIX}; 0 disables)")
+    parser.add_argument("--unique-payloads", action="store_true", help="Make every synthetic note distinct (no single-flight or cache hits)")
+    parser.add_argument("--rates", nargs="+", type=float, default=[1, 2, 5, 10], help="Offered total request rates (req/s), one step each")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds per rate step")
+    parser.add_argument("--arrival", choices=("poisson", "constant"), default="poisson")
+    parser.add_argument("--warmup", type=int, default=5, help="Sequential requests before the first step")
+    parser.add_argument("--timeout", type=float, default=60, help="Per-request timeout (s)")
+    parser.add_argument("--max-in-flight", type=int, default=500, help="Client-side cap; arrivals beyond it count as errors")
+    parser.add_argument("--slo-p95-ms", type=float, default=5000)
+    parser.add_argument("--max-error-rate", type=float, default=0.01)
+    parser.add_argument("--min-throughput-ratio", type=float, default=0.9)
+    parser.add_argument("--stop-on-saturation", action="store_true", help="Skip the remaining rates once every endpoint is saturated")
+    parser.add_argument("--spawn", action="store_true", help="Start the LLM stand-in and the app locally for the run")
+    parser.add_argument("--app-port", type=int, default=8000)
+    parser.add_argument("--app-workers", type=int, default=1)
+    parser.add_argument("--stub-port", type=int, default=8001)
+    parser.add_argument("--llm-latency", default="lognormal:300:0.5", help="Stand-in latency with --spawn: fixed:<ms>, uniform:<min>:<max>, lognormal:<median>:<sigma>")
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--startup-timeout", type=float, default=300, help="Seconds to wait for the app to load its models")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="Write the report as JSON")
+    args = parser.parse_args()
+
+    if args.replay:
+        workload = load_recording(args.replay)
+        source = args.replay
+    else:
+        notes = load_notes(INPUT_FILES)
+        count = max(int(sum(args.rates) * args.duration * 2), args.warmup, 1)
+        workload = synthesize(notes, parse_mix(args.mix), count, args.unique_payloads, random.Random(args.seed))
+        source = "synthetic"
+    if not workload:
+        raise SystemExit("No replayable requests")
+    print(f"Workload: {len(workload)} requests from {source}")
+
+    processes = []
+    if args.spawn:
+        args.base_url = f"http://127.0.0.1:{args.app_port}"
+        processes = spawn_stack(args)
+    try:
+        steps = asyncio.run(run(args, workload))
+    finally:
+        stop_stack(processes)
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "cpu_count": os.cpu_count(),
+            "base_url": args.base_url,
+            "source": source,
+            "arrival": args.arrival,
+            "duration_s": args.duration,
+            "llm_latency": args.llm_latency if args.spawn else None,
+            "llm_error_rate": args.llm_error_rate if args.spawn else None,
+            "slo_p95_ms": args.slo_p95_ms,
+            "max_error_rate": args.max_error_rate,
+        },
+        "steps": steps,
+        "saturation": saturation_points(steps, args.slo_p95_ms, args.max_error_rate, args.min_throughput_ratio),
+    }
+    print_report(report)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results saved to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+import os
+import re
+import json
+
+# --------- Config ---------
+INPUT_FILES = ("data/inputs.md", "app/sample_inputs.txt")
+PARAGRAPH_SECTIONS = ("# Extract Diagnosis code", "# Suggest Service codes")
+DEFAULT_SERVICE_CODES = ["2ad"]
+# --------------------------
+
+def load_notes(paths=INPUT_FILES):
+    """
+    SOAP notes from the sample inputs: every "soap" field (with its
+    service_codes) plus the free-text paragraphs under the extraction and
+    suggestion sections of data/inputs.md.
+    """
+    notes = []
+    for path in paths:
+        if not os.path.exists(path):
+            continue
+        with open(path, encoding="utf-8") as f:
+            text = f.read()
+        for match in re.finditer(r'\{[^{}]*"soap"[^{}]*\}', text, re.DOTALL):
+            try:
+                block = json.loads(match.group(0))
+            except json.JSONDecodeError:
+                continue
+            notes.append({"soap": block["soap"], "service_codes": block.get("service_codes") or DEFAULT_SERVICE_CODES})
+        for header in PARAGRAPH_SECTIONS:
+            if header not in text:
+                continue
+            section = text[text.index(header) + len(header):]
+            section = section[:section.find("\n# ")] if "\n# " in section else section
+            for paragraph in re.split(r"\n\s*\n", section):
+                paragraph = paragraph.strip()
+                if len(paragraph) > 40 and not paragraph.startswith(("[", "{", "`", '"')):
+                    notes.append({"soap": paragraph, "service_codes": DEFAULT_SERVICE_CODES})
+    return notes